@@ -37,5 +37,5 @@ from appy.model.searches.gridder import Gridder
 from appy.model.fields.group import Group, Column
 from appy.model.workflow.transition import Transition
 from appy.model.fields.select import Select, Selection
-from appy.database.operators import or_, and_, in_, not_
+from appy.database.operators import or_, and_, in_, not_, lt_, le_, gt_, ge_
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -13,7 +13,7 @@ site = """
 # ------------------------------------------------------------------------------
 import sys
 from pathlib import Path
-from appy.bin.run import Run
+from appy.px.cache import Cache
 
 # ------------------------------------------------------------------------------
 site = Path('{self.folder}')
@@ -21,6 +21,12 @@ app = Path('{self.app}')
 for path in (site, site/'lib', app.parent):
     sys.path.insert(0, str(path))
 
+# Load parsed PX from the cache, if enabled in <site>/config.py, before
+# importing the modules defining them.
+import config
+if getattr(config, 'pxCache', False): Cache.enable(site/'var')
+from appy.bin.run import Run
+
 # ------------------------------------------------------------------------------
 if __name__ == '__main__':
     Run().run(site, app)
@@ -33,6 +39,10 @@ config = """
 app = '{self.app}'
 site = '{self.folder}'
 
+# If True, parsed PX are cached in <site>/var/px.cache, speeding up the next
+# server startups (see appy/px/cache.py).
+pxCache = False
+
 # Complete the config ----------------------------------------------------------
 def complete(c):
     c.model.set(app)
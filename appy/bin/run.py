@@ -14,8 +14,9 @@ class Run(Program):
     # Help messages
     HELP_ACTION = 'Action can be "start" (start the site), "stop" (stop it), ' \
                   '"fg" (start it in the foreground), "clean" (clean ' \
-                  'temporary objects and pack the database) or "run" ' \
-                  '(execute a specific method).'
+                  'temporary objects and pack the database), "run" ' \
+                  '(execute a specific method) or "populate" (populate ' \
+                  'indexes whose population has been deferred).'
     HELP_METHOD = 'When action in "run", specify the name of the method to ' \
                   'execute on your app\'s tool.'
 
@@ -28,7 +29,8 @@ class Run(Program):
     PID_NOT_FOUND = "The server can't be stopped."
 
     # Other constants
-    allowedActions = ('start', 'stop', 'fg', 'bg', 'clean', 'run')
+    allowedActions = ('start', 'stop', 'fg', 'bg', 'clean', 'run',
+                      'populate')
 
     def defineArguments(self):
         '''Define the allowed arguments for this program'''
@@ -89,7 +91,7 @@ class Run(Program):
         exec('from %s import Config' % app.name)
         config = eval('Config')
         # Execute the appropriate action
-        if self.action in ('fg', 'bg', 'clean', 'run'):
+        if self.action in ('fg', 'bg', 'clean', 'run', 'populate'):
             # ------------------------------------------------------------------
             #  "fg"     | The user executed command "./site fg" : we continue
             #           | and run the server in this (parent, unique) process.
@@ -99,9 +101,10 @@ class Run(Program):
             #           | command "./site bg". We continue and run the server in
             #           | this (child) process.
             # ------------------------------------------------------------------
-            #  "clean", | Theses cases are similar to the "fg" mode hereabove;
-            #  "run"    | they misuse the server to execute a single command and
-            #           | return, without actually running the server.
+            #  "clean",   | Theses cases are similar to the "fg" mode
+            #  "run",     | hereabove; they misuse the server to execute a
+            #  "populate" | single command and return, without actually
+            #             | running the server.
             # ------------------------------------------------------------------
             classic = self.action in ('fg', 'bg')
             if self.action == 'fg':
@@ -2,7 +2,7 @@
 
 # ~license~
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-import os, time, pathlib
+import os, time, pathlib, threading
 
 import ZODB, transaction
 from DateTime import DateTime
@@ -14,6 +14,8 @@ from ZODB.POSException import ConnectionStateError
 from appy.database.lock import Lock
 from appy.utils import path as putils
 from appy.database.catalog import Catalog
+from appy.database.cache import SearchCache
+from appy.database.results import Results
 
 # Constants  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 DB_CREATED = 'Database created @%s.'
@@ -33,6 +35,7 @@ CUSTOM_ID_NO_IKEY = 'It is not possible to get an ikey for object having a ' \
   'custom ID (%s).'
 NEW_TEMP_WITH_ID = 'An ID cannot be specified when creating a temp object.'
 CUSTOM_ID_NOT_STR = 'Custom ID must be a string.'
+NOTHING_TO_POPULATE = 'There is no index to populate.'
 SEARCH_NO_CATALOG = 'Invalid operation: there is no catalog for instances ' \
   'of class "%s".'
 
@@ -57,6 +60,29 @@ class Config:
         # do it. You can place here roles expressed as strings or Role
         # instances, global or local.
         self.unlockers = ['Manager']
+        # The results of searches performed on the classes whose names are
+        # listed here are cached, across requests, in a cache shared by all
+        # requests (see appy/database/cache.py). This is interesting for
+        # classes whose instances are frequently searched but rarely modified.
+        self.cachedSearches = []
+        # The maximum number of search results kept in this cache
+        self.searchCacheSize = 1000
+        # Every worker thread of the HTTP server keeps its own connection to
+        # the database, across requests. Every connection has a cache of
+        # objects: the most used objects (the tool, translations, users, index
+        # nodes...) remain in it, unpickled, between requests. This attribute
+        # defines the target maximum number of objects in every such cache.
+        self.cacheSize = 5000
+        # When indexes are added, or when their type changes, they must be
+        # populated, by reindexing all the instances of the corresponding
+        # class. By default, it is done at server startup. On large databases,
+        # it may take a long time: set this attribute to False to defer it. In
+        # that case, population must be performed by running the site with
+        # action "populate", ie: ./site populate.
+        self.populateAtStartup = True
+        # Objects are reindexed by batches of this size. After every batch, a
+        # transaction savepoint is made and the connection cache is reduced.
+        self.populateBatchSize = 1000
 
     def set(self, folder, filePath=None):
         '''Sets site-specific configuration elements. If filePath is None,
@@ -107,6 +133,9 @@ class Config:
         elif server.mode == 'run':
             # Execute method named p_method on the tool
             database.run(method, handler, logger)
+        elif server.mode == 'populate':
+            # Populate the indexes whose population has been deferred
+            database.populate(handler, logger)
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 class Database:
@@ -119,15 +148,51 @@ class Database:
     MOD_IKEY = 10000
 
     def __init__(self, path, server):
-        # The ZODB database object
-        self.db = ZODB.DB(path)
+        config = server.config
+        # The ZODB database object. Every worker thread keeps a connection: the
+        # pool of connections must be at least as large as the pool of threads.
+        self.db = ZODB.DB(path, cache_size=config.database.cacheSize,
+                          pool_size=config.server.threads + 1)
         # The main HTTP server
         self.server = server
+        # Thread-specific data: for every worker thread, attribute "connection"
+        # stores its long-lived database connection (see m_getConnection).
+        self.local = threading.local()
+        # All the connections stored in p_self.local, closed by m_close
+        self.connections = []
+        self.connectionsLock = threading.Lock()
+        # The cache of search results shared by all requests
+        self.searches = SearchCache(server.config.database)
 
     def openConnection(self):
         '''Opens and returns a connection to this database'''
         return self.db.open()
 
+    def getConnection(self):
+        '''Returns the connection to this database dedicated to the current
+           thread, opening it if it does not exist yet.'''
+        # This connection is kept open across requests, in order to keep its
+        # cache of objects "warm".
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = self.openConnection()
+            with self.connectionsLock:
+                self.connections.append(connection)
+        else:
+            # Start a new transaction: the connection processes the
+            # invalidations of the objects having been modified, by other
+            # connections, since the previous request.
+            connection.sync()
+        return connection
+
+    def releaseConnection(self, connection):
+        '''Called at the end of a request, instead of m_closeConnection, for a
+           p_connection retrieved via m_getConnection: any uncommitted change is
+           aborted but the connection is kept open.'''
+        transaction.abort()
+        # Ensure the number of cached objects stays near the target size
+        connection.cacheGC()
+
     def closeConnection(self, connection):
         '''Closes the p_connection to this database'''
         try:
@@ -151,10 +216,25 @@ class Database:
         # Close the p_connection if given
         if connection: connection.close()
 
+    def closeConnections(self):
+        '''Closes the connections opened by m_getConnection. Called once the
+           worker threads are stopped.'''
+        with self.connectionsLock:
+            connections = self.connections
+            self.connections = []
+        for connection in connections:
+            try:
+                connection.close()
+            except ConnectionStateError:
+                # The transaction joined by this connection belongs to another
+                # thread: closing the database will discard it anyway.
+                pass
+
     def close(self, abort=False):
         '''Closes the database'''
         # Must we first abort any ongoing transaction ?
         if abort: transaction.abort()
+        self.closeConnections()
         try:
             self.db.close()
         except ConnectionStateError:
@@ -296,34 +376,59 @@ class Database:
     # Methods for searching objects
     #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+    def getCatalog(self, handler, className):
+        '''Returns the catalog for instances of p_className or raises an error
+           if no such catalog exists.'''
+        catalog = handler.connection.root.catalogs.get(className)
+        if not catalog:
+            raise self.Error(SEARCH_NO_CATALOG % className)
+        return catalog
+
     def search(self, handler, className, ids=False, **kwargs):
         '''Perform a search on instances of a class whose name is p_className
-           and return the list of matching objects. If p_ids is True, it returns
-           a list of object IDS instead of a list of true objects.'''
+           and return the matching objects, as a lazy Results instance (see
+           appy/database/results.py). If p_ids is True, it returns a list of
+           object IDS instead.'''
         # p_ids being True can be useful for some usages like determining the
         # number of objects without needing to get information about them.
         # ~~~
         # Ensure there is a catalog for p_className
-        catalog = handler.connection.root.catalogs.get(className)
-        if not catalog:
-            raise self.Error(SEARCH_NO_CATALOG % className)
+        catalog = self.getCatalog(handler, className)
         r = catalog.search(handler, **kwargs)
         if r and not ids:
-            # Convert the list of integers to real objects
-            return [self.getObject(handler, id) for id in r]
+            # Objects will be loaded only when accessed
+            return Results(self, handler, r)
         return r or []
 
     def reindexObject(self, handler, o, **kwargs):
         '''(re)indexes this object in the catalog corresponding to its class'''
         # Ensure p_o is "indexable"
-        className = o.class_.name
-        catalog = handler.connection.root.catalogs.get(className)
-        if not catalog:
-            raise self.Error(SEARCH_NO_CATALOG % className)
+        catalog = self.getCatalog(handler, o.class_.name)
         return catalog.reindexObject(o, **kwargs)
-        
-    def count(self, className): pass
-    def compute(self, className): pass
+
+    def count(self, handler, className, **kwargs):
+        '''Returns the number of instances of p_className matching the search
+           criteria from p_kwargs. The count is computed from the catalog: no
+           object is loaded.'''
+        r = self.getCatalog(handler, className).search(handler, **kwargs)
+        return len(r) if r else 0
+
+    def explain(self, handler, className, **kwargs):
+        '''Returns info about the query plan corresponding to a search on
+           instances of p_className with these p_kwargs. More info in method
+           appy.database.catalog.Catalog::explain.'''
+        return self.getCatalog(handler, className).explain(handler, **kwargs)
+
+    def compute(self, handler, className, field, function='sum', **kwargs):
+        '''Computes, on the instances of p_className matching the search
+           criteria from p_kwargs, an aggregate of the values stored in the
+           index corresponding to p_field, a field name. p_function can be
+           "sum", "min", "max" or "group": see method
+           appy.database.indexes.Index::compute. The aggregate is computed from
+           the catalog: no object is loaded.'''
+        catalog = self.getCatalog(handler, className)
+        index = catalog.getIndex(field)
+        return index.compute(function, catalog.search(handler, **kwargs))
 
     #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
     # Global database operations
@@ -401,6 +506,26 @@ class Database:
         transaction.commit()
         connection.close()
 
+    def populate(self, handler, logger):
+        '''Populates the indexes whose population has been deferred at server
+           startup (see attribute "populateAtStartup" on class Config).'''
+        # Create a specific connection
+        connection = handler.connection = self.db.open()
+        root = connection.root
+        handler.tool = root.objects.get('tool')
+        populate = Catalog.getToPopulate(root)
+        if not populate:
+            logger.info(NOTHING_TO_POPULATE)
+            connection.close()
+            return
+        try:
+            Catalog.populate(root, handler, populate)
+        except Exception as err:
+            handler.server.logTraceback()
+            return self.abort(connection)
+        transaction.commit()
+        connection.close()
+
     def getIkey(self, id=None, o=None):
         '''Gets an "ikey" = the first level key for finding an object in store
            "iobjects" (more info on m_init). The ikey can be computed from a
@@ -0,0 +1,114 @@
+'''Process-wide cache of catalog search results'''
+
+# ~license~
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+import threading
+from collections import OrderedDict
+
+from BTrees.IIBTree import IITreeSet
+
+from appy.model.utils import Object as O
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class SearchCache:
+    '''Size-bounded LRU cache of catalog search results, shared by all the
+       requests handled by the server.'''
+
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # While a handler caches the searches performed while handling a single
+    # request (see appy.server.handler.SearchesCache), this cache keeps the
+    # results of the searches performed on the classes listed in database
+    # config attribute "cachedSearches", across requests. Because every request
+    # uses its own ZODB connection, a cached result is tagged with the serial
+    # of the catalog's "updates" counter (see appy.database.catalog.Catalog),
+    # as seen from the connection having computed it. Every time an object is
+    # (re/un)indexed in a catalog, this counter is updated: when the counter's
+    # serial, as seen from another connection after ZODB invalidations have
+    # been processed, differs from the tag, the cached result is discarded.
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def __init__(self, config):
+        # The names of the classes for which searches must be cached
+        self.classes = set(config.cachedSearches)
+        # The maximum number of cached results
+        self.size = config.searchCacheSize
+        # The cached results, as a dict of the form
+        #         ~{(s_className, key): (s_tag, result)}~
+        # "key" identifies a search (see Catalog::getSearchKey). The most
+        # recently used entries are at the end of the dict.
+        self.entries = OrderedDict()
+        # Several threads may use the cache at the same time
+        self.lock = threading.Lock()
+        # Counters of cache hits and misses
+        self.hits = 0
+        self.misses = 0
+
+    def getTag(self, catalog):
+        '''Returns the tag representing the state of this p_catalog, as seen
+           from the current connection, or None if results from p_catalog can't
+           be cached.'''
+        if catalog.name not in self.classes: return
+        updates = getattr(catalog, 'updates', None)
+        if updates is None: return
+        # Getting the counter's value ensures it is loaded from the database
+        updates()
+        # If objects have been (re/un)indexed in the current transaction, the
+        # catalog state differs from the committed one: cache nothing.
+        if updates._p_changed: return
+        return updates._p_serial
+
+    def get(self, catalog, key):
+        '''Returns a tuple (found, result): "found" is True if the result of the
+           search identified by p_key in this p_catalog is in the cache, and
+           still valid.'''
+        tag = self.getTag(catalog)
+        if tag is None: return False, None
+        name = (catalog.name, key)
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None or entry[0] != tag:
+                self.misses += 1
+                return False, None
+            self.entries.move_to_end(name)
+            self.hits += 1
+            result = entry[1]
+        # The cached result is shared by all threads: callers get a copy
+        return True, self.copy(result)
+
+    def copy(self, result):
+        '''Returns a copy of search p_result, being None, a sorted list of
+           iids or a set of iids.'''
+        # A result that is not a list may be a persistent object from the
+        # catalog, like the set of all instances or the set of objects having
+        # some value in an index. Such an object is bound to the current
+        # connection: it can't be shared. Moreover, whatever its type, a result
+        # may be modified by the code having performed the search.
+        if result is None: return
+        return list(result) if isinstance(result, list) else IITreeSet(result)
+
+    def set(self, catalog, key, result):
+        '''Caches a copy of this search p_result'''
+        tag = self.getTag(catalog)
+        if tag is None: return
+        result = self.copy(result)
+        with self.lock:
+            entries = self.entries
+            entries[(catalog.name, key)] = tag, result
+            entries.move_to_end((catalog.name, key))
+            while len(entries) > self.size:
+                entries.popitem(last=False)
+
+    def clear(self):
+        '''Removes all entries from the cache'''
+        with self.lock:
+            self.entries.clear()
+
+    def getStats(self):
+        '''Returns info about the cache usage'''
+        return O(size=len(self.entries), hits=self.hits, misses=self.misses)
+
+    def __repr__(self):
+        '''p_self's short string representation'''
+        return '<SearchCache hits=%d misses=%d size=%d>' % \
+               (self.hits, self.misses, len(self.entries))
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -2,18 +2,31 @@
    of a given class from an Appy app's model.'''
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-from BTrees.IIBTree import IITreeSet, difference
+import time
+from itertools import islice
+
+import transaction
+from BTrees.Length import Length
+from BTrees.IIBTree import IITreeSet
 from persistent.mapping import PersistentMapping
 
+from appy.database.plan import Plan
+from appy.database.operators import Operator
 from appy.database.indexes import Index
+from appy.database.indexes.date import DateIndex
+from appy.database.indexes.boolean import BooleanIndex
+from appy.database.indexes.keyword import KeywordIndex
+from appy.database.indexes.text import TextIndex, XhtmlIndex
 from appy.model.utils import Object as O
-from appy.database.operators import Operator
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 CATALOG_CREATED = 'Catalog created for class "%s".'
 CATALOG_REMOVED = 'Catalog removed for class "%s".'
 INDEXES_POPULATED = '%d/%d object(s) reindexed during population of ' \
   'index(es) %s.'
+INDEXES_POPULATING = 'Class %s: %d/%d object(s) processed (%d object(s)/s).'
+INDEXES_DEFERRED = 'Population of index(es) %s deferred: until the site is ' \
+  'run with action "populate", searches on these indexes will be incomplete.'
 INDEX_NOT_FOUND = 'There is no indexed field named "%s" on class "%s".'
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -53,6 +66,14 @@ class Catalog(PersistentMapping):
     # Catalog-specific exception class
     class Error(Exception): pass
 
+    # Index classes corresponding to the index types, as returned by method
+    # appy.model.fields.Field::getIndexType. Any other type corresponds to the
+    # base Index class.
+    indexClasses = {'FieldIndex': Index, 'DateIndex': DateIndex,
+                    'BooleanIndex': BooleanIndex, 'ListIndex': KeywordIndex,
+                    'KeywordIndex': KeywordIndex, 'TextIndex': TextIndex,
+                    'XhtmlIndex': XhtmlIndex}
+
     # A catalog is a dict of the form ~{s_name: Index_index}~
     #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
     # name    | The name of an indexed field on the class corresponding to this
@@ -68,6 +89,13 @@ class Catalog(PersistentMapping):
         self.name = class_.name
         # A set containing all instances (stored as iids) of p_class
         self.all = IITreeSet()
+        # The names of the indexes that still need to be populated, if their
+        # population has been deferred (see m_manageAll).
+        self.toPopulate = ()
+        # A counter of the (re/un)indexing operations having modified this
+        # catalog. Its serial allows to determine if search results cached
+        # across requests are still valid (see appy/database/cache.py).
+        self.updates = Length()
 
     #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
     # Class methods
@@ -79,31 +107,77 @@ class Catalog(PersistentMapping):
            whose type has changed. The list of indexes to populate is given in
            p_populate, as produced by m_manageAll.'''
         counts = O(total=0, updated=0)
-        # Browse indexes to populate
         database = handler.server.database
+        connection = handler.connection
+        # Objects are reindexed by batches. After every batch, a savepoint is
+        # made: changes performed so far are written to a temporary file and
+        # the objects from the connection cache can be deactivated, keeping
+        # memory usage under control, whatever the number of objects is.
+        size = handler.server.config.database.populateBatchSize
+        # Browse indexes to populate
         for className, indexes in populate.items():
             # Browse all instances of the class corresponding to this catalog
             # and reindex those being concerned by "indexes".
             catalog = root.catalogs[className]
-            for iid in catalog.all:
-                o = database.getObject(handler, iid)
-                # Count this object
-                counts.total += 1
-                # Submit the object to every index to populate
-                updated = o.reindex(indexes=indexes)
-                if updated:
-                    counts.updated += 1
+            total = len(catalog.all)
+            done = 0
+            start = time.time()
+            last = None # The last iid from the previous batch
+            while True:
+                if last is None:
+                    iids = catalog.all.keys()
+                else:
+                    iids = catalog.all.keys(last, excludemin=True)
+                batch = list(islice(iids, size))
+                if not batch: break
+                for iid in batch:
+                    o = database.getObject(handler, iid)
+                    # Count this object
+                    counts.total += 1
+                    # Submit the object to every index to populate
+                    updated = o.reindex(indexes=indexes)
+                    if updated:
+                        counts.updated += 1
+                last = batch[-1]
+                done += len(batch)
+                transaction.savepoint(True)
+                connection.cacheGC()
+                # Log progress and throughput
+                if total > size:
+                    rate = done / ((time.time() - start) or 1)
+                    handler.log('app', 'info', INDEXES_POPULATING % \
+                                (className, done, total, rate))
+            # These indexes are now populated
+            catalog.toPopulate = ()
         # At the time the database is created, there is a single object in it:
         # the tool.
         if counts.total > 1:
             # Log details about the operation
-            names = [] # The names of the populated indexes
-            for className, indexes in populate.items():
-                for index in indexes:
-                    names.append('%s::%s' % (className, index.name))
+            names = class_.getIndexNames(populate)
             message = INDEXES_POPULATED % (counts.updated, counts.total, names)
             handler.log('app', 'info', message)
 
+    @classmethod
+    def getIndexNames(class_, populate):
+        '''Returns the list of names "<className>::<indexName>" of the indexes
+           from p_populate.'''
+        r = []
+        for className, indexes in populate.items():
+            for index in indexes:
+                r.append('%s::%s' % (className, index.name))
+        return r
+
+    @classmethod
+    def getToPopulate(class_, root):
+        '''Returns the indexes whose population has been deferred, as a dict
+           ~{s_className: [Index]}~.'''
+        r = {}
+        for name, catalog in root.catalogs.items():
+            names = getattr(catalog, 'toPopulate', None)
+            if names:
+                r[name] = [catalog[n] for n in names if n in catalog]
+        return r
+
     @classmethod
     def manageAll(class_, root, handler):
         '''Called by the framework, this method creates or updates, at system
@@ -133,6 +207,10 @@ class Catalog(PersistentMapping):
                 handler.log('app', 'info', CATALOG_CREATED % name)
             else:
                 catalog = catalogs[name]
+                # Catalogs created with a previous version of Appy may not have
+                # an "updates" counter.
+                if not hasattr(catalog, 'updates'):
+                    catalog.updates = Length()
             # Potentially update indexes in this catalog
             toPopulate = catalog.updateIndexes(handler, modelClass)
             if toPopulate:
@@ -142,9 +220,24 @@ class Catalog(PersistentMapping):
             if name not in indexable:
                 del(catalogs[name])
                 handler.log('app', 'info', CATALOG_REMOVED % name)
-        # Populate indexes requiring it
-        if populate:
+        # Add the indexes whose population has been deferred at a previous
+        # startup.
+        for name, indexes in class_.getToPopulate(root).items():
+            toPopulate = populate.setdefault(name, [])
+            for index in indexes:
+                if index not in toPopulate:
+                    toPopulate.append(index)
+        if not populate: return
+        # Populate indexes requiring it. On large databases, it may take a
+        # while: population can be deferred and performed by running the site
+        # with action "populate".
+        if handler.server.config.database.populateAtStartup:
             class_.populate(root, handler, populate)
+        else:
+            for name, indexes in populate.items():
+                catalogs[name].toPopulate = tuple([i.name for i in indexes])
+            names = class_.getIndexNames(populate)
+            handler.log('app', 'warning', INDEXES_DEFERRED % names)
 
     def updateIndexes(self, handler, class_):
         '''Create or update indexes for p_class_. Returns the list of indexes
@@ -158,11 +251,17 @@ class Catalog(PersistentMapping):
             if not field.indexed: continue
             name = field.name
             all.append(name)
-            # Do nothing if the index already exists
-            if name in self: continue
-            # Create the index: it does not exist yet
-            index = self[name] = Index(name, self)
-            changes.created.append(name)
+            # Get the index class corresponding to the field's index type
+            indexClass = Catalog.indexClasses.get(field.getIndexType(), Index)
+            if name in self:
+                # Do nothing if the index already exists, with the right type
+                if self[name].__class__ == indexClass: continue
+                # Replace the index with an index of the right type
+                changes.updated.append(name)
+            else:
+                # Create the index: it does not exist yet
+                changes.created.append(name)
+            index = self[name] = indexClass(name, self)
             r.append(index)
         # Browse indexes, looking for indexes to delete
         for name in self.keys():
@@ -184,9 +283,10 @@ class Catalog(PersistentMapping):
         return r
 
     def search(self, handler, secure=True, sortBy=None, sortOrder='asc',
-               **fields):
+               limit=None, **fields):
         '''Performs a search in this catalog. Returns a IITreeSet object if
-           results are found, None else.'''
+           results are found, None else. If p_sortBy is specified, the result
+           is a list of iids, sorted accordingly.'''
         #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
         # Param      | Description
         #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -194,19 +294,56 @@ class Catalog(PersistentMapping):
         #            | permissions are bypassed.
         #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
         # sortBy     | If specified, it must be the name of an indexed field on
-        #            | p_className.
+        #            | p_className. Sorting is performed via the corresponding
+        #            | index: no object is loaded for that purpose.
         #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
         # sortOrder  | Can be "asc" (ascending, the defaut) or "desc"
         #            | (descending).
         #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+        # limit      | If the result is sorted by relevance (see m_execute) and
+        #            | p_limit is not None, only the p_limit most relevant
+        #            | objects are guaranteed to come first, sorted by
+        #            | relevance. It is typically the index of the last object
+        #            | shown on the current page of results.
+        #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
         # fields     | Keyword args must correspond to valid indexed field names
         #            | on p_className. For every such arg, the specified value
         #            | must be a valid value according to the field definition.
         #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
         # Add the security-related search parameter if p_secure is True
         if secure: fields['allowed'] = handler.guard.userAllowed
-        # The result set, as a IITreeSet instance (or None)
-        r = None
+        # The same search is often performed several times while handling a
+        # single request (portlets, counters, navigation...): its result is
+        # cached in the handler. This cache is invalidated as soon as an object
+        # is reindexed in this catalog (see appy.server.handler.SearchesCache).
+        cache = handler.searches
+        key = self.getSearchKey(fields, sortBy, sortOrder, limit)
+        found, r = cache.getResult(self.name, key)
+        if found: return r
+        # Searches on some classes may also be cached across requests (see
+        # appy/database/cache.py).
+        shared = handler.server.database.searches
+        found, r = shared.get(self, key)
+        if not found:
+            r = self.execute(fields, sortBy, sortOrder, limit)
+            shared.set(self, key, r)
+        cache.setResult(self.name, key, r)
+        return r
+
+    def getSearchKey(self, fields, sortBy, sortOrder, limit=None):
+        '''Returns a hashable key identifying a search in this catalog with
+           these p_fields, sorted according to p_sortBy and p_sortOrder, or
+           by relevance up to p_limit.'''
+        getKey = Operator.getValueKey
+        criteria = tuple([(name, getKey(value)) \
+                          for name, value in sorted(fields.items())])
+        if sortBy: return criteria, sortBy, sortOrder
+        return criteria, None, limit
+
+    def execute(self, fields, sortBy=None, sortOrder='asc', limit=None):
+        '''Executes the search in this catalog as defined by p_fields,
+           p_sortBy, p_sortOrder and p_limit (see m_search) and returns its
+           result.'''
         # p_fields items can be of 2 kinds.
         #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
         # If...    | It determines...
@@ -217,39 +354,34 @@ class Catalog(PersistentMapping):
         # negative | a set of objects that must be excluded from the result. The
         #          | "not" operator is negative.
         #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-        positive = False # True if at least one positive arg is met
-        negative = None # The list of negative args encountered
-        # Browse search values from p_fields. Those values are implicitly
-        # AND-ed: as soon as one value does not match, there is no match at all.
-        for name, value in fields.items():
-            if isinstance(value, Operator) and value.negative:
-                # A negative operator. Do not manage it now, store it for later.
-                neg = (name, value)
-                if negative is None:
-                    negative = [neg]
-                else:
-                    negative.append(neg)
-            else:
-                # A positive operator or a value
-                positive = True
-                # Get the corresponding index
-                index = self.getIndex(name)
-                # Update "r" with the objects matching "value" in index
-                # named "name".
-                r = index.search(value, r)
-                if not r: return # There is no match at all
-        # If there was no positive arg at all, take, as basis for the search,
-        # all instances from this class' catalog.
-        r = self.all if not positive else r
-        if not r or not negative: return r
-        # Apply negative args
-        for name, value in negative:
-            ids = self.getIndex(name).search(value, r)
-            if ids:
-                r = difference(r, ids)
-                if not r: return
+        # Search values from p_fields are implicitly AND-ed: as soon as one
+        # value does not match, there is no match at all. The query plan
+        # determines the order into which they are applied: see
+        # appy/database/plan.py. If there is no positive arg at all, all
+        # instances from this catalog are taken as basis for the search.
+        plan = Plan(self, fields)
+        r = plan.run()
+        if not r: return
+        # Sort the result when required. Else, if a text index has been
+        # searched, sort the result by relevance.
+        if sortBy:
+            r = self.getIndex(sortBy).sort(r, reverse=sortOrder == 'desc')
+        elif plan.ranked:
+            step = plan.ranked
+            r = step.index.rank(step.value, r, limit)
         return r
 
+    def explain(self, handler, secure=True, **fields):
+        '''Runs the query plan corresponding to a search with these p_fields (as
+           for m_search) and returns info about every step of it, in the order
+           they have been applied: index name, search value, estimated number
+           of matching objects, method used to apply the step and size of the
+           result set after having applied it.'''
+        if secure: fields['allowed'] = handler.guard.userAllowed
+        plan = Plan(self, fields)
+        plan.run()
+        return plan.explain()
+
     def reindexObject(self, o, fields=None, indexes=None, unindex=False,
                       exclude=False):
         '''(Re-/un-)indexes this p_o(bject). In most cases, you, app developer,
@@ -292,6 +424,7 @@ class Catalog(PersistentMapping):
                 if changed: r = True
             # Remove it from p_self.all
             self.all.remove(o.iid)
+            self.noteChange(o)
             return r
         # Manage (re)indexing
         if indexes:
@@ -322,5 +455,18 @@ class Catalog(PersistentMapping):
                 if changed: r = True
             # Ensure the object is in p_self.all
             if r: self.all.insert(o.iid)
+        if r: self.noteChange(o)
         return r
+
+    def noteChange(self, o):
+        '''Called when (re/un)indexing p_o has modified this catalog: search
+           results being cached for it may now be obsolete.'''
+        # Results cached across requests are invalidated via this counter
+        self.updates.change(1)
+        # Remove results cached by the handler of the current request, if any
+        try:
+            handler = o.H()
+        except (AttributeError, KeyError):
+            return
+        handler.searches.invalidate(self.name)
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -13,22 +13,6 @@ defaultIndexes = {
     'ClassName': 'FieldIndex', 'Allowed': 'KeywordIndex',
     'Container': 'FieldIndex'}
 
-# Stuff for creating or updating the indexes -----------------------------------
-class TextIndexInfo:
-    '''Parameters for a text ZCTextIndex'''
-    lexicon_id = "text_lexicon"
-    index_type = 'Okapi BM25 Rank'
-
-class XhtmlIndexInfo:
-    '''Parameters for a html ZCTextIndex'''
-    lexicon_id = "xhtml_lexicon"
-    index_type = 'Okapi BM25 Rank'
-
-class ListIndexInfo:
-    '''Parameters for a list ZCTextIndex'''
-    lexicon_id = "list_lexicon"
-    index_type = 'Okapi BM25 Rank'
-
 # ------------------------------------------------------------------------------
 class XhtmlTextExtractor(XmlParser):
     '''Extracts text from XHTML'''
@@ -18,6 +18,7 @@ from appy.database.operators import Operator
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 INVALID_VALUE = 'Index "%s" in catalog "%s": wrong %s "%s".'
+UNKNOWN_FUNCTION = 'Index "%s" in catalog "%s": unknown function "%s".'
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 class Index(persistent.Persistent):
@@ -29,6 +30,18 @@ class Index(persistent.Persistent):
     # Values considered as empty, non-indexable values
     emptyValues = (None, [], ())
 
+    # When sorting a result set, if the number of distinct values stored in
+    # the index is more than this ratio multiplied by the size of the result
+    # set, sorting is performed via the reverse index (see m_sort).
+    SORT_RATIO = 4
+
+    # Can objects be checked one by one, via the reverse index, against a
+    # search value (see m_check) ?
+    checkable = True
+
+    # Are objects found via this index ranked by relevance (see m_rank) ?
+    ranked = False
+
     #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
     # An index is made of 2 principal dicts: "byValue" stores objects keyed
     # by their index values (this is the "forward" index), while "byObject"
@@ -90,6 +103,71 @@ class Index(persistent.Persistent):
         #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
         self.byObject = IOBTree()
 
+    def getIndexValue(self, o):
+        '''Returns the value to index for p_o, converted to the internal
+           representation of this index (see m_toIndexValue).'''
+        r = o.getField(self.name).getIndexValue(o)
+        if r in Index.emptyValues: return r
+        if self.isMultiple(r):
+            return [self.toIndexValue(v) for v in r]
+        return self.toIndexValue(r)
+
+    def toIndexValue(self, value):
+        '''Converts p_value, a value as produced by a field or a search value,
+           to its internal representation in this index. By default, values are
+           stored as is. Index sub-classes may store a more compact
+           representation.'''
+        return value
+
+    def fromIndexValue(self, value):
+        '''Converts p_value, as stored in this index, back to a value as
+           produced by the corresponding field (the reverse operation of
+           m_toIndexValue).'''
+        return value
+
+    def getIds(self, value):
+        '''Returns the set of IDs of the objects having this (single) search
+           p_value, or None if there is no such object. Operators use this
+           method for getting the objects corresponding to every value they
+           mention.'''
+        return self.byValue.get(self.toIndexValue(value))
+
+    def estimate(self, value):
+        '''Estimates the number of objects matching search p_value. Returns a
+           tuple (estimate, ids): if computing the estimate has required to
+           compute the set of matching objects, this set is in "ids".'''
+        try:
+            if isinstance(value, Operator):
+                return value.estimate(self), None
+            ids = self.getIds(value)
+            return (len(ids) if ids else 0), ids
+        except TypeError:
+            self.raiseInvalid(value)
+
+    def contains(self, stored, value):
+        '''Does p_stored, a value stored in p_self.byObject, correspond to this
+           (single) search p_value ?'''
+        value = self.toIndexValue(value)
+        if self.isMultiple(stored, inIndex=True): return value in stored
+        return stored == value
+
+    def check(self, id, value):
+        '''Does the object having this p_id match search p_value ?'''
+        stored = self.byObject.get(id)
+        if stored is None: return False
+        try:
+            if isinstance(value, Operator):
+                return value.check(self, stored)
+            return self.contains(stored, value)
+        except TypeError:
+            self.raiseInvalid(value)
+
+    def raiseInvalid(self, value):
+        '''Raises an error: p_value is not a valid search value'''
+        term = 'operator' if isinstance(value, Operator) else 'index value'
+        raise self.Error(INVALID_VALUE % \
+                         (self.name, self.catalog.name, term, str(value)))
+
     def isMultiple(self, value, inIndex=False):
         '''Is p_value considered to be "multiple"? If yes, p_value will be
            considered as a sequence of several values; each of them must have a
@@ -130,7 +208,7 @@ class Index(persistent.Persistent):
         # Remove reference to p_id for this p_value
         try:
             ids.remove(id)
-        except ValueError:
+        except (KeyError, ValueError):
             pass
         # If no object uses p_value anymore, remove the whole entry
         if not ids:
@@ -149,12 +227,16 @@ class Index(persistent.Persistent):
         else:
             self.removeByValueEntry(value, id)
 
-    def addEntry(self, id, value, byValueOnly=False):
-        '''Add, in this index, an entry with this p_id and p_value.
+    def addByValueEntry(self, value, id):
+        '''Adds (non-multiple) p_value in p_self.byValue, for this p_id'''
+        ids = self.byValue.get(value)
+        if ids is None:
+            self.byValue[value] = IITreeSet((id,))
+        else:
+            ids.insert(id)
 
-           If p_byValueOnly is True, it updates p_self.byValue but not
-           p_self.byObject. It happens when m_addEntry is called recursively,
-           for adding multiple entries corresponding to a multi-value. '''
+    def addEntry(self, id, value):
+        '''Add, in this index, an entry with this p_id and p_value'''
         if self.isMultiple(value):
             # A multi-value. Get it as a ready-to-store value.
             value = self.getMultiple(value)
@@ -162,22 +244,17 @@ class Index(persistent.Persistent):
             self.byObject[id] = value
             # Add one entry for every single value in p_self.byValue
             for v in value:
-                self.addEntry(id, v, byValueOnly=True)
+                self.addByValueEntry(v, id)
         else:
-            # A single value. Add it to p_self.byObject when relevant.
-            if not byValueOnly:
-                self.byObject[id] = value
-            # Add it in p_self.byValue
-            if value in self.byValue:
-                self.byValue[value].insert(id)
-            else:
-                self.byValue[value] = IITreeSet((id,))
+            # A single value
+            self.byObject[id] = value
+            self.addByValueEntry(value, id)
 
     def indexObject(self, o):
         '''Index object p_o. Returns True if the index has been changed
            regarding p_o, ie, entries have been added or removed.'''
         # Get the value to index
-        value = o.getField(self.name).getIndexValue(o)
+        value = self.getIndexValue(o)
         id = o.iid
         if value in Index.emptyValues:
             # There is nothing to index for this object
@@ -218,7 +295,7 @@ class Index(persistent.Persistent):
                 r, rsUpdated = value.apply(self, rs)
             else:
                 # A single value
-                r = self.byValue.get(value, None)
+                r = self.getIds(value)
                 rsUpdated = False
             if r is None:
                 # No match for this index = no match at all
@@ -230,7 +307,155 @@ class Index(persistent.Persistent):
         except TypeError:
             # p_value (or one of the value operators if p_value is an operator)
             # is not a valid value for this index.
-            term = 'operator' if isOperator else 'index value'
-            raise self.Error(INVALID_VALUE % \
-                             (self.name, self.catalog.name, term, str(value)))
+            self.raiseInvalid(value)
+
+    def sort(self, rs, reverse=False):
+        '''Returns the list of iids from result set p_rs, sorted according to
+           values stored in this index, in ascending order or in descending
+           order if p_reverse is True. Objects from p_rs having no value in
+           this index are put at the end of the list.'''
+        # Two strategies can be used. If p_rs is small compared to the number
+        # of distinct values stored in the index, every object's value is
+        # retrieved from the reverse index and the result is sorted in memory.
+        # Else, the forward index is walked, in key order, and every set of
+        # object IDs it stores is intersected with p_rs.
+        if (len(rs) * Index.SORT_RATIO) < len(self.byValue):
+            return self.sortByObject(rs, reverse)
+        return self.sortByValue(rs, reverse)
+
+    def sortByObject(self, rs, reverse):
+        '''Sorts p_rs via the reverse index p_self.byObject'''
+        valued = [] # Tuples (value, iid)
+        empty = [] # IIDs of objects having no value in this index
+        get = self.byObject.get
+        for id in rs:
+            value = get(id)
+            if value is None:
+                empty.append(id)
+                continue
+            if self.isMultiple(value, inIndex=True):
+                # Among multiple values, the first one encountered when walking
+                # the forward index (see m_sortByValue) determines the position
+                value = max(value) if reverse else min(value)
+            valued.append((value, id))
+        # The sort is stable: objects having the same value remain sorted by
+        # iid, in ascending order, like in m_sortByValue.
+        valued.sort(key=lambda item: item[0], reverse=reverse)
+        r = [id for value, id in valued]
+        if empty:
+            r += empty
+        return r
+
+    def getItems(self, reverse=False):
+        '''Returns the (value, ids) pairs from the forward index, in ascending
+           order, or descending order if p_reverse is True.'''
+        byValue = self.byValue
+        if not reverse: return byValue.items()
+        # Walking BTree items backwards via random access restarts from the
+        # first bucket at every bucket change: the tree nodes are rather walked
+        # lazily, from the last one.
+        return self.walkBackwards(byValue, byValue._bucket_type)
+
+    def walkBackwards(self, node, bucketType):
+        '''Yields the (key, value) pairs from BTree p_node, in descending key
+           order. p_bucketType is the class of its buckets.'''
+        #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+        # Node    | Its state (see BTrees' __getstate__)
+        #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+        # Bucket  | ((k0, v0, k1, v1, ...),) or (same tuple, nextBucket)
+        # BTree   | None if empty, (((k0, v0, ...),),) if it has a single
+        #         | bucket, or ((child0, k1, child1, ...), firstBucket)
+        #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+        state = node.__getstate__()
+        if state is None: return
+        data = state[0]
+        if node.__class__ is not bucketType:
+            if data and isinstance(data[0], tuple):
+                # A BTree made of a single bucket, inlined in its state
+                data = data[0][0]
+            else:
+                for i in range(len(data)-1, -1, -2):
+                    yield from self.walkBackwards(data[i], bucketType)
+                return
+        for i in range(len(data)-2, -1, -2):
+            yield data[i], data[i+1]
+
+    def sortByValue(self, rs, reverse):
+        '''Sorts p_rs by walking the forward index p_self.byValue'''
+        r = []
+        # Objects having multiple values may be found several times
+        done = set()
+        total = len(rs)
+        for value, ids in self.getItems(reverse):
+            ids = intersection(ids, rs)
+            if not ids: continue
+            for id in ids:
+                if id not in done:
+                    done.add(id)
+                    r.append(id)
+            # Stop walking the index as soon as all objects are found
+            if len(r) == total: return r
+        # Add objects having no value in this index
+        for id in rs:
+            if id not in done:
+                r.append(id)
+        return r
+
+    def compute(self, function, rs):
+        '''Computes, from the values stored in this index for the objects from
+           result set p_rs, the aggregate corresponding to p_function.'''
+        #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+        # function | Result
+        #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+        # "sum"    | The sum of the values (numeric values only);
+        # "min"    | The lowest value, or None if p_rs is empty;
+        # "max"    | The highest value, or None if p_rs is empty;
+        # "group"  | A dict ~{value: i_count}~ giving, for every value, the
+        #          | number of objects from p_rs having this value.
+        #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+        # For multi-valued objects, every value is taken into account
+        if function not in ('sum', 'min', 'max', 'group'):
+            raise self.Error(UNKNOWN_FUNCTION % \
+                             (self.name, self.catalog.name, function))
+        if not rs:
+            return 0 if function == 'sum' else ({} if function == 'group' \
+                                                   else None)
+        if function in ('min', 'max'):
+            r = self.getBound(rs, function == 'max')
+            return None if r is None else self.fromIndexValue(r)
+        counts = self.getCounts(rs)
+        if function == 'group':
+            return {self.fromIndexValue(value): count \
+                    for value, count in counts.items()}
+        return sum([value * count for value, count in counts.items()])
+
+    def getBound(self, rs, max=False):
+        '''Returns the lowest (or highest if p_max is True) value stored in this
+           index for the objects from result set p_rs.'''
+        # Walk the forward index from the appropriate end and stop at the first
+        # value being used by at least one object from p_rs.
+        for value, ids in self.getItems(max):
+            if intersection(ids, rs): return value
+
+    def getCounts(self, rs):
+        '''Returns a dict ~{value: i_count}~ giving, for every value stored in
+           this index, the number of objects from result set p_rs having it.'''
+        # Choose the same strategy as for sorting: if p_rs is small, use the
+        # reverse index; else, use the forward index.
+        r = {}
+        if (len(rs) * Index.SORT_RATIO) < len(self.byValue):
+            get = self.byObject.get
+            for id in rs:
+                value = get(id)
+                if value is None: continue
+                values = value if self.isMultiple(value, inIndex=True) \
+                               else (value,)
+                for v in values:
+                    r[v] = r.get(v, 0) + 1
+        else:
+            for value, ids in self.byValue.items():
+                count = len(intersection(ids, rs))
+                if count:
+                    r[value] = count
+        return r
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
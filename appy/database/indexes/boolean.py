@@ -0,0 +1,145 @@
+'''Index for boolean values'''
+
+# ~license~
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+from BTrees.Length import Length
+from BTrees.OOBTree import OOBTree
+from BTrees.IIBTree import IIBTree, IISet, IITreeSet, multiunion, \
+                            intersection, difference
+
+from appy.database.indexes import Index
+from appy.database.operators import Operator
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class BooleanIndex(Index):
+    '''Index for boolean values. In most cases, one of the 2 values is used by
+       much less objects than the other one. In order to save space, only the
+       set of objects having this "minority" value is stored in the forward
+       index.'''
+
+    # The minority value becomes the majority value when the number of objects
+    # having it is more than this ratio multiplied by the number of objects
+    # having the other value. The forward index is then rebuilt for the other
+    # value. A ratio higher than 1 prevents rebuilding the index too often when
+    # both values are used by a similar number of objects.
+    BALANCE_RATIO = 2
+
+    def init(self):
+        '''Index values are stored as integers 0 (False) or 1 (True)'''
+        # Dict "byValue" holds at most one entry: the minority value and the
+        # set of objects having it.
+        self.byValue = OOBTree()
+        # Dict "byObject" stores, for every object, its value, as an integer
+        self.byObject = IIBTree()
+        # The minority value
+        self.minority = 1
+        # The number of objects having value 0 and value 1
+        self.counts = (Length(), Length())
+
+    def toIndexValue(self, value):
+        '''Booleans are stored as integers'''
+        return int(bool(value))
+
+    def fromIndexValue(self, value):
+        '''Converts integer p_value back to a boolean'''
+        return bool(value)
+
+    def isMultiple(self, value, inIndex=False):
+        '''A boolean value is never multiple'''
+        return False
+
+    def getMajority(self, rs=None):
+        '''Returns the set of IDs of the objects having the majority value,
+           among those from result set p_rs if it is not None.'''
+        # Indexed objects from p_rs, or all indexed objects...
+        if rs is None:
+            r = multiunion([self.byObject])
+        else:
+            r = intersection(rs, self.byObject)
+        # ... excepted those having the minority value
+        ids = self.byValue.get(self.minority)
+        return difference(r, ids) if ids else r
+
+    def getIds(self, value):
+        '''Returns the set of objects having this p_value'''
+        value = self.toIndexValue(value)
+        if value == self.minority: return self.byValue.get(value)
+        return self.getMajority() or None
+
+    def search(self, value, rs):
+        '''Searching the majority value within result set p_rs does not
+           require to compute the set of all objects having it.'''
+        if isinstance(value, Operator) or \
+           (self.toIndexValue(value) == self.minority) or (rs is None):
+            return Index.search(self, value, rs)
+        return self.getMajority(rs) or None
+
+    def estimate(self, value):
+        '''Counts are maintained for both values'''
+        if isinstance(value, Operator): return Index.estimate(self, value)
+        return self.counts[self.toIndexValue(value)](), None
+
+    def balance(self):
+        '''Ensures the forward index stores the objects having the minority
+           value.'''
+        minority = self.minority
+        majority = 1 - minority
+        count = self.counts[minority]()
+        if count <= (self.counts[majority]() * BooleanIndex.BALANCE_RATIO):
+            return
+        # The minority value has become the majority value: rebuild the forward
+        # index for the other value.
+        ids = self.getMajority()
+        self.byValue.clear()
+        if ids:
+            self.byValue[majority] = IITreeSet(ids)
+        self.minority = majority
+
+    def addEntry(self, id, value):
+        '''Add, in this index, an entry with this p_id and p_value'''
+        self.byObject[id] = value
+        self.counts[value].change(1)
+        if value == self.minority:
+            self.addByValueEntry(value, id)
+        self.balance()
+
+    def removeEntry(self, id):
+        '''Remove the currently indexed value for this p_id'''
+        value = self.byObject[id]
+        del(self.byObject[id])
+        self.counts[value].change(-1)
+        if value == self.minority:
+            self.removeByValueEntry(value, id)
+        self.balance()
+
+    def sort(self, rs, reverse=False):
+        '''Objects from p_rs having value False come first (or last, if
+           p_reverse is True). Objects having no value are put at the end.'''
+        ids = self.byValue.get(self.minority)
+        minority = intersection(rs, ids) if ids else IISet()
+        others = difference(rs, minority)
+        # Among other objects, some may have no value at all
+        majority = intersection(others, self.byObject)
+        empty = difference(others, majority)
+        # Get the sets of objects having values False and True
+        false, true = (majority, minority) if self.minority else \
+                      (minority, majority)
+        first, second = (true, false) if reverse else (false, true)
+        return list(first) + list(second) + list(empty)
+
+    def getCounts(self, rs):
+        '''Returns the number of objects from p_rs having every value'''
+        ids = self.byValue.get(self.minority)
+        minority = len(intersection(rs, ids)) if ids else 0
+        majority = len(intersection(rs, self.byObject)) - minority
+        r = {}
+        if minority: r[self.minority] = minority
+        if majority: r[1 - self.minority] = majority
+        return r
+
+    def getBound(self, rs, max=False):
+        '''Returns the lowest (or highest) value for objects from p_rs'''
+        counts = self.getCounts(rs)
+        if not counts: return
+        return (1 if 1 in counts else 0) if max else (0 if 0 in counts else 1)
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -0,0 +1,32 @@
+'''Index for dates'''
+
+# ~license~
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+from DateTime import DateTime
+from BTrees.IOBTree import IOBTree
+
+from appy.database.indexes import Index
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class DateIndex(Index):
+    '''Index for DateTime values. Dates are stored as integers representing
+       numbers of minutes since the epoch: keys are compact and date ranges
+       are walked very efficiently (see operator
+       appy.database.operators.in_).'''
+
+    def init(self):
+        '''Index values being integers, "byValue" is a IOBTree'''
+        Index.init(self)
+        self.byValue = IOBTree()
+
+    def toIndexValue(self, value):
+        '''Converts DateTime p_value (or a string representation of it) to a
+           number of minutes since the epoch.'''
+        if isinstance(value, int): return value
+        if isinstance(value, str): value = DateTime(value)
+        return int(value.timeTime() // 60)
+
+    def fromIndexValue(self, value):
+        '''Converts this number of minutes since the epoch to a DateTime'''
+        return DateTime(value * 60)
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -0,0 +1,25 @@
+'''Index for multi-valued fields'''
+
+# ~license~
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+from appy.database.indexes import Index
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class KeywordIndex(Index):
+    '''Index for multi-valued fields. For every object, the index stores a
+       sequence of values: the object can be found via any of them.'''
+
+    def getIndexValue(self, o):
+        '''Any non-empty value is stored as a multi-value'''
+        r = Index.getIndexValue(self, o)
+        if (r in Index.emptyValues) or self.isMultiple(r): return r
+        return [r]
+
+    def getMultiple(self, value):
+        '''Duplicate values are removed from p_value'''
+        return tuple(dict.fromkeys(value))
+
+    def valueEquals(self, value, current):
+        '''p_value is a list that may contain duplicates'''
+        return self.getMultiple(value) == current
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
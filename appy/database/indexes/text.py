@@ -0,0 +1,250 @@
+'''Full-text indexes'''
+
+# ~license~
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+import math, heapq
+
+from BTrees.Length import Length
+from BTrees.OIBTree import OIBTree
+from BTrees.IOBTree import IOBTree
+from BTrees.IIBTree import IIBTree, IISet, IITreeSet, multiunion, \
+                            intersection, weightedIntersection
+
+from appy.database.indexes import Index
+from appy.utils.string import normalizeText
+from appy.database.indexer import XhtmlTextExtractor
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+NOT_SORTABLE = 'Index "%s" in catalog "%s" is a text index: it can\'t be ' \
+  'used for sorting or computing.'
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class TextIndex(Index):
+    '''Full-text index. Objects are found via the words of their texts and
+       ranked by relevance, according to the Okapi BM25 ranking function.'''
+
+    # Words whose length is <= this number are not indexed, excepted numbers
+    IGNORE = 2
+
+    # Okapi BM25 parameters. K1 determines the importance of the frequency of a
+    # word within a text; B determines how much the text length is taken into
+    # account.
+    K1 = 1.2
+    B = 0.75
+
+    # Objects are ranked by relevance but can't be checked one by one
+    ranked = True
+    checkable = False
+
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # Search values for a text index are made of words. All the words must be
+    # found in a text for this text to match. A word ending with a star, like
+    # "abc*", matches any word starting with "abc".
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def init(self):
+        '''Initialisation (or cleaning) of the index main data structures'''
+
+        # Dict "lexicon" is a OIBTree of the form ~{s_word: i_wordId}~. Word IDs
+        # are incremental integers, the last one being stored in attribute
+        # "lastWid". Keys being sorted, words starting with a given prefix are
+        # found by walking a range of keys.
+        self.lexicon = OIBTree()
+        self.lastWid = 0
+
+        # Dict "byValue" is a IOBTree of the form ~{i_wordId: postings}~, where
+        # "postings" is a IIBTree of the form ~{i_objectId: i_frequency}~,
+        # giving the number of occurrences of the word in every object's text.
+        self.byValue = IOBTree()
+
+        # Dict "byObject" is a IOBTree of the form ~{i_objectId: wordIds}~,
+        # "wordIds" being the tuple of distinct word IDs from the object's text.
+        self.byObject = IOBTree()
+
+        # Dict "lengths" is a IIBTree of the form ~{i_objectId: i_length}~,
+        # giving the number of words in every object's text.
+        self.lengths = IIBTree()
+        # The number of indexed texts and their total number of words
+        self.count = Length()
+        self.totalLength = Length()
+
+    def getText(self, value):
+        '''Returns the normalized text corresponding to p_value, being a text or
+           a list of texts.'''
+        if isinstance(value, (list, tuple)): value = ' '.join(value)
+        return normalizeText(value)
+
+    def getWords(self, value):
+        '''Returns the list of words from p_value. A word may appear several
+           times in the list.'''
+        ignore = TextIndex.IGNORE
+        return [word for word in self.getText(value).split() \
+                if (len(word) > ignore) or word.isdigit()]
+
+    def getWid(self, word):
+        '''Returns the ID of this p_word, adding it to the lexicon if it is not
+           there yet.'''
+        r = self.lexicon.get(word)
+        if r is None:
+            r = self.lexicon[word] = self.lastWid = self.lastWid + 1
+        return r
+
+    def indexObject(self, o):
+        '''Index object p_o. Returns True if the index has been changed
+           regarding p_o.'''
+        value = o.getField(self.name).getIndexValue(o)
+        words = self.getWords(value) if value else None
+        id = o.iid
+        if not words:
+            # There is nothing to index for this object
+            if id not in self.byObject: return
+            self.removeEntry(id)
+            return True
+        # Count the occurrences of every word
+        frequencies = {}
+        for word in words:
+            wid = self.getWid(word)
+            frequencies[wid] = frequencies.get(wid, 0) + 1
+        if id in self.byObject:
+            # Do nothing if the indexed text has not changed
+            if self.isIndexed(id, frequencies): return
+            self.removeEntry(id)
+        self.addEntry(id, frequencies, len(words))
+        return True
+
+    def isIndexed(self, id, frequencies):
+        '''Are these word p_frequencies already those indexed for this p_id ?'''
+        if len(self.byObject[id]) != len(frequencies): return
+        for wid, frequency in frequencies.items():
+            postings = self.byValue.get(wid)
+            if not postings or (postings.get(id) != frequency): return
+        return True
+
+    def addEntry(self, id, frequencies, length):
+        '''Add, in this index, an entry for this p_id, whose text is made of
+           p_length words, with these word p_frequencies.'''
+        self.byObject[id] = tuple(frequencies.keys())
+        for wid, frequency in frequencies.items():
+            postings = self.byValue.get(wid)
+            if postings is None:
+                postings = self.byValue[wid] = IIBTree()
+            postings[id] = frequency
+        self.lengths[id] = length
+        self.count.change(1)
+        self.totalLength.change(length)
+
+    def removeEntry(self, id):
+        '''Remove the currently indexed text for this p_id'''
+        for wid in self.byObject[id]:
+            postings = self.byValue.get(wid)
+            if postings is None: continue
+            postings.pop(id, None)
+            if not postings:
+                del(self.byValue[wid])
+        del(self.byObject[id])
+        self.totalLength.change(-self.lengths.pop(id, 0))
+        self.count.change(-1)
+
+    def getTerms(self, value):
+        '''Returns the terms of search p_value, as a list of lists of word IDs:
+           an object matches a term if its text contains one of these words.
+           None is returned if at least one term matches no word at all.'''
+        r = []
+        lexicon = self.lexicon
+        for token in value.split():
+            prefix = token.endswith('*')
+            words = normalizeText(token.rstrip('*')).split()
+            if not words: continue
+            # Only the last word from a token can be a prefix
+            last = len(words) - 1
+            for i, word in enumerate(words):
+                if prefix and (i == last):
+                    wids = lexicon.values(word, word + '\uffff')
+                elif (len(word) > TextIndex.IGNORE) or word.isdigit():
+                    wid = lexicon.get(word)
+                    wids = (wid,) if wid is not None else ()
+                else:
+                    # Too short words are not indexed
+                    continue
+                # Words are never removed from the lexicon: ignore those not
+                # being used anymore by any object.
+                wids = [wid for wid in wids if wid in self.byValue]
+                if not wids: return
+                r.append(wids)
+        return r
+
+    def getIds(self, value):
+        '''Returns the set of objects whose text contains all the words from
+           search p_value.'''
+        terms = self.getTerms(value)
+        if not terms: return
+        sets = []
+        for wids in terms:
+            # Postings are mappings: their keys are object IDs
+            sets.append(multiunion([self.byValue[wid] for wid in wids]))
+        # Intersect smaller sets first
+        sets.sort(key=len)
+        r = sets[0]
+        for ids in sets[1:]:
+            r = intersection(r, ids)
+            if not r: return
+        return r
+
+    def rank(self, value, rs, limit=None):
+        '''Returns the list of iids from result set p_rs, sorted by decreasing
+           relevance regarding search p_value. If p_limit is not None, only the
+           p_limit most relevant objects are sorted by relevance: the others
+           follow, in the order of p_rs.'''
+        count = self.count()
+        if not count: return list(rs)
+        if not isinstance(rs, (IISet, IITreeSet)): rs = IITreeSet(rs)
+        average = self.totalLength() / count
+        k1 = TextIndex.K1
+        b = TextIndex.B
+        lengths = self.lengths
+        scores = {}
+        for wids in self.getTerms(value) or ():
+            for wid in wids:
+                postings = self.byValue.get(wid)
+                if not postings: continue
+                # The inverse document frequency of this word
+                n = len(postings)
+                idf = math.log(1 + (count - n + 0.5) / (n + 0.5))
+                # Keep the postings for objects from p_rs, with their frequency
+                items = weightedIntersection(postings, rs, 1, 0)[1]
+                if not items: continue
+                for id, frequency in items.items():
+                    norm = k1 * (1 - b + (b * lengths[id] / average))
+                    score = idf * frequency * (k1 + 1) / (frequency + norm)
+                    scores[id] = scores.get(id, 0) + score
+        # Both sorts are stable: objects having the same score remain sorted in
+        # the order they have been scored.
+        if (limit is None) or (limit >= len(scores)):
+            r = sorted(scores, key=scores.get, reverse=True)
+            if len(r) < len(rs):
+                r += [id for id in rs if id not in scores]
+        else:
+            r = heapq.nlargest(limit, scores, key=scores.get)
+            done = set(r)
+            r += [id for id in rs if id not in done]
+        return r
+
+    def sort(self, rs, reverse=False):
+        '''A text index can't be used for sorting'''
+        raise self.Error(NOT_SORTABLE % (self.name, self.catalog.name))
+
+    def compute(self, function, rs):
+        '''A text index can't be used for computing'''
+        raise self.Error(NOT_SORTABLE % (self.name, self.catalog.name))
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class XhtmlIndex(TextIndex):
+    '''Full-text index for XHTML texts: words are extracted from the text parts
+       of the XHTML code.'''
+
+    def getText(self, value):
+        '''Extracts the normalized text from XHTML p_value'''
+        if isinstance(value, (list, tuple)): value = ' '.join(value)
+        extractor = XhtmlTextExtractor(raiseOnError=False)
+        return extractor.parse('<p>%s</p>' % value)
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
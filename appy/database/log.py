@@ -1,7 +1,7 @@
 '''Appy module managing log files'''
 
 # ------------------------------------------------------------------------------
-import logging, sys, pathlib
+import logging, logging.handlers, sys, queue, pathlib
 from appy.model.utils import Object
 
 # ------------------------------------------------------------------------------
@@ -21,16 +21,23 @@ class Config:
                  siteMessageParts=('ip', 'port', 'command', 'protocol', 'path',
                                    'message'),
                  appMessageParts=('user', 'message'),
-                 siteSep=' | ', appSep=' | '):
+                 siteSep=' | ', appSep=' | ', asynchronous=False):
         '''Initializes the logging configuration options.
            - p_siteDateFormat and p_appDateFormat define the format of dates
              dumped in log messages;
            - p_siteAttributes and p_appAttributes store the list of attributes
              that will be dumped in every log entry;
            - p_siteMessageParts and p_appMessageParts store the list of
-             attributes contained within composite attribute "message";
+             attributes contained within composite attribute "message". Beyond
+             the default ones, these parts are available: "user", "agent"
+             (the browser's user agent) and, for the site log, "wait" (the
+             time spent by the request in the queue of the worker threads, see
+             appy/server/pool.py);
            - p_siteSep and p_appSep store the separators that will be inserted
-             between attributes.
+             between attributes;
+           - if p_asynchronous is True, log entries are put in a queue and
+             written to files by a dedicated thread: threads handling requests
+             never wait for file I/O.
         '''
         # Create a sub-object for splitting site- and app-related configuration
         # options.
@@ -40,6 +47,10 @@ class Config:
                          messageParts=eval('%sMessageParts' % type),
                          sep=eval('%sSep' % type))
             setattr(self, type, sub)
+        self.asynchronous = asynchronous
+        # The QueueListener instances writing log entries, in asynchronous mode,
+        # as tuples (logger, queueHandler, listener).
+        self.listeners = []
 
     def set(self, siteLogFolder, appLogFolder):
         '''Sets site-specific configuration elements'''
@@ -89,7 +100,30 @@ class Config:
         formatter = self.getFormatter(type)
         for handler in logger.handlers:
             handler.setFormatter(formatter)
+        if self.asynchronous:
+            # Replace the handlers with a single one putting log entries in a
+            # queue. A listener thread gets them and calls the real handlers.
+            handlers = logger.handlers[:]
+            for handler in handlers: logger.removeHandler(handler)
+            entries = queue.SimpleQueue()
+            queueHandler = logging.handlers.QueueHandler(entries)
+            logger.addHandler(queueHandler)
+            listener = logging.handlers.QueueListener(entries, *handlers)
+            listener.start()
+            self.listeners.append((logger, queueHandler, listener))
         # Return the created logger
         if created: logger.info('%s created.' % path)
         return logger
+
+    def shutdown(self):
+        '''Flushes and closes all loggers'''
+        # Wait until the listeners have written all queued entries. Then, give
+        # the real handlers back to the loggers: entries logged afterwards are
+        # written synchronously instead of being queued for nobody.
+        for logger, queueHandler, listener in self.listeners:
+            listener.stop()
+            logger.removeHandler(queueHandler)
+            for handler in listener.handlers: logger.addHandler(handler)
+        self.listeners = []
+        logging.shutdown()
 # ------------------------------------------------------------------------------
@@ -3,7 +3,7 @@
 # ~license~
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-from BTrees.IIBTree import multiunion, intersection
+from BTrees.IIBTree import IITreeSet, multiunion, intersection
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 # Searching objects in the database is done via method
@@ -43,6 +43,13 @@ from BTrees.IIBTree import multiunion, intersection
 #
 #                 smartUsers = o.search('User', qi=in_(130, 155))
 #
+# Operators "lt", "le", "gt" and "ge" define ranges having a single bound,
+# respectively: "lower than", "lower than or equal to", "greater than" and
+# "greater than or equal to". Getting all users having a QI above 155 is
+# expressed like this:
+#
+#                 geniuses = o.search('User', qi=gt_(155))
+#
 # The "not" operator allows to define all users not statisfying some condition
 # based on some indexed field. Suppose the user workflow defines these states:
 # active, inactive and registered (=requires validation from a Manager).
@@ -88,6 +95,37 @@ class Operator:
         #           | resultset p_rs. It can be the case for some optimizations.
         #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 
+    def estimate(self, index):
+        '''Returns an estimate of the number of objects from p_index matching
+           this operator, or None if it can't be estimated.'''
+
+    def check(self, index, stored):
+        '''Returns True if p_stored, the value stored in p_index for some
+           object, matches this operator.'''
+        # By default, an operator matches if any of its values matches
+        for value in self.values:
+            if index.contains(stored, value): return True
+        return False
+
+    @classmethod
+    def getValueKey(class_, value):
+        '''Returns a hashable representation of search p_value, that may be an
+           operator, a list of values or a single value.'''
+        if isinstance(value, Operator):
+            return value.getKey()
+        if isinstance(value, (list, tuple, set)):
+            return tuple([class_.getValueKey(v) for v in value])
+        try:
+            hash(value)
+            return value
+        except TypeError:
+            return repr(value)
+
+    def getKey(self):
+        '''Returns a hashable representation of p_self, allowing to identify a
+           search that uses it, ie, for caching search results.'''
+        return (self.__class__.__name__,) + Operator.getValueKey(self.values)
+
     def __repr__(self):
         '''Returns p_self's string representation'''
         stringValues = [str(v) for v in self.values]
@@ -104,7 +142,7 @@ class or_(Operator):
         '''Apply this "or" operator instance on values stored in p_index'''
         r = []
         for value in self.values:
-            ids = index.byValue.get(value, None)
+            ids = index.getIds(value)
             if ids:
                 r.append(ids)
         # If the global resultset p_rs is small, starting with intersecting
@@ -121,13 +159,21 @@ class or_(Operator):
             rsUpdated = False
         return r, rsUpdated
 
+    def estimate(self, index):
+        '''At most, all objects having any of the values match'''
+        r = 0
+        for value in self.values:
+            ids = index.getIds(value)
+            if ids: r += len(ids)
+        return r
+
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 class and_(Operator):
     def apply(self, index, rs):
         '''Apply this "and" operator instance on values stored in p_index'''
         r = []
         for value in self.values:
-            ids = index.byValue.get(value, None)
+            ids = index.getIds(value)
             if ids is None:
                 # There is no match at all
                 return None, True
@@ -142,6 +188,22 @@ class and_(Operator):
                 return None, True
         return rs, True
 
+    def estimate(self, index):
+        '''At most, all objects having the least used value match'''
+        r = None
+        for value in self.values:
+            ids = index.getIds(value)
+            if not ids: return 0
+            size = len(ids)
+            if (r is None) or (size < r): r = size
+        return r
+
+    def check(self, index, stored):
+        '''All values must match'''
+        for value in self.values:
+            if not index.contains(stored, value): return False
+        return True
+
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 class in_(Operator):
     '''Defines a range of values by specifying lower and upper bounds'''
@@ -152,25 +214,104 @@ class in_(Operator):
     # If you want to specify a range whose lower bound is defined, but with no
     # upper bound, use value None as upper bound, as in: qi=in_(100, None).
     # ~~~
+    # Bounds are included in the range, excepted if these attributes are True
+    excludeMin = excludeMax = False
 
     def __init__(self, *values):
         if len(values) != 2:
             raise Exception(RANGE_KO)
         Operator.__init__(self, *values)
 
+    def getBounds(self, index):
+        '''Returns the range bounds, converted to the internal representation of
+           p_index. A None bound means "no bound".'''
+        return [None if v is None else index.toIndexValue(v) \
+                for v in self.values]
+
+    # The number of sets of object IDs that are counted, within the range, in
+    # order to estimate the average number of objects per value.
+    SAMPLE_SIZE = 10
+
+    def estimate(self, index):
+        '''Counting objects within the range would require to walk all the sets
+           of object IDs it contains, which is what we want to avoid. The
+           number of distinct values within the range is multiplied by the
+           average number of objects per value, computed on a sample.'''
+        lo, hi = self.getBounds(index)
+        excludeMin = self.excludeMin and (lo is not None)
+        excludeMax = self.excludeMax and (hi is not None)
+        sets = index.byValue.values(lo, hi, excludemin=excludeMin,
+                                    excludemax=excludeMax)
+        count = len(sets)
+        if count <= in_.SAMPLE_SIZE:
+            return sum([len(ids) for ids in sets])
+        sample = sum([len(sets[i]) for i in range(in_.SAMPLE_SIZE)])
+        return sample * count // in_.SAMPLE_SIZE
+
+    def check(self, index, stored):
+        '''Is p_stored within the range ?'''
+        lo, hi = self.getBounds(index)
+        return self.matches(stored, lo, hi)
+
+    def matches(self, value, lo, hi):
+        '''Is p_value, stored in some index for some object, within the range
+           whose bounds are p_lo and p_hi ?'''
+        if isinstance(value, tuple):
+            # A multi-value: at least one of its values must be in the range
+            for v in value:
+                if self.matches(v, lo, hi): return True
+            return False
+        if lo is not None:
+            if (value < lo) or (self.excludeMin and value == lo): return False
+        if hi is not None:
+            if (value > hi) or (self.excludeMax and value == hi): return False
+        return True
+
     def apply(self, index, rs):
         '''Apply this "in" operator instance on values stored in p_index'''
         # Unwrap the bounds from p_self.values
-        lo, hi = self.values
-        if hi:
-            sets = index.byValue.values(lo, hi)
-        else:
-            sets = index.byValue.values(lo)
-        if len(sets) == 1:
-            r = sets[0]
-        else:
-            r = multiunion(sets)
-        return r, False
+        lo, hi = self.getBounds(index)
+        if (rs is not None) and (len(rs) < or_.RS_LIMIT):
+            # The global resultset p_rs is small: checking, via the reverse
+            # index, if every object from it is in the range is faster than
+            # walking the range in the forward index.
+            get = index.byObject.get
+            r = []
+            for id in rs:
+                value = get(id)
+                if (value is not None) and self.matches(value, lo, hi):
+                    r.append(id)
+            return IITreeSet(r), True
+        # Walk the sets of object IDs whose keys are within the range, in the
+        # forward index, and merge them into a single set.
+        excludeMin = self.excludeMin and (lo is not None)
+        excludeMax = self.excludeMax and (hi is not None)
+        sets = index.byValue.values(lo, hi, excludemin=excludeMin,
+                                    excludemax=excludeMax)
+        return multiunion(sets), False
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class lt_(in_):
+    '''Defines the range of values being strictly lower than some value'''
+    excludeMax = True
+    def __init__(self, value): Operator.__init__(self, None, value)
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class le_(in_):
+    '''Defines the range of values being lower than or equal to some value'''
+    def __init__(self, value): Operator.__init__(self, None, value)
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class gt_(in_):
+    '''Defines the range of values being strictly greater than some value'''
+    excludeMin = True
+    def __init__(self, value): Operator.__init__(self, value, None)
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class ge_(in_):
+    '''Defines the range of values being greater than or equal to some
+       value'''
+    def __init__(self, value): Operator.__init__(self, value, None)
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 class not_(Operator):
@@ -184,7 +325,7 @@ class not_(Operator):
            will be substracted from the global resultset.'''
         r = []
         for value in self.values:
-            ids = index.byValue.get(value, None)
+            ids = index.getIds(value)
             if ids:
                 r.append(ids)
         return multiunion(r), False
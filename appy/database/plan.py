@@ -0,0 +1,140 @@
+'''A query plan determines the order into which search criteria are applied
+   when performing a search in a catalog.'''
+
+# ~license~
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+import sys
+
+from BTrees.IIBTree import IITreeSet, intersection, difference
+
+from appy.model.utils import Object as O
+from appy.database.operators import Operator
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class Step:
+    '''A step in a query plan, applying a single search criterion'''
+
+    def __init__(self, index, value):
+        # The index being searched
+        self.index = index
+        # The search value, that may be an operator
+        self.value = value
+        # Is this criterion "negative" ? (see appy/database/operators.py)
+        self.negative = isinstance(value, Operator) and value.negative
+        # The estimated number of objects matching the criterion. It is None if
+        # the estimate could not be computed.
+        self.estimate = None
+        # Computing the estimate may have required to compute the set of
+        # matching objects: it is then stored here.
+        self.ids = None
+        # The way this step has been applied: "intersect", "search", "filter"
+        # or "exclude" (see m_run), and the size of the resulting set.
+        self.method = None
+        self.size = None
+
+    def computeEstimate(self):
+        '''Estimates the number of objects matching this criterion'''
+        self.estimate, self.ids = self.index.estimate(self.value)
+
+    def filter(self, rs, keep=True):
+        '''Checks, one by one, via the reverse index, whether objects from
+           result set p_rs match this criterion. Those matching it are kept, or
+           excluded if p_keep is False.'''
+        check = self.index.check
+        value = self.value
+        return IITreeSet([id for id in rs if check(id, value) == keep])
+
+    def run(self, rs):
+        '''Applies this step on the result set p_rs computed so far'''
+        index = self.index
+        small = (rs is not None) and (len(rs) <= Plan.FILTER_LIMIT) and \
+                index.checkable
+        if self.negative:
+            if small:
+                # Check the objects one by one
+                self.method = 'filter'
+                r = self.filter(rs, keep=False)
+            else:
+                self.method = 'exclude'
+                ids = index.search(self.value, rs)
+                r = difference(rs, ids) if ids else rs
+        elif self.ids is not None:
+            # The set of matching objects has already been computed
+            self.method = 'intersect'
+            r = intersection(self.ids, rs)
+        elif small:
+            self.method = 'filter'
+            r = self.filter(rs)
+        else:
+            self.method = 'search'
+            r = index.search(self.value, rs)
+        self.size = len(r) if r else 0
+        return r
+
+    def explain(self):
+        '''Returns info about this step'''
+        return O(name=self.index.name, value=self.value,
+                 estimate=self.estimate, method=self.method, size=self.size)
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class Plan:
+    '''A query plan for a catalog search, made of a series of steps, one per
+       search criterion. Positive criteria are applied first, the most
+       selective ones first; negative criteria are applied last.'''
+
+    # When the result set computed so far contains at most this number of
+    # objects, subsequent criteria are checked object per object, via the
+    # reverse index, instead of computing the complete set of objects matching
+    # them.
+    FILTER_LIMIT = 200
+
+    def __init__(self, catalog, fields):
+        # The catalog being searched
+        self.catalog = catalog
+        # The steps, one per search criterion from p_fields, in the order they
+        # will be applied.
+        positive = []
+        negative = []
+        # If a text index is searched, the result may be ranked by relevance:
+        # "ranked" will hold the corresponding step.
+        self.ranked = None
+        for name, value in fields.items():
+            step = Step(catalog.getIndex(name), value)
+            if step.negative:
+                negative.append(step)
+                continue
+            positive.append(step)
+            if (self.ranked is None) and step.index.ranked and \
+               not isinstance(value, Operator):
+                self.ranked = step
+        # Estimate the cardinality of every positive criterion and apply the
+        # most selective ones first.
+        for step in positive:
+            step.computeEstimate()
+        maxsize = sys.maxsize
+        positive.sort(key=lambda step: maxsize if step.estimate is None \
+                                                else step.estimate)
+        self.steps = positive + negative
+        self.positive = bool(positive)
+
+    def run(self):
+        '''Executes the plan and returns the result set, as a IITreeSet, or
+           None if there is no match.'''
+        r = None
+        for step in self.steps:
+            if step.negative and (r is None):
+                # There was no positive criterion at all. Take, as basis for the
+                # search, all instances from the catalog.
+                r = self.catalog.all
+            if step.estimate == 0:
+                # There is no match at all
+                return
+            r = step.run(r)
+            if not r: return
+        return self.catalog.all if not self.steps else r
+
+    def explain(self):
+        '''Returns info about every step of this plan, in the order they have
+           been applied.'''
+        return [step.explain() for step in self.steps]
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
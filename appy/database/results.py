@@ -0,0 +1,85 @@
+'''Lazy sequences of objects resulting from database searches'''
+
+# ~license~
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+from itertools import islice
+from collections.abc import Sequence
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class Results(Sequence):
+    '''Sequence of objects matching a database search. Only object IDs are
+       stored: an object is loaded from the database only when it is accessed,
+       via indexing, slicing or iteration.'''
+
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # Method appy.database.Database::search returns an instance of this class.
+    # When a search matches 100 000 objects and only 30 of them are shown in
+    # the ui, getting results[0:30] loads 30 objects and not 100 000.
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def __init__(self, database, handler, ids):
+        # The appy.database.Database instance
+        self.database = database
+        # The current request handler
+        self.handler = handler
+        # The iids of the matching objects, as produced by method
+        # appy.database.catalog.Catalog::search: a IITreeSet or, if the result
+        # has been sorted, a list of iids.
+        self.ids = ids
+        # Objects may be removed from the results (see m___delitem__). Because
+        # p_ids may be shared with a search cache, they are first copied: this
+        # attribute is True once it is done.
+        self.owned = False
+
+    def __repr__(self):
+        '''p_self's string representation'''
+        return '<Results of %d object(s)>' % len(self.ids)
+
+    def __len__(self): return len(self.ids)
+
+    def getObject(self, id):
+        '''Loads the object having this p_id'''
+        return self.database.getObject(self.handler, id)
+
+    def getIds(self, start, stop, step=1):
+        '''Returns the list of iids ranging from p_start to p_stop'''
+        ids = self.ids
+        if step > 0 and not isinstance(ids, list):
+            # A IITreeSet can't be indexed
+            return list(islice(ids, start, stop, step))
+        # p_start, p_stop and p_step are those produced by slice.indices: they
+        # can't be used as is to slice a list when p_step is negative.
+        ids = ids if isinstance(ids, list) else list(ids)
+        return [ids[i] for i in range(start, stop, step)]
+
+    def __getitem__(self, i):
+        '''Gets the object at index p_i or the list of objects corresponding to
+           slice p_i.'''
+        if isinstance(i, slice):
+            ids = self.getIds(*i.indices(len(self.ids)))
+            return [self.getObject(id) for id in ids]
+        # Get a single object
+        size = len(self.ids)
+        if i < 0: i += size
+        if (i < 0) or (i >= size): raise IndexError(i)
+        return self.getObject(self.getIds(i, i+1)[0])
+
+    def __delitem__(self, i):
+        '''Removes, from p_self, the object at index p_i or the objects
+           corresponding to slice p_i. Objects are not deleted from the
+           database.'''
+        if not self.owned:
+            self.ids = list(self.ids)
+            self.owned = True
+        del self.ids[i]
+
+    def __iter__(self):
+        '''Loads objects one by one while iterating'''
+        for id in self.ids:
+            yield self.getObject(id)
+
+    def __contains__(self, o):
+        '''Is p_o among p_self's objects ?'''
+        id = getattr(o, 'iid', None)
+        return False if id is None else id in self.ids
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
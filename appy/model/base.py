@@ -52,6 +52,7 @@ class Base:
     creator = Computed(method=lambda o: o.history[-1].login, **p)
 
     # Object's creation and last modification dates
+    p['indexed'] = 'DateIndex'
     created = Computed(method=lambda o: o.history[-1].date, **p)
     modified = Computed(method=lambda o: o.history.modified, **p)
 
@@ -62,20 +63,22 @@ class Base:
                    show='result', default=lambda o: o.history[0].state,
                    persist=False, indexed=True, height=5, label='Base')
 
-    # Field "searchable" defines an index containing keywords collected from all
-    # other object fields having attribute searchable=True.
+    # Field "searchable" defines a full-text index containing keywords collected
+    # from all other object fields having attribute searchable=True.
     def getSearchableText(self):
         '''Collects and returns keywords as defined on every field being
            "searchable".'''
-        r = set()
+        r = []
         for field in self.class_.fields.values():
             if not field.searchable: continue
             val = field.getSearchableValue(self)
             if val:
-                r = r.union(val)
-        return list(r) # Appy catalogs don't like sets
+                # A keyword found in several fields is kept several times: it
+                # increases the relevance of the object for this keyword.
+                r += list(val)
+        return r
 
-    searchable = String(show=False, persist=False, indexed=True,
+    searchable = String(show=False, persist=False, indexed='TextIndex',
                         default=getSearchableText, label='Base')
 
     # Field "allowed" defines an index storing the list of roles and users being
@@ -500,8 +503,34 @@ class Base:
         r = self.search(className, **kwargs)
         return r[0] if r else None
 
-    def count(self, *args, **kwargs): pass
-    def compute(self, *args, **kwargs): pass
+    def count(self, className=None, **kwargs):
+        '''Counts the instances of class named p_className (or of self's class
+           if not specified) matching the search criteria in p_kwargs, without
+           loading any object.'''
+        handler = self.H()
+        database = handler.server.database
+        className = className or self.class_.name
+        return database.count(handler, className, **kwargs)
+
+    def explain(self, className=None, **kwargs):
+        '''Returns info about the query plan corresponding to a search for
+           instances of class named p_className (or of self's class if not
+           specified), with these p_kwargs, allowing to understand why a search
+           is slow.'''
+        handler = self.H()
+        database = handler.server.database
+        className = className or self.class_.name
+        return database.explain(handler, className, **kwargs)
+
+    def compute(self, className=None, field=None, function='sum', **kwargs):
+        '''Computes, on instances of class named p_className (or of self's class
+           if not specified) matching the search criteria in p_kwargs, the
+           aggregate p_function ("sum", "min", "max" or "group") of the values
+           of p_field, from its index, without loading any object.'''
+        handler = self.H()
+        database = handler.server.database
+        className = className or self.class_.name
+        return database.compute(handler, className, field, function, **kwargs)
 
     def reindex(self, **kwargs):
         '''(re-/un-)indexes this object in the catalog corresponding to its
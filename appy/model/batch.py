@@ -1,5 +1,6 @@
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 from appy.px import Px
+from appy.database.results import Results
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 class Batch:
@@ -9,6 +10,12 @@ class Batch:
         * page 1 displaying objects 0 to 20 from a list of 43 referred objects.
     '''
     def __init__(self, objects=None, total=0, size=30, start=0, hook=None):
+        # If p_objects is a lazy appy.database.results.Results instance, it
+        # represents the complete list of objects: only those being part of
+        # this batch are loaded from the database.
+        if isinstance(objects, Results):
+            total = total or len(objects)
+            objects = objects[start:start+size] if size else list(objects)
         # The objects being part of this batch
         self.objects = objects
         # The effective number of objects in this batch
@@ -85,6 +92,6 @@ class Batch:
         '''String representation'''
         data = 'start=%d,length=%d,size=%s,total=%d' % \
                (self.start, self.length, self.size, self.total)
-        if self.hook: data = 'hook=%s,%s' (self.hook, data)
+        if self.hook: data = 'hook=%s,%s' % (self.hook, data)
         return '<Batch %s>' % data
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -921,13 +921,15 @@ class Field:
         return value
 
     def getIndexType(self):
-        '''Returns the name of the technical, Zope-level index type for this
-           field.'''
+        '''Returns the name of the index type for this field. The
+           corresponding index class is defined in
+           appy.database.catalog.Catalog.indexClasses.'''
         # Normally, self.indexed contains a Boolean. If a string value is given,
         # we consider it to be an index type. It allows to bypass the standard
         # way to decide what index type must be used.
+        # Field "title" is not indexed in a TextIndex: it must remain sortable.
+        # Words from titles are indexed in field "searchable".
         if isinstance(self.indexed, str): return self.indexed
-        if self.name == 'title': return 'TextIndex'
         return 'FieldIndex'
 
     def getIndexValue(self, o):
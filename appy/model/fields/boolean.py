@@ -147,6 +147,8 @@ class Boolean(Field):
             exec('r = %s' % value)
             return r
 
+    def getIndexType(self): return 'BooleanIndex'
+
     def getSearchValue(self, form):
         '''Converts the raw search value from p_form into a boolean value'''
         r = Field.getSearchValue(self, form)
@@ -3,7 +3,7 @@
 # ~license~
 # ------------------------------------------------------------------------------
 from io import StringIO
-import os, os.path, time, shutil, base64
+import os, os.path, time, shutil, base64, email.utils
 
 from appy.px import Px
 from appy import utils
@@ -164,7 +164,7 @@ class FileInfo:
 
     def writeFile(self, fieldName, fileObj, dbFolder):
         '''Writes to the filesystem the p_fileObj file, that can be:
-           - a Zope FileUpload (coming from a HTTP post);
+           - a FileUpload (coming from a HTTP post, see appy.server.upload);
            - a OFS.Image.File object (legacy within-ZODB file object);
            - another ("not-in-DB") FileInfo instance;
            - a tuple (fileName, fileContent, mimeType)
@@ -198,37 +198,39 @@ class FileInfo:
         self.fsName = '%s%s' % (fieldName, os.path.splitext(name)[1].lower())
         # Write the file on disk (and compute/get its size in bytes)
         fsName = putils.osPathJoin(dbFolder, self.fsPath, self.fsName)
-        f = open(fsName, 'wb')
         if fileType == 'FileUpload':
-            # Write the FileUpload instance on disk
-            self.size = self.replicateFile(fileObj, f)
-        elif fileType == 'File':
-            # Write the File instance on disk
-            if fileObj.data.__class__.__name__ == 'Pdata':
-                # The file content is splitted in several chunks
-                f.write(fileObj.data.data)
-                nextPart = fileObj.data.next
-                while nextPart:
-                    f.write(nextPart.data)
-                    nextPart = nextPart.next
-            else:
-                # Only one chunk
-                f.write(fileObj.data)
-            self.size = fileObj.size
-        elif fileType == 'FileInfo':
-            src = open(fileObj.fsPath, 'rb')
-            self.size = self.replicateFile(src, f)
-            src.close()
+            # Move the uploaded file on disk. If it has been spooled to disk
+            # while the request was read, it is not copied.
+            self.size = fileObj.moveTo(fsName)
         else:
-            # Write fileObj[1] on disk
-            if fileObj[1].__class__.__name__ == 'file':
-                # It is an open file handler
-                self.size = self.replicateFile(fileObj[1], f)
+            f = open(fsName, 'wb')
+            if fileType == 'File':
+                # Write the File instance on disk
+                if fileObj.data.__class__.__name__ == 'Pdata':
+                    # The file content is splitted in several chunks
+                    f.write(fileObj.data.data)
+                    nextPart = fileObj.data.next
+                    while nextPart:
+                        f.write(nextPart.data)
+                        nextPart = nextPart.next
+                else:
+                    # Only one chunk
+                    f.write(fileObj.data)
+                self.size = fileObj.size
+            elif fileType == 'FileInfo':
+                src = open(fileObj.fsPath, 'rb')
+                self.size = self.replicateFile(src, f)
+                src.close()
             else:
-                # We have file content directly in fileObj[1]
-                self.size = len(fileObj[1])
-                f.write(fileObj[1])
-        f.close()
+                # Write fileObj[1] on disk
+                if fileObj[1].__class__.__name__ == 'file':
+                    # It is an open file handler
+                    self.size = self.replicateFile(fileObj[1], f)
+                else:
+                    # We have file content directly in fileObj[1]
+                    self.size = len(fileObj[1])
+                    f.write(fileObj[1])
+            f.close()
         from DateTime import DateTime
         self.modified = DateTime()
 
@@ -258,6 +260,9 @@ class FileInfo:
            last modification date is returned in the HTTP header: this way, the
            browser will only download it if the cached version is older than the
            last version, according to this date.
+
+           Byte serving is supported: if the client requests byte ranges, only
+           these parts of the file are returned.
         '''
         set = response.setHeader
         # The file may not exist on disk
@@ -266,28 +271,36 @@ class FileInfo:
             # Return a dummy file containing an error message
             msg = self.NOT_FOUND % sutils.normalizeString(self.uploadName)
             set('Content-Type', 'text/plain')
-            set('Content-Length', len(msg))
-            response.write(msg)
+            response.build(200, msg)
+            return
+        # The file is directly written on the handler's socket, via sendfile
+        # when possible: p_response must not be built anymore.
+        from appy.server.static import Static
+        handler = response.handler
+        response.sent = True
+        size = os.path.getsize(fsName)
+        modified = os.path.getmtime(fsName)
+        # A cheap ETag, allowing the client to resume a download only if the
+        # file has not changed in the meanwhile.
+        etag = '%x-%x' % (int(modified * 1000000), size)
+        ranges = Static.getRanges(handler, size, etag, modified)
+        if ranges is False:
+            Static.writeUnsatisfiable(handler, size)
             return
         # Initialise response headers
-        set('Content-Type', self.mimeType)
-        set('Content-Length', self.size)
+        handler.send_response(206 if ranges else 200)
+        set = handler.send_header
         set('Content-Disposition',
             '%s;filename="%s"' % (disposition, self.uploadName))
-        # For now, disable byte serving (value "bytes" instead of "none")
-        set('Accept-Ranges', 'none')
+        set('Accept-Ranges', 'bytes')
+        set('ETag', '"%s"' % etag)
         if enableCache:
-            set('Last-Modified', self.modified.rfc822())
+            set('Last-Modified', email.utils.formatdate(modified, usegmt=True))
         else:
             set('Cache-Control', 'no-cache, no-store, must-revalidate')
             set('Expires', '0')
-        # Write the file in the response
-        f = file(fsName, 'rb')
-        while True:
-            chunk = f.read(self.BYTES)
-            if not chunk: break
-            response.write(chunk)
-        f.close()
+        # Write the file, or the requested parts of it, in the response
+        Static.writeBody(handler, fsName, None, size, self.mimeType, ranges)
 
     def dump(self, obj, filePath=None, format=None):
         '''Exports this file to disk (outside the db-controlled filesystem).
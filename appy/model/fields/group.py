@@ -236,7 +236,7 @@ class UiGroup:
     pxFieldset = Px('''
      <fieldset>
       <legend if="field.hasLabel">
-       <i>::_(field.labelId)></i><x if="field.hasHelp">:field.pxHelp</x>
+       <i>::_(field.labelId)</i><x if="field.hasHelp">:field.pxHelp</x>
       </legend>
       <div if="field.hasDescr" class="discreet">::_(field.descrId)</div>
       <x>:field.pxFields</x>
@@ -211,6 +211,9 @@ class Multilingual:
         # Manage multilinguality
         if isinstance(r, dict):
             r = ' '.join([self.getUniIndexValue(o, v) for v in r.values()])
+        elif isinstance(r, list):
+            # A list of values, like keywords for field Base::searchable
+            r = [self.getUniIndexValue(o, v) for v in r]
         else:
             r = self.getUniIndexValue(o, r)
         return r
@@ -195,7 +195,7 @@ class Workflow(Meta):
       <input type="hidden" name="transition"/>
       <input type="hidden" name="popup" value=":popup"/>
       <input type="hidden" name="nav" value=":req.nav or 'no'"/>
-      <input type="hidden" name="page" value=":req.page or 'main')"/>
+      <input type="hidden" name="page" value=":req.page or 'main'"/>
       <!-- Input field for storing the comment coming from the popup -->
       <textarea id="popupComment" name="popupComment" cols="30" rows="3"
                 style="display:none"></textarea>
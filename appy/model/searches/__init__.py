@@ -222,8 +222,9 @@ class Search:
            search in the corresponding catalog ans return the results.'''
         # If p_batch is True, the result is a appy.model.batch.Batch instance
         # returning only a subset of the results starting at p_start and
-        # containing at most p_self.maxPerPage results. Else, it is a list of
-        # objects (or object ids if p_ids is True) representing the complete
+        # containing at most p_self.maxPerPage results: only these objects are
+        # loaded from the database. Else, it is a lazy sequence of objects (or
+        # a list of object ids if p_ids is True) representing the complete
         # result set. If p_ids is True, p_batch is ignored and implicitly
         # considered being False.
         # ~~~
@@ -244,10 +245,17 @@ class Search:
         # ~~~
         # If p_other is not None, it is another Search instance whose parameters
         # will be merged with p_self's parameters.
+        if not sortBy:
+            sortBy = self.sortBy
+            sortOrder = self.sortOrder
+        # When batching, only the objects up to the end of the current page
+        # need to be ranked, if the result is sorted by relevance.
+        limit = start + self.maxPerPage if batch and not ids else None
         r = handler.server.database.search(handler, self.container.name,
-              ids=ids, secure=secure, sortBy=sortBy, sortOrder=sortOrder)
-        if batch:
-            r = Batch(r, total=len(r))
+              ids=ids, secure=secure, sortBy=sortBy, sortOrder=sortOrder,
+              limit=limit)
+        if batch and not ids:
+            r = Batch(r, total=len(r), size=self.maxPerPage, start=start)
         return r
 
     #  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -  -
@@ -25,9 +25,25 @@ class Evaluator:
     emptyContext = {}
     # "podContext" is the current pod context.
 
+    @classmethod
+    def compile(class_, expression, raiseOnError=True):
+        '''Compiles p_expression and returns the corresponding code object.
+           Expressions are compiled once, when the pod template or PX is
+           parsed, and their code objects are evaluated every time the
+           template is rendered. If p_expression can't be compiled and
+           p_raiseOnError is False, p_expression is returned as is: the error
+           will be raised (and dumped in the result) when evaluating it.'''
+        try:
+            # Like function "eval", ignore leading spaces and tabs
+            return compile(expression.lstrip(' \t'), '<string>', 'eval')
+        except SyntaxError:
+            if raiseOnError: raise
+            return expression
+
     @classmethod
     def run(class_, expression, context):
-        '''Evaluates p_expression in this p_context'''
+        '''Evaluates p_expression, being some Python code as a string or a code
+           object as produced by m_compile, in this p_context.'''
         # p_context may be a dict or an instance of appy.model.utils.Object. In
         # this latter case, although it implements dict-like methods, it cannot
         # be used as-is as local context. Indeed, it does not raise a KeyError
@@ -33,8 +33,9 @@ class Action:
         # The buffer hosting the action
         self.buffer = buffer
         # The Python expression to evaluate (may be None in the case of a
-        # Null or Else action, for example).
+        # Null or Else action, for example), and its compiled version.
         self.expr = expr
+        self.code = self.compile(expr) if expr else None
         # The element within the buffer that is the action's target
         self.elem = elem
         # If "minus" is True, the main elem(s) must not be dumped
@@ -43,7 +44,7 @@ class Action:
         # If it is 'from', we must dump what comes from the "from" part of the
         # action (='fromExpr'). See m_setFrom below.
         self.source = 'buffer'
-        self.fromExpr = self.fromPlus = None
+        self.fromExpr = self.fromPlus = self.fromCode = None
         # Several actions may co-exist for the same buffer, as a chain of Action
         # instances, defined via the following attribute.
         self.subAction = None
@@ -53,6 +54,20 @@ class Action:
         self.source = 'from'
         self.fromPlus = plus
         self.fromExpr = expr
+        self.fromCode = Evaluator.compile(expr, not self.buffer.pod)
+
+    def compile(self, expr):
+        '''Compiles p_expr, that can contain an error expr, in the form
+           "normalExpr|errorExpr". Returns a tuple (code, errorCode), errorCode
+           being None if there is no error expr.'''
+        # For a pod template, an invalid expression will produce an error in
+        # the result, when evaluating it.
+        raiseOnError = not self.buffer.pod
+        if '|' not in expr:
+            return Evaluator.compile(expr, raiseOnError), None
+        expr, errorExpr = expr.rsplit('|', 1)
+        return Evaluator.compile(expr, raiseOnError), \
+               Evaluator.compile(errorExpr, raiseOnError)
 
     def getExceptionLine(self, e):
         '''Gets the line describing exception p_e, containing the exception
@@ -86,26 +101,25 @@ class Action:
         PodError.dump(tempBuffer, errorMessage, withinElement=self.elem)
         tempBuffer.evaluate(result, context)
 
-    def _evalExpr(self, expr, context):
-        '''Evaluates p_expr with p_context. p_expr can contain an error expr,
-           in the form "normalExpr|errorExpr". If it is the case, if the
-           "normal" expression raises an error, the "error" expression is
-           evaluated instead.'''
-        if '|' not in expr:
-            r = Evaluator.run(expr, context)
+    def _evalExpr(self, code, context):
+        '''Evaluates p_code with p_context. p_code is a tuple (code, errorCode)
+           as produced by m_compile. If the "normal" code raises an error, the
+           "error" code, if present, is evaluated instead.'''
+        code, errorCode = code
+        if errorCode is None:
+            r = Evaluator.run(code, context)
         else:
-            expr, errorExpr = expr.rsplit('|', 1)
             try:
-                r = Evaluator.run(expr, context)
+                r = Evaluator.run(code, context)
             except Exception:
-                r = Evaluator.run(errorExpr, context)
+                r = Evaluator.run(errorCode, context)
         return r
 
-    def evaluateExpression(self, result, context, expr):
-        '''Evaluates expression p_expr with the current p_context. Returns a
-           tuple (result, errorOccurred).'''
+    def evaluateExpression(self, result, context, expr, code):
+        '''Evaluates expression p_expr, compiled in p_code, with the current
+           p_context. Returns a tuple (result, errorOccurred).'''
         try:
-            res = self._evalExpr(expr, context)
+            res = self._evalExpr(code, context)
             error = False
         except Exception as e:
             # Hack for MessageException instances: always re-raise it as is
@@ -128,7 +142,8 @@ class Action:
             # Evaluate self.expr in eRes
             eRes = None
             if self.expr:
-                eRes,error = self.evaluateExpression(result, context, self.expr)
+                eRes, error = self.evaluateExpression(result, context,
+                                                      self.expr, self.code)
             if not error:
                 # Trigger action-specific behaviour
                 self.do(result, context, eRes)
@@ -149,7 +164,7 @@ class Action:
             fromRes = None
             error = False
             try:
-                fromRes = Evaluator.run(self.fromExpr, context)
+                fromRes = Evaluator.run(self.fromCode, context)
             except Exception as e:
                 msg = FROM_EVAL_ERROR % (self.fromExpr,self.getExceptionLine(e))
                 self.manageError(result, context, msg, e)
@@ -209,7 +224,8 @@ class Else(If):
     def do(self, result, context, exprRes):
         # This action is executed if the tied "if" action is not executed
         ifAction = self.ifAction
-        iRes, error = ifAction.evaluateExpression(result,context,ifAction.expr)
+        iRes, error = ifAction.evaluateExpression(result, context,
+                                                  ifAction.expr, ifAction.code)
         If.do(self, result, context, not iRes)
 
 class For(Action):
@@ -472,6 +488,8 @@ class Variables(Action):
         Action.__init__(self, name, buff, None, elem, minus)
         # Definitions of variables: ~[(s_name|[s_name], s_expr)]~
         self.variables = variables
+        # The compiled expressions, in the same order as p_variables
+        self.codes = [self.compile(expr) for names, expr in variables]
 
     def storeVariable(self, name, value, context, hidden):
         '''Adds a variable named p_name with this p_value in the p_context.
@@ -511,9 +529,9 @@ class Variables(Action):
            values.
         '''
         hidden = None
-        for names, expr in self.variables:
+        for (names, expr), code in zip(self.variables, self.codes):
             # Evaluate variable expression in v_value
-            value, error = self.evaluateExpression(result, context, expr)
+            value, error = self.evaluateExpression(result, context, expr, code)
             if error: return
             if isinstance(names, str):
                 # A single variable name
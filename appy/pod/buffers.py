@@ -56,43 +56,6 @@ EVAL_EXPR_ERROR = 'Error while evaluating expression "%s". %s'
 BAD_META_CONDITION = 'Wrong meta-condition "%s". A meta-condition must be a ' \
   'Python expression surrounded by single or double quotes.'
 
-# ------------------------------------------------------------------------------
-class BufferIterator:
-    def __init__(self, buffer):
-        self.buffer = buffer
-        self.remainingSubBufferIndexes = list(buffer.subBuffers.keys())
-        self.remainingElemIndexes = list(buffer.elements.keys())
-        self.remainingSubBufferIndexes.sort()
-        self.remainingElemIndexes.sort()
-
-    def __iter__(self): return self
-    def __next__(self):
-        # Stop if there is no more elem nor sub-buffer
-        if not self.remainingSubBufferIndexes and not self.remainingElemIndexes:
-            raise StopIteration
-        nextSubBufferIndex = None
-        if self.remainingSubBufferIndexes:
-            nextSubBufferIndex = self.remainingSubBufferIndexes[0]
-        nextExprIndex = None
-        if self.remainingElemIndexes:
-            nextExprIndex = self.remainingElemIndexes[0]
-        # Compute min between nextSubBufferIndex and nextExprIndex
-        if (nextSubBufferIndex != None) and (nextExprIndex != None):
-            res = min(nextSubBufferIndex, nextExprIndex)
-        elif (nextSubBufferIndex == None) and (nextExprIndex != None):
-            res = nextExprIndex
-        elif (nextSubBufferIndex != None) and (nextExprIndex == None):
-            res = nextSubBufferIndex
-        # Update "remaining" lists
-        if res == nextSubBufferIndex:
-            self.remainingSubBufferIndexes = self.remainingSubBufferIndexes[1:]
-            resDict = self.buffer.subBuffers
-        elif res == nextExprIndex:
-            self.remainingElemIndexes = self.remainingElemIndexes[1:]
-            resDict = self.buffer.elements
-        return res, resDict[res]
-    next = __next__ # Python2-3 compliance
-
 # ------------------------------------------------------------------------------
 class Buffer:
     '''Abstract class representing any buffer used during rendering'''
@@ -252,6 +215,29 @@ class FileBuffer(Buffer):
         # should not be a severe problem.
         pass
 
+# ------------------------------------------------------------------------------
+class ResultBuffer(Buffer):
+    '''Buffer into which a PX is rendered'''
+
+    # A MemoryBuffer stores its content as a flat string, because, at parse
+    # time, indexes of elements and sub-buffers are computed from its length.
+    # When rendering a PX, no such index is needed: the result is produced
+    # from a series of writes. Concatenating a string at every write would be
+    # quadratic. A ResultBuffer accumulates chunks in a list instead, that is
+    # joined once, when the result is complete.
+
+    def __init__(self, env):
+        Buffer.__init__(self, env, None)
+        # The list of written chunks
+        self.parts = []
+        self.write = self.parts.append
+
+    def getLength(self): return sum(map(len, self.parts))
+
+    def getValue(self):
+        '''Returns the complete result, as a string'''
+        return ''.join(self.parts)
+
 # ------------------------------------------------------------------------------
 class MemoryBuffer(Buffer):
     class Rex:
@@ -269,6 +255,9 @@ class MemoryBuffer(Buffer):
         self.content = u''
         self.elements = {}
         self.action = None
+        # The evaluation plans for this buffer, keyed by "removeMainElems"
+        # (see m_getPlan).
+        self.plans = {}
 
     def clone(self):
         '''Produces an empty buffer that is a clone of this one'''
@@ -336,6 +325,7 @@ class MemoryBuffer(Buffer):
         # Insert sub-buffer's content info buf.content
         size = len(subBuffer.content)
         buf.content = buf.content[:i] + subBuffer.content + buf.content[i:]
+        buf.plans = {}
         # Increment by 1 all subsequent elements and sub-buffers
         for subType in ('elements', 'subBuffers'):
             subElements = getattr(buf, subType)
@@ -420,6 +410,7 @@ class MemoryBuffer(Buffer):
             del self.subBuffers[subIndex]
             self.subBuffers[self.getLength()] = subBuffer
             self.content += u' '
+            self.plans = {}
 
     def transferAllContent(self):
         '''Transfer all content to parent'''
@@ -469,8 +460,7 @@ class MemoryBuffer(Buffer):
                 if (metaWrap != metaCondition[-1]) or \
                    (metaWrap not in expr.metaWraps):
                     raise ParsingError(BAD_META_CONDITION % metaCondition)
-                expr.metaWrap = metaWrap
-                expr.metaCondition = metaCondition.strip('"\'"')
+                expr.setMetaCondition(metaCondition.strip('"\'"'), metaWrap)
         if tiedHook: tiedHook.tiedExpression = expr
         self.elements[self.getLength()] = expr
         # To be sure that an expr and an elem can't be found at the same index
@@ -669,7 +659,8 @@ class MemoryBuffer(Buffer):
         subBuffersToDelete = []
         elementsToDelete = []
         mustShift = False
-        for itemIndex, item in BufferIterator(self):
+        self.plans = {}
+        for itemIndex, item in self.getEntries():
             if keepFirstPart:
                 if itemIndex >= index:
                     newIndex = itemIndex-index
@@ -796,13 +787,69 @@ class MemoryBuffer(Buffer):
         for index in self.elements.keys():
             if index < pos: del self.elements[index]
 
+    def getEntries(self):
+        '''Returns the elements and sub-buffers of this buffer, as a list of
+           tuples (i_index, entry), sorted by index.'''
+        # At the same index, a sub-buffer comes before an element
+        r = [(i, 0, sub) for i, sub in self.subBuffers.items()]
+        r += [(i, 1, elem) for i, elem in self.elements.items()]
+        r.sort(key=lambda entry: entry[:2])
+        return [(i, entry) for i, type, entry in r]
+
+    # Types of steps in an evaluation plan
+    EXPRESSION = 0 # An Expression
+    ATTRIBUTE = 1  # An Attributes (pod) or Attribute (px) instance
+    ACTION = 2     # A sub-buffer tied to an action
+
+    def getPlan(self, removeMainElems=False):
+        '''Returns the plan for evaluating this buffer, that is computed once,
+           at the first evaluation, or when freezing the buffer.'''
+        # The plan is a tuple (t_steps, s_tail). Every step is a tuple
+        #                  (s_text, i_type, entry)
+        # "text" being the static content preceding the "entry" to evaluate,
+        # whose type is one of the hereabove constants. "tail" is the static
+        # content following the last step. Sub-buffers without action are
+        # static: their content is merged into the surrounding text.
+        r = self.plans.get(removeMainElems)
+        if r is not None: return r
+        if removeMainElems: self.removeAutomaticExpressions()
+        content = self.content
+        steps = []
+        text = []
+        currentIndex = self.getStartIndex(removeMainElems)
+        for index, entry in self.getEntries():
+            text.append(content[currentIndex:index])
+            currentIndex = index + 1
+            if isinstance(entry, Expression):
+                type = MemoryBuffer.EXPRESSION
+            elif isinstance(entry, Attributes) or isinstance(entry, Attribute):
+                type = MemoryBuffer.ATTRIBUTE
+            elif entry.action:
+                type = MemoryBuffer.ACTION
+            else:
+                text.append(entry.content)
+                continue
+            steps.append((''.join(text), type, entry))
+            text = []
+        stopIndex = self.getStopIndex(removeMainElems)
+        if currentIndex < (stopIndex-1):
+            text.append(content[currentIndex:stopIndex])
+        r = self.plans[removeMainElems] = tuple(steps), ''.join(text)
+        return r
+
+    def freeze(self):
+        '''Computes, once parsing is complete, the evaluation plans of this
+           buffer and its sub-buffers.'''
+        self.getPlan()
+        for sub in self.subBuffers.values(): sub.freeze()
+
     reTagContent = re.compile('<(?P<p>[\w-]+):(?P<f>[\w-]+)(.*?)>.*</(?P=p):' \
                               '(?P=f)>', re.S)
     def evaluate(self, result, context, subElements=True,
                  removeMainElems=False):
         '''Evaluates this buffer given the current p_context and add the result
            into p_result. With pod, p_result is the root file buffer; with px
-           it is a memory buffer.'''
+           it is a result buffer.'''
         if not subElements:
             # Dump the root tag in this buffer, but not its content
             res = self.reTagContent.match(self.content.strip())
@@ -816,14 +863,12 @@ class MemoryBuffer(Buffer):
                 r = '<%s:%s%s></%s:%s>' % (g1, g2, g3, g1, g2)
                 result.write(r)
         else:
-            if removeMainElems: self.removeAutomaticExpressions()
-            currentIndex = self.getStartIndex(removeMainElems)
-            for index, evalEntry in BufferIterator(self):
-                result.write(self.content[currentIndex:index])
-                currentIndex = index + 1
-                if isinstance(evalEntry, Expression):
+            steps, tail = self.getPlan(removeMainElems)
+            for text, type, entry in steps:
+                if text: result.write(text)
+                if type == MemoryBuffer.EXPRESSION:
                     try:
-                        res, escape = evalEntry.evaluate(context)
+                        res, escape = entry.evaluate(context)
                         if escape: result.dumpContent(res)
                         else: result.write(res)
                     except actions.EvaluationError as e:
@@ -833,23 +878,18 @@ class MemoryBuffer(Buffer):
                     except Exception as e:
                         if not self.env.raiseOnError:
                             PodError.dump(result, EVAL_EXPR_ERROR % (
-                                          evalEntry.expr, e))
+                                          entry.expr, e))
                         else:
                             raise actions.EvaluationError(e, EVAL_EXPR_ERROR % \
-                                        (evalEntry.expr, '\n'+Traceback.get(5)))
-                elif isinstance(evalEntry, Attributes) or \
-                     isinstance(evalEntry, Attribute):
-                    result.write(evalEntry.evaluate(context))
-                else: # It is a subBuffer
-                    if evalEntry.action:
-                        evalEntry.action.execute(result, context)
-                    else:
-                        result.write(evalEntry.content)
-            stopIndex = self.getStopIndex(removeMainElems)
-            if currentIndex < (stopIndex-1):
-                result.write(self.content[currentIndex:stopIndex])
+                                        (entry.expr, '\n'+Traceback.get(5)))
+                elif type == MemoryBuffer.ATTRIBUTE:
+                    result.write(entry.evaluate(context))
+                else: # A sub-buffer with an action
+                    entry.action.execute(result, context)
+            if tail: result.write(tail)
 
     def clean(self):
         '''Cleans the buffer content'''
         self.content = u''
+        self.plans = {}
 # ------------------------------------------------------------------------------
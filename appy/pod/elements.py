@@ -96,6 +96,12 @@ class Expression(PodElement):
         # Extract parts from expression p_py
         self.escapeXml, self.expr, self.errorExpr = self.extractInfo(py.strip())
         self.pod = pod # True if I work for pod, False if I work for px
+        # The compiled expressions. For a PX, an invalid expression raises an
+        # error now; for a pod template, the error will be dumped in the
+        # result.
+        self.code = Evaluator.compile(self.expr, not pod)
+        self.errorCode = self.errorExpr and \
+                         Evaluator.compile(self.errorExpr, not pod)
         if self.pod:
             # pod-only: store here the expression's true result (before being
             # converted to a string).
@@ -115,6 +121,14 @@ class Expression(PodElement):
         self.metaCondition = None
         # Te meta-condition is "wrapped" around single or double quotes
         self.metaWrap = None
+        # The compiled meta-condition (see m_setMetaCondition)
+        self.metaCode = None
+
+    def setMetaCondition(self, condition, wrap):
+        '''Sets this meta-p_condition, wrapped around p_wrap'''
+        self.metaCondition = condition
+        self.metaWrap = wrap
+        self.metaCode = Evaluator.compile(condition, False)
 
     def getUnevaluatedExpression(self):
         '''Gets the expression in its unevaluated form'''
@@ -129,22 +143,22 @@ class Expression(PodElement):
     def _eval(self, context):
         '''Evaluates self.expr with p_context. If self.errorExpr is defined,
            evaluate it if self.expr raises an error.'''
-        if self.errorExpr:
+        if self.errorCode:
             try:
-                r = Evaluator.run(self.expr, context)
+                r = Evaluator.run(self.code, context)
             except Exception:
-                r = Evaluator.run(self.errorExpr, context)
+                r = Evaluator.run(self.errorCode, context)
         else:
-            r = Evaluator.run(self.expr, context)
+            r = Evaluator.run(self.code, context)
         return r
 
     def _evalMetaCondition(self, context):
         '''Checks whether the expression really needs to be evaluated'''
         # If no meta-condition is present, the expression must be evaluated
-        expr = self.metaCondition
-        if expr == None: return True
+        code = self.metaCode
+        if code is None: return True
         # Evaluate the meta-condition
-        return Evaluator.run(expr, context)
+        return Evaluator.run(code, context)
 
     def evaluate(self, context):
         '''Evaluates the Python expression (self.expr) with a given
@@ -257,10 +271,11 @@ class Attribute(PodElement):
         self.name = name
         # The expression that will compute the attribute value
         self.expr = expr.strip()
+        self.code = Evaluator.compile(self.expr)
 
     def evaluate(self, context):
         # If the expr evaluates to False, we do not dump the attribute at all.
-        if Evaluator.run(self.expr, context):
+        if Evaluator.run(self.code, context):
             return ' %s="%s"' % (self.name, self.name)
         return ''
 # ------------------------------------------------------------------------------
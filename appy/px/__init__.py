@@ -6,10 +6,14 @@
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 import xml.sax
 from appy.model.utils import Object as O
-from appy.pod.buffers import MemoryBuffer
+from appy.px.compiler import Compiler
+from appy.pod.buffers import ResultBuffer
 from appy.xml import xmlPrologue, xhtmlPrologue
 from appy.px.parser import PxParser, PxEnvironment
 
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+PY_SYNTAX_ERROR = 'Invalid Python expression "%s" (%s).'
+
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 class Px:
     '''Represents a (chunk of) PX code'''
@@ -17,6 +21,15 @@ class Px:
     xmlPrologue = xmlPrologue
     xhtmlPrologue = xhtmlPrologue
 
+    # If True, every PX is compiled, at its first call, into a Python function
+    # that is used instead of the interpreter for rendering it. See
+    # appy.px.compiler.Compiler.
+    compiled = False
+
+    # The cache of parsed PX, being an appy.px.cache.Cache instance, or None
+    # if the cache is disabled.
+    cache = None
+
     def __init__(self, content, isFileName=False, partial=True,
                  template=None, hook=None, prologue=None, unicode=True,
                  css=None, js=None, name=None):
@@ -76,6 +89,12 @@ class Px:
             self.content = '<x>%s</x>' % self.content
         # Create a PX parser
         self.parser = PxParser(PxEnvironment(), self)
+        # The function rendering this PX, if compiled (see m_getRenderer). False
+        # means that the PX could not be compiled.
+        self.renderer = None
+        # Get the tree of buffers from the cache, if enabled
+        cache = Px.cache
+        if cache and cache.get(self): return
         # Parses self.content (a PX code in a string) with self.parser, to
         # produce a tree of memory buffers.
         try:
@@ -83,6 +102,24 @@ class Px:
         except xml.sax.SAXParseException as spe:
             self.completeErrorMessage(spe)
             raise spe
+        except SyntaxError as err:
+            # A Python expression could not be compiled. Report it as a parsing
+            # error, at the current position of the parser.
+            message = PY_SYNTAX_ERROR % (err.text, err.msg)
+            spe = xml.sax.SAXParseException(message, err, self.parser.locator)
+            self.completeErrorMessage(spe)
+            raise spe from err
+        # Freeze the tree of buffers into evaluation plans
+        self.parser.env.ast.freeze()
+        if cache: cache.set(self)
+
+    def getRenderer(self):
+        '''Returns the function rendering this PX, compiling it if not done
+           yet, or None if it can't be compiled.'''
+        r = self.renderer
+        if r is None:
+            r = self.renderer = Compiler(self).run() or False
+        return r or None
 
     def compact(self, s):
         '''Removes single-line comments and unnecessary spaces in p_s,
@@ -147,13 +184,17 @@ class Px:
             # Start profiling when relevant
             profiler = self.profiler
             if profiler: profiler.enter(self.name)
-            # Create a Memory buffer for storing the result
+            # Create a buffer for storing the result
             env = self.parser.env
-            result = MemoryBuffer(env, None)
+            result = ResultBuffer(env)
             # Execute the PX
-            env.ast.evaluate(result, context)
+            render = self.getRenderer() if Px.compiled else None
+            if render:
+                render(result, context)
+            else:
+                env.ast.evaluate(result, context)
             # Get the PX result
-            r = result.content
+            r = result.getValue()
             # Count this call and include CSS and JS code when relevant
             pxId = id(self)
             rt = context['_rt_']
@@ -0,0 +1,168 @@
+'''Disk cache of parsed PX'''
+
+# ~license~
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+import io, os, sys, types, pickle, marshal, hashlib, pathlib, tempfile
+
+import appy
+from appy.px import Px
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class Locator:
+    '''Replaces, for a PX loaded from the cache, the locator of its parser'''
+
+    # Once a document has been parsed, the expat locator always returns line 1
+    # and no column. A PX loaded from the cache has not been parsed: this
+    # locator produces the same info for error messages.
+    def getLineNumber(self): return 1
+    def getColumnNumber(self): return None
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class Pickler(pickle.Pickler):
+    '''Pickles the tree of buffers of a PX'''
+
+    # Code objects, for compiled expressions, are not picklable: they are
+    # serialized via module "marshal".
+    dispatch_table = {types.CodeType:
+                      lambda code: (marshal.loads, (marshal.dumps(code),))}
+
+    def __init__(self, file, env):
+        pickle.Pickler.__init__(self, file, pickle.HIGHEST_PROTOCOL)
+        self.env = env
+
+    def persistent_id(self, o):
+        # The PX environment refers to the parser: it is not stored
+        return 'env' if o is self.env else None
+
+class Unpickler(pickle.Unpickler):
+    '''Unpickles the tree of buffers of a PX'''
+
+    def __init__(self, file, env):
+        pickle.Unpickler.__init__(self, file)
+        self.env = env
+
+    def persistent_load(self, id): return self.env
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class Cache:
+    '''Stores, in a file, the trees of buffers produced by parsing PX'''
+
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # Most PX are defined as class attributes and are thus parsed when their
+    # module is imported, at every server startup. When the cache is enabled,
+    # every PX, once parsed, is stored in it, as its frozen tree of buffers
+    # (see appy.pod.buffers.MemoryBuffer::freeze). At the next startup, the
+    # tree is loaded from the cache instead of parsing the PX again. Entries
+    # are keyed by a hash of the PX source. The whole cache is discarded when
+    # Appy's parsing and rendering code or the Python version change.
+    #
+    # The cache is disabled by default. It must be enabled, via m_enable,
+    # before importing the modules defining PX: the script <site>/bin/site does
+    # it if attribute "pxCache" is True in <site>/config.py. It is saved by the
+    # server, once the app has been loaded, and when it stops. Entries that
+    # have not been used since the server started are removed.
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    # The name of the cache file
+    fileName = 'px.cache'
+
+    # The modules whose changes invalidate the cache
+    modules = ('px/__init__.py', 'px/parser.py', 'pod/__init__.py',
+               'pod/buffers.py', 'pod/elements.py', 'pod/actions.py',
+               'xml/__init__.py')
+
+    def __init__(self, folder):
+        # The path to the cache file
+        self.path = pathlib.Path(folder) / Cache.fileName
+        # The version of the code producing and using the cached trees
+        self.version = self.getVersion()
+        # The cached entries, as a dict ~{s_key: b_pickledTree}~, as loaded
+        # from the file.
+        self.entries = {}
+        # The entries being used by the current process
+        self.used = {}
+        self.load()
+
+    @classmethod
+    def enable(class_, folder):
+        '''Enables the cache, stored in p_folder'''
+        Px.cache = Cache(folder)
+
+    def getVersion(self):
+        '''Returns a hash of the Python version and of the Appy code in use'''
+        r = hashlib.sha256(sys.version.encode())
+        for name in Cache.modules:
+            with open(appy.path / name, 'rb') as f:
+                r.update(f.read())
+        return r.hexdigest()
+
+    def load(self):
+        '''Loads the cache file if it exists and corresponds to
+           p_self.version.'''
+        try:
+            with open(self.path, 'rb') as f:
+                version, entries = pickle.load(f)
+        except Exception:
+            # The file does not exist or can't be read
+            return
+        if version == self.version: self.entries = entries
+
+    def getKey(self, content):
+        '''Returns the key of the PX whose source is p_content'''
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def get(self, px):
+        '''Loads, from the cache, the tree of buffers for p_px, whose parser has
+           just been created. Returns True if it was found.'''
+        key = self.getKey(px.content)
+        data = self.used.get(key) or self.entries.get(key)
+        if data is None: return
+        env = px.parser.env
+        try:
+            env.ast = Unpickler(io.BytesIO(data), env).load()
+        except Exception:
+            return
+        px.parser.locator = Locator()
+        self.used[key] = data
+        return True
+
+    def set(self, px):
+        '''Stores, in the cache, the tree of buffers for p_px, that has just
+           been parsed.'''
+        f = io.BytesIO()
+        env = px.parser.env
+        try:
+            Pickler(f, env).dump(env.ast)
+        except Exception:
+            # Some object in the tree can't be pickled
+            return
+        self.used[self.getKey(px.content)] = f.getvalue()
+
+    def save(self):
+        '''Saves the used entries in the cache file, if they differ from the
+           loaded ones.'''
+        if self.used == self.entries: return
+        # Several processes may save the cache at the same time: each one
+        # writes its own temp file, that replaces the cache file once complete.
+        temp = None
+        try:
+            fd, temp = tempfile.mkstemp(dir=self.path.parent, prefix='px',
+                                        suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((self.version, self.used), f,
+                            pickle.HIGHEST_PROTOCOL)
+            os.replace(temp, self.path)
+        except OSError:
+            # The cache is an optimization: failing to save it is not an error
+            if temp:
+                try:
+                    os.remove(temp)
+                except OSError:
+                    pass
+            return
+        self.entries = self.used.copy()
+
+    def __repr__(self):
+        '''p_self's short string representation'''
+        return '<PX cache %s (%d entries)>' % (self.path, len(self.used))
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -0,0 +1,261 @@
+'''Compiles a PX into a Python function'''
+
+# ~license~
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+from appy.pod import Evaluator
+from appy.utils import Traceback
+from appy.pod.elements import Cell, Expression, Attribute
+from appy.pod.buffers import MemoryBuffer, EVAL_EXPR_ERROR
+from appy.pod.actions import If, For, Variables, EvaluationError, \
+                             WRONG_SEQ_TYPE
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+def evalError(e, expr):
+    '''Returns the exception to raise when evaluating p_expr raised p_e'''
+    return EvaluationError(e, EVAL_EXPR_ERROR % (expr, '\n'+Traceback.get(5)))
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class Compiler:
+    '''Generates, from the tree of buffers produced by parsing a PX, the source
+       code of a Python function rendering it, and compiles this function.'''
+
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # By default, a PX is rendered by interpreting its tree of buffers: see
+    # appy.pod.buffers.MemoryBuffer::evaluate. When attribute "compiled" on
+    # class appy.px.Px is True, every PX is rather compiled, the first time it
+    # is called, into a function having this signature:
+    #
+    #                       render(r, c)
+    #
+    # "r" being the ResultBuffer where to dump the result and "c" being the
+    # context. In this function, static content is written as constant
+    # strings, while "for", "if" and "var" statements become native Python
+    # loops and conditionals. The function produces the same result as the
+    # interpreter and raises the same errors. Python expressions are still
+    # evaluated in the context, from their code objects: the generated code
+    # refers to them, and to the actions, via global names like "_12".
+    #
+    # Actions that can't be compiled, like a "for" statement on a table cell,
+    # are executed by the interpreter, from the generated function.
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def __init__(self, px):
+        # The PX to compile
+        self.px = px
+        # The global names available to the generated function
+        self.names = {'run': Evaluator.run, 'evalError': evalError,
+                      'EvaluationError': EvaluationError,
+                      'WRONG_SEQ_TYPE': WRONG_SEQ_TYPE}
+        # The lines of source code for the generated function
+        self.lines = []
+        # Counter used to produce unique names for local variables
+        self.counter = 0
+
+    def ref(self, o):
+        '''Returns the name of a global variable referring to p_o'''
+        name = '_%d' % len(self.names)
+        self.names[name] = o
+        return name
+
+    def getId(self):
+        '''Returns a new number being used to produce unique variable names'''
+        self.counter += 1
+        return self.counter
+
+    def add(self, depth, line):
+        '''Adds this p_line of code, at this p_depth of indentation'''
+        self.lines.append('%s%s' % ('    ' * depth, line))
+
+    def addBlock(self, depth, method, *args):
+        '''Adds, at this p_depth, the block of code produced by calling
+           p_method with these p_args. If the block is empty, "pass" is
+           added.'''
+        count = len(self.lines)
+        method(depth, *args)
+        if len(self.lines) == count: self.add(depth, 'pass')
+
+    def addBuffer(self, depth, buffer):
+        '''Adds the code for evaluating p_buffer'''
+        steps, tail = buffer.getPlan()
+        add = self.add
+        for text, type, entry in steps:
+            if text: add(depth, 'w(%r)' % text)
+            if type == MemoryBuffer.EXPRESSION:
+                self.addExpression(depth, entry)
+            elif type == MemoryBuffer.ATTRIBUTE:
+                if isinstance(entry, Attribute):
+                    add(depth, 'if run(%s, c): w(%r)' % (self.ref(entry.code),
+                        ' %s="%s"' % (entry.name, entry.name)))
+                else:
+                    add(depth, 'w(%s.evaluate(c))' % self.ref(entry))
+            else:
+                self.addAction(depth, entry.action, entry)
+        if tail: add(depth, 'w(%r)' % tail)
+
+    def addExpression(self, depth, expr):
+        '''Adds the code for evaluating this p_expr(ession)'''
+        add = self.add
+        name = self.ref(expr)
+        add(depth, 'try:')
+        if expr.metaCode is not None:
+            # Let the expression manage its meta-condition
+            add(depth+1, 'v, escape = %s.evaluate(c)' % name)
+            add(depth+1, 'if escape: d(v)')
+            add(depth+1, 'else: w(v)')
+        else:
+            code = 'run(%s, c)' % self.ref(expr.code)
+            if expr.errorCode:
+                add(depth+1, 'try:')
+                add(depth+2, 'v = %s' % code)
+                add(depth+1, 'except Exception:')
+                add(depth+2, 'v = run(%s, c)' % self.ref(expr.errorCode))
+            else:
+                add(depth+1, 'v = %s' % code)
+            # Convert the result to a string, like m_evaluate on the expression
+            dump = 'd' if expr.escapeXml else 'w'
+            add(depth+1, 'if v.__class__ is str: %s(v)' % dump)
+            add(depth+1, 'elif v is None: pass')
+            add(depth+1, "elif v.__class__.__name__ == 'Px': " \
+                         "w(v(c, applyTemplate=False))")
+            add(depth+1, 'else: %s(str(v))' % dump)
+        add(depth, 'except EvaluationError:')
+        add(depth+1, 'raise')
+        add(depth, 'except Exception as e:')
+        add(depth+1, 'raise evalError(e, %s.expr)' % name)
+
+    def addBody(self, depth, action, buffer):
+        '''Adds the code executed by p_action when its condition is met: its
+           sub-action or the evaluation of its p_buffer.'''
+        if action.subAction:
+            self.addAction(depth, action.subAction, buffer)
+        else:
+            self.addBuffer(depth, buffer)
+
+    def isCompilable(self, action):
+        '''Can p_action be compiled ?'''
+        class_ = action.__class__
+        if class_ not in (If, For, Variables): return
+        if action.minus or (action.source != 'buffer'): return
+        if class_ is For:
+            return not isinstance(action.elem, Cell) and \
+                   ('_all_' not in action.iters)
+        return True
+
+    def addAction(self, depth, action, buffer):
+        '''Adds the code for executing p_action, tied to p_buffer'''
+        name = self.ref(action)
+        if not self.isCompilable(action):
+            self.add(depth, '%s.execute(r, c)' % name)
+            return
+        # Evaluating an action expression
+        value = '%s.evaluateExpression(r, c, %s.expr, %s.code)[0]' % \
+                (name, name, name)
+        class_ = action.__class__
+        if class_ is If:
+            self.add(depth, 'if %s:' % value)
+            self.addBlock(depth+1, self.addBody, action, buffer)
+            if buffer.isMainElement(Cell.OD):
+                self.add(depth, 'else:')
+                self.add(depth+1, 'r.dumpElement(%r)' % Cell.OD.elem)
+        elif class_ is For:
+            self.addFor(depth, action, buffer, name, value)
+        else:
+            self.addVariables(depth, action, buffer, name)
+
+    def addFor(self, depth, action, buffer, name, value):
+        '''Adds the code for executing this "for" p_action'''
+        add = self.add
+        n = self.getId()
+        elems, hidden, loop, outer, i, item, loops = \
+          ['%s%d' % (prefix, n) for prefix in 'ehloixs']
+        iters = action.iters
+        add(depth, '%s = %s' % (elems, value))
+        add(depth, 'try:')
+        add(depth+1, 'iter(%s)' % elems)
+        add(depth, 'except TypeError as te:')
+        add(depth+1, '%s.manageError(r, c, WRONG_SEQ_TYPE %% %s.expr, te)' % \
+                     (name, name))
+        # Remember variables hidden by iterators
+        add(depth, '%s = {}' % hidden)
+        for var in iters:
+            add(depth, 'if %r in c: %s[%r] = c[%r]' % (var, hidden, var, var))
+        add(depth, '%s, %s = %s.initialiseLoop(c, %s)' % \
+                   (loop, outer, name, elems))
+        add(depth, '%s = -1' % i)
+        add(depth, 'for %s in %s:' % (item, elems))
+        d = depth + 1
+        add(d, '%s += 1' % i)
+        add(d, '%s.nb = %s' % (loop, i))
+        add(d, '%s.first = %s == 0' % (loop, i))
+        add(d, '%s.last = %s == (%s.length-1)' % (loop, i, loop))
+        add(d, '%s.even = (%s%%2) == 0' % (loop, i))
+        add(d, '%s.odd = not %s.even' % (loop, loop))
+        if len(iters) == 1:
+            add(d, 'c[%r] = %s' % (iters[0], item))
+        else:
+            add(d, '%s.updateContext(c, %s)' % (name, item))
+        self.addBody(d, action, buffer)
+        add(d, '%s.previous = %s' % (loop, item))
+        # Delete the loop object and restore the overridden one if any
+        add(depth, "%s = c['loop']" % loops)
+        add(depth, 'try:')
+        add(depth+1, 'delattr(%s, %r)' % (loops, iters[0]))
+        add(depth, 'except AttributeError:')
+        add(depth+1, 'pass')
+        add(depth, 'if %s: setattr(%s, %r, %s)' % (outer, loops, iters[0],
+                                                    outer))
+        add(depth, '%s._all_.pop()' % loops)
+        # Restore hidden variables and remove iterator variables
+        add(depth, 'c.update(%s)' % hidden)
+        add(depth, 'if %s:' % elems)
+        for var in iters:
+            add(depth+1, 'if (%r not in %s) and (%r in c): del c[%r]' % \
+                         (var, hidden, var, var))
+
+    def addVariables(self, depth, action, buffer, name):
+        '''Adds the code for executing this "var" p_action'''
+        add = self.add
+        hidden = 'h%d' % self.getId()
+        add(depth, '%s = None' % hidden)
+        i = 0
+        for names, expr in action.variables:
+            add(depth, 'v = %s.evaluateExpression(r, c, %s.variables[%d][1], ' \
+                       '%s.codes[%d])[0]' % (name, name, i, name, i))
+            store = '%s = %s.storeVariable(%%r, %%s, c, %s)' % \
+                    (hidden, name, hidden)
+            if isinstance(names, str):
+                add(depth, store % (names, 'v'))
+            else:
+                j = 0
+                for var in names:
+                    add(depth, store % (var, 'v[%d]' % j))
+                    j += 1
+            i += 1
+        self.addBody(depth, action, buffer)
+        # Restore hidden variables and remove the others
+        add(depth, 'if %s: c.update(%s)' % (hidden, hidden))
+        for names, expr in action.variables:
+            if isinstance(names, str): names = (names,)
+            for var in names:
+                add(depth, '%s.removeVariable(%r, c, %s)' % (name, var, hidden))
+
+    def getSource(self):
+        '''Returns the source code of the render function'''
+        self.add(0, 'def render(r, c):')
+        self.add(1, 'w = r.write')
+        self.add(1, 'd = r.dumpContent')
+        self.addBuffer(1, self.px.parser.env.ast)
+        return '\n'.join(self.lines)
+
+    def run(self):
+        '''Returns the render function for p_self.px, or None if the PX could
+           not be compiled.'''
+        try:
+            code = compile(self.getSource(), '<px %s>' % (self.px.name or ''),
+                           'exec')
+        except (SyntaxError, RecursionError):
+            # The PX is too deeply nested, or too big, to be compiled
+            return
+        exec(code, self.names)
+        return self.names['render']
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
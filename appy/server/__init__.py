@@ -2,24 +2,30 @@
 
 # ~license~
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-import os, sys, time, socket, socketserver, logging, pathlib
+import os, sys, time, socket, pathlib
 from http.server import HTTPServer
 from appy import utils
 from appy.database import Database
+from appy.px import Px
 from appy.model import Model
 from appy.utils import url as uutils
+from appy.server.pool import Pool
+from appy.server.front import Front
+from appy.server.session import Sessions
 from appy.model.utils import Object as O
-from appy.server.static import Config as StaticConfig
+from appy.server.static import Static, Config as StaticConfig
 from appy.server.handler import HttpHandler, InitHandler
 
 # Constants  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 START_CLASSIC = ':: Starting server ::'
 START_CLEAN = ':: Starting clean mode ::'
 START_RUN = ':: Starting run mode (%s) ::'
+START_POPULATE = ':: Starting populate mode ::'
 READY = '%s:%s ready (process ID %d).'
 STOP_CLASSIC = ':: %s:%s stopped ::'
 STOP_CLEAN = ':: Clean end ::'
 STOP_RUN = ':: Run end ::'
+STOP_POPULATE = ':: Populate end ::'
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 class Config:
@@ -33,6 +39,37 @@ class Config:
         self.protocol = 'http'
         # Configuration for static content (set by m_set below)
         self.static = None
+        # Requests are handled by a pool of worker threads, whose size is
+        # defined here.
+        self.threads = 20
+        # Requests waiting for a worker thread to be available are queued. When
+        # this number of requests are queued, any additional request is refused
+        # with a 503 (Service Unavailable) response.
+        self.queueSize = 100
+        # If "front" is True, connections are accepted by an asynchronous front
+        # server (see appy/server/front.py), serving static content by itself
+        # and transmitting dynamic requests to the pool of worker threads. Slow
+        # clients and idle connections do not block worker threads anymore.
+        self.front = False
+        # The number of seconds after which a silent connection is closed.
+        # With a front server, connections are persistent (HTTP/1.1
+        # keep-alive): it is the time an idle connection is kept open. Without
+        # it, the connection is closed after every response.
+        self.timeout = 5
+        # Responses are compressed with gzip, if the client accepts it, and if
+        # their size is at least "compressThreshold" bytes. "compressLevel" is
+        # the zlib compression level, from 1 (fastest) to 9 (smallest).
+        # Compressed static resources are cached.
+        self.compress = True
+        self.compressThreshold = 1024
+        self.compressLevel = 6
+        # The maximum size, in bytes, of a request body, ie, a form containing
+        # uploaded files. Bigger requests are refused with a 413 (Payload Too
+        # Large) response. None means: no limit.
+        self.maxBodySize = 100 * 1024 * 1024
+        # Uploaded files are kept in memory up to this size, in bytes. Beyond
+        # it, they are spooled to disk, in the database binaries folder.
+        self.spoolSize = 1024 * 1024
 
     def set(self, appFolder):
         '''Sets site-specific configuration elements'''
@@ -61,11 +98,11 @@ class Config:
         s.close()
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-class Server(socketserver.ThreadingMixIn, HTTPServer):
+class Server(HTTPServer):
     '''Appy HTTP server'''
 
-    # Terminate threads when the main process is terminated
-    daemon_threads = True
+    # Requests are handled by a fixed-size pool of worker threads (see
+    # appy/server/pool.py), instead of creating a new thread for every request.
     # Store, for every logged user, the date/time of its last access
     loggedUsers = {}
 
@@ -77,6 +114,8 @@ class Server(socketserver.ThreadingMixIn, HTTPServer):
             text = START_CLEAN
         elif self.mode == 'run':
             text = START_RUN % method
+        elif self.mode == 'populate':
+            text = START_POPULATE
         self.loggers.app.info(text)
 
     def logShutdown(self):
@@ -88,6 +127,8 @@ class Server(socketserver.ThreadingMixIn, HTTPServer):
             text = STOP_CLEAN
         elif self.mode == 'run':
             text = STOP_RUN
+        elif self.mode == 'populate':
+            text = STOP_POPULATE
         self.loggers.app.info(text)
 
     def __init__(self, config, mode, method=None):
@@ -97,16 +138,18 @@ class Server(socketserver.ThreadingMixIn, HTTPServer):
         config.check()
         # p_mode can be:
         # ----------------------------------------------------------------------
-        # "fg"     | Server start, in the foreground (debug mode)
-        # "bg"     | Server start, in the background
-        # "clean"  | Special mode for cleaning the database
-        # "run"    | Special mode for executing a single p_method on the
-        #          | application tool.
+        # "fg"       | Server start, in the foreground (debug mode)
+        # "bg"       | Server start, in the background
+        # "clean"    | Special mode for cleaning the database
+        # "run"      | Special mode for executing a single p_method on the
+        #            | application tool.
+        # "populate" | Special mode for populating indexes whose population
+        #            | has been deferred at server startup.
         # ----------------------------------------------------------------------
-        # Modes "clean" and "run" misuse the server to perform a specific task.
-        # In those modes, the server is not really started (it does not listen
-        # to a port) and is shutdowned immediately after the task has been
-        # performed.
+        # Modes "clean", "run" and "populate" misuse the server to perform a
+        # specific task. In those modes, the server is not really started (it
+        # does not listen to a port) and is shutdowned immediately after the
+        # task has been performed.
         # ----------------------------------------------------------------------
         self.mode = mode
         self.classic = mode in ('fg', 'bg')
@@ -114,6 +157,8 @@ class Server(socketserver.ThreadingMixIn, HTTPServer):
         cfg = config.log
         self.loggers = O(site=cfg.getLogger('site'),
                          app=cfg.getLogger('app', mode != 'bg'))
+        for type in ('site', 'app'):
+            HttpHandler.compileLog(getattr(cfg, type))
         self.logStart(method)
         try:
             # Load the application model. As a side-effect, the app's po files
@@ -122,14 +167,25 @@ class Server(socketserver.ThreadingMixIn, HTTPServer):
             # Initialise the HTTP server
             cfg = config.server
             if self.classic:
-                HTTPServer.__init__(self, (cfg.address, cfg.port), HttpHandler)
+                # If a front server is used, it is him that listens to the port
+                HTTPServer.__init__(self, (cfg.address, cfg.port), HttpHandler,
+                                    bind_and_activate=not cfg.front)
+                self.pool = Pool(self, cfg.threads, cfg.queueSize)
+                self.front = Front(self) if cfg.front else None
+            # Create the cache of authenticated sessions
+            self.sessions = Sessions(config.security)
             # Create the initialisation handler
             handler = InitHandler(self)
             # Initialise the database. More precisely, it connects to it and
             # performs the task linked to p_self.mode.
             config.database.getDatabase(self, handler, poFiles, method=method)
+            # Enable the PX compiler when relevant
+            Px.compiled = config.ui.compilePx
+            # The app has been loaded: save the PX parsed in the meanwhile
+            if Px.cache: Px.cache.save()
             # Initialise the static configuration
             cfg.static.init(config.ui)
+            Static.compressRam(cfg)
             # Remove the initialisation handler
             InitHandler.remove()
         except (Model.Error, Database.Error) as err:
@@ -142,6 +198,18 @@ class Server(socketserver.ThreadingMixIn, HTTPServer):
         if self.classic:
             self.loggers.app.info(READY % (cfg.address, cfg.port, os.getpid()))
 
+    def serve_forever(self, poll_interval=0.5):
+        '''Handles requests until m_shutdown is called'''
+        if self.front:
+            self.front.run()
+        else:
+            HTTPServer.serve_forever(self, poll_interval)
+
+    def process_request(self, request, client_address):
+        '''Puts this p_request in the queue of requests to be handled by the
+           pool of worker threads.'''
+        self.pool.add(request, client_address)
+
     def handle_error(self, request, client_address):
         '''Handles an exception raised while a handler processes a request'''
         self.logTraceback()
@@ -154,14 +222,21 @@ class Server(socketserver.ThreadingMixIn, HTTPServer):
         '''Normal server shutdown'''
         # Logs the shutdown
         self.logShutdown()
-        # Shutdown the loggers
-        logging.shutdown()
+        # Stop accepting requests and wait until the worker threads have handled
+        # the queued ones: they still need the database and the loggers.
+        if self.classic:
+            if self.front:
+                self.front.stop()
+            else:
+                HTTPServer.shutdown(self)
+            self.pool.stop()
         # Shutdown the database
         database = self.database
         if database: database.close()
-        # Call the base method
-        if self.classic:
-            HTTPServer.shutdown(self)
+        # Save the PX parsed since the server started
+        if Px.cache: Px.cache.save()
+        # Shutdown the loggers, last
+        self.config.log.shutdown()
 
     def abort(self, error=None):
         '''Server shutdown following an error'''
@@ -170,10 +245,10 @@ class Server(socketserver.ThreadingMixIn, HTTPServer):
             self.loggers.app.error(error)
         else:
             self.logTraceback()
-        # Shutdown the loggers
-        logging.shutdown()
         # If the database was already there, close it
         if hasattr(self, 'database'): self.database.close()
+        # Shutdown the loggers
+        self.config.log.shutdown()
         # Exit
         sys.exit(1)
 
@@ -182,14 +257,23 @@ class Server(socketserver.ThreadingMixIn, HTTPServer):
            or a CSS file, named p_name. If p_ram is True, p_base is ignored and
            replaced with the RAM root. If p_bg is True, p_name is an image that
            is meant to be used in a "style" attribute for defining the
-           background image of some XHTML tag.'''
+           background image of some XHTML tag.
+
+           The URL includes the hash of the resource's content: the browser
+           can cache it "forever", because, as soon as the resource changes,
+           its URL changes, too.'''
         cfg = self.config.server
         # If no extension is found in p_name, we suppose it is a png image
+        params = ''
         if name:
-            name = '/%s' % name if '.' in name else '/%s.png' % name
+            if '.' not in name: name = '%s.png' % name
+            hash = None if '?' in name else \
+                   Static.getUrlHash(cfg.static, base, name, ram)
+            if hash: params = '?%s=%s' % (Static.HASH_PARAM, hash)
+            name = '/%s' % name
         # Patch p_base if the static resource is in RAM
         if ram: base = cfg.static.ramRoot
-        r = '%s/%s/%s%s' % (cfg.getUrl(), cfg.static.root, base, name)
+        r = '%s/%s/%s%s%s' % (cfg.getUrl(), cfg.static.root, base, name, params)
         return r if not bg else 'background-image: url(%s)' % r
 
     def getUrlParams(self, params):
@@ -0,0 +1,293 @@
+'''Asynchronous front server for the Appy HTTP server'''
+
+# ~license~
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+import io, socket, asyncio, concurrent.futures
+from http.server import BaseHTTPRequestHandler
+
+from appy.server.static import Static
+from appy.server.request import BODY_TOO_LARGE
+from appy.server.handler import Handler, HttpHandler
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+FRONT_READY = 'Front server listening on %s:%s.'
+CHUNKED_KO = 'Chunked request bodies are not supported (%s).'
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class FrontHandler(Handler, BaseHTTPRequestHandler):
+    '''Handler used by the front server for parsing requests and serving static
+       content.'''
+
+    # Unlike a HttpHandler, this handler does not handle the request within its
+    # constructor: the front server reads the request from the network and
+    # calls the handler's methods. Standard methods for parsing the request
+    # and producing response headers are inherited from
+    # BaseHTTPRequestHandler, but the response is written in a memory buffer,
+    # from which the front server sends it, asynchronously, to the client.
+    # Dynamic requests are not managed by this handler: they are transmitted to
+    # the pool of worker threads, handling them via HttpHandler instances.
+
+    fake = False
+    protocol_version = 'HTTP/1.1'
+    server_version = HttpHandler.server_version
+    determineType = HttpHandler.determineType
+
+    def __init__(self, server, clientAddress, head):
+        # The Appy HTTP server instance
+        self.server = server
+        self.client_address = clientAddress
+        # The request line and headers, as bytes
+        self.rfile = io.BytesIO(head)
+        self.raw_requestline = self.rfile.readline()
+        # The response is written in this buffer
+        self.wfile = io.BytesIO()
+        # Parts of files to send as (part of) the response body, as a list of
+        # tuples (b_before, s_path, i_offset, i_count): "before" is the part of
+        # the response preceding the file part.
+        self.files = []
+
+    def flush(self):
+        '''Returns the content of the response buffer and empties it'''
+        wfile = self.wfile
+        r = wfile.getvalue()
+        wfile.seek(0)
+        wfile.truncate()
+        return r
+
+    def sendFile(self, path, offset, count):
+        '''Called by class Static: p_count bytes from the file @p_path, starting
+           at p_offset, must be sent as (part of) the response body.'''
+        # The file will be sent by the front server, asynchronously
+        self.files.append((self.flush(), path, offset, count))
+
+    # Disable standard log
+    def log_message(self, format, *args): pass
+    def log_error(self, format, *args): pass
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class Body(io.RawIOBase):
+    '''Raw file-like object from which a worker thread reads a request: its
+       head is in memory, its body is read from the client, chunk by chunk, as
+       the worker consumes it.'''
+
+    def __init__(self, channel, head, length):
+        self.channel = channel
+        # The request line and headers, as bytes
+        self.head = head
+        # The number of body bytes still to be read from the client
+        self.remaining = length
+
+    def readable(self): return True
+
+    def readinto(self, buffer):
+        '''Fills p_buffer with the next bytes of the request'''
+        size = len(buffer)
+        if self.head:
+            data = self.head[:size]
+            self.head = self.head[size:]
+        elif self.remaining:
+            size = min(size, self.remaining)
+            channel = self.channel
+            data = channel.wait(channel.reader.read(size))
+            self.remaining -= len(data)
+            # The client closed the connection before sending the whole body
+            if not data: self.remaining = 0
+        else:
+            return 0
+        buffer[:len(data)] = data
+        return len(data)
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class Channel:
+    '''Socket-like object allowing a worker thread to handle, via a HttpHandler,
+       a request received by the front server.'''
+
+    # Once this number of bytes have been written to the client without being
+    # flushed, the worker thread waits until the client has read them.
+    HIGH_WATER = 64 * 1024
+
+    def __init__(self, loop, reader, writer, head, length, timeout=None):
+        self.loop = loop
+        # The asyncio streams from and to the client socket
+        self.reader = reader
+        self.writer = writer
+        # The request line and headers are in p_head, but its body, of
+        # p_length bytes, is still to be read, by the worker, from p_reader.
+        self.body = Body(self, head, length)
+        # The maximum number of seconds the worker waits for the client
+        self.timeout = timeout
+        # The number of bytes written since the last flush
+        self.pending = 0
+        # The start of the response, until the end of its headers
+        self.head = b''
+        # This future is resolved when the request has been handled
+        self.done = loop.create_future()
+
+    def wait(self, coroutine):
+        '''Runs this p_coroutine in the front server's loop and waits for its
+           result, from the worker thread.'''
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        try:
+            return future.result(self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise socket.timeout('timed out')
+
+    def makefile(self, mode, buffering=None):
+        '''Returns the file-like object from which the request is read'''
+        if not buffering or buffering < 0: buffering = io.DEFAULT_BUFFER_SIZE
+        return io.BufferedReader(self.body, buffering)
+
+    def sendall(self, data):
+        '''Transmits p_data to the client, from the worker thread'''
+        data = bytes(data)
+        if b'\r\n\r\n' not in self.head:
+            self.head += data
+        self.loop.call_soon_threadsafe(self.writer.write, data)
+        # Wait until the client has read a large response, instead of
+        # buffering it in memory.
+        self.pending += len(data)
+        if self.pending > Channel.HIGH_WATER:
+            self.pending = 0
+            self.wait(self.writer.drain())
+
+    def settimeout(self, timeout): self.timeout = timeout
+    def setsockopt(self, *args): pass
+    def shutdown(self, how): pass
+
+    def close(self):
+        '''Called by the server when the request has been handled'''
+        self.loop.call_soon_threadsafe(self.finish)
+
+    def finish(self):
+        '''Resolves p_self.done with the response head'''
+        if not self.done.done():
+            self.done.set_result(self.head)
+
+    @classmethod
+    def keepAlive(class_, head):
+        '''May the connection be kept alive after having sent a response whose
+           status line and headers are in p_head ?'''
+        head = head.split(b'\r\n\r\n', 1)[0].lower()
+        if not head.startswith(b'http/1.1'): return
+        if b'\r\nconnection: close' in head: return
+        return b'\r\ncontent-length:' in head or b' 304 ' in head[:13]
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class Front:
+    '''Asynchronous front server, accepting connections, serving static content
+       and transmitting dynamic requests to the pool of worker threads.'''
+
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # When server config attribute "front" is True, instead of accepting
+    # connections in a blocking loop, the Appy HTTP server runs this front
+    # server, based on asyncio. Every connection is managed by a coroutine:
+    # idle keep-alive connections and slow clients cost almost nothing. Static
+    # content is served by the front server itself, files being sent via
+    # loop.sendfile. Only dynamic requests are transmitted to the pool of
+    # worker threads, that handles them via the standard HttpHandler.
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def __init__(self, server):
+        # The Appy HTTP server
+        self.server = server
+        self.config = server.config.server
+        self.loop = None
+        self.stopped = None
+
+    def run(self):
+        '''Runs the front server until m_stop is called'''
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        '''Main coroutine'''
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        cfg = self.config
+        server = await asyncio.start_server(self.handle, cfg.address,
+                                            cfg.port, reuse_address=True)
+        self.server.loggers.app.info(FRONT_READY % (cfg.address, cfg.port))
+        async with server:
+            await self.stopped.wait()
+
+    def stop(self):
+        '''Stops the front server'''
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+    async def handle(self, reader, writer):
+        '''Manages a connection from a client'''
+        address = writer.get_extra_info('peername')[:2]
+        timeout = self.config.timeout
+        try:
+            while True:
+                # Wait for a request. Close the connection if the client
+                # remains idle for too long.
+                try:
+                    head = await asyncio.wait_for(
+                      reader.readuntil(b'\r\n\r\n'), timeout)
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+                        asyncio.TimeoutError, ConnectionError):
+                    break
+                if not await self.handleRequest(reader, writer, address, head):
+                    break
+        except ConnectionError:
+            pass
+        except Exception:
+            self.server.logTraceback()
+        finally:
+            writer.close()
+
+    async def handleRequest(self, reader, writer, address, head):
+        '''Manages a request whose request line and headers are in p_head.
+           Returns True if the connection can be kept alive.'''
+        handler = FrontHandler(self.server, address, head)
+        ok = handler.parse_request()
+        # Send the error response or the "100 Continue" interim response
+        # produced while parsing the request.
+        writer.write(handler.flush())
+        if not ok: return
+        keep = not handler.close_connection
+        handler.determineType()
+        if handler.static:
+            code = Static.get(handler)
+            for before, path, offset, count in handler.files:
+                writer.write(before)
+                # The client may have closed the connection in the meanwhile
+                if writer.is_closing(): return
+                with open(path, 'rb') as f:
+                    await self.loop.sendfile(writer.transport, f, offset,
+                                             count)
+            writer.write(handler.flush())
+            await writer.drain()
+            handler.log('site', 'info', str(code))
+            return keep and not handler.close_connection
+        # Read the request body
+        if handler.headers.get('Transfer-Encoding'):
+            handler.log('app', 'error', CHUNKED_KO % handler.path)
+            handler.send_error(411)
+            writer.write(handler.flush())
+            return
+        length = int(handler.headers.get('Content-Length') or 0)
+        maxSize = self.config.maxBodySize
+        if maxSize and (length > maxSize):
+            handler.log('app', 'error', BODY_TOO_LARGE % (length, maxSize))
+            handler.send_error(413)
+            writer.write(handler.flush())
+            return
+        # Any "100 Continue" response has already been sent
+        lines = [line for line in head.split(b'\r\n') \
+                 if not line.lower().startswith(b'expect:')]
+        # Transmit the request to the pool of worker threads and wait until it
+        # has been handled. The body is not read here: the worker reads it
+        # from the client while handling the request.
+        channel = Channel(self.loop, reader, writer, b'\r\n'.join(lines),
+                          length, self.config.timeout)
+        self.server.pool.add(channel, address)
+        head = await channel.done
+        await writer.drain()
+        # If the worker has not read the whole body, the next request can't be
+        # found on this connection.
+        if channel.body.remaining: return
+        return keep and Channel.keepAlive(head)
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -32,7 +32,7 @@ class Cookie:
             cookie = handler.resp.headers['Cookies'][Cookie.name]
         if not cookie: return None, None, None
         unquoted = urllib.parse.unquote(cookie).encode('utf-8')
-        cookieValue = base64.decodestring(unquoted).decode('utf-8')
+        cookieValue = base64.decodebytes(unquoted).decode('utf-8')
         if ':' not in cookieValue: return None, None, None
         # Extract the context from the cookieValue
         r, context = cookieValue.rsplit(':', 1)
@@ -45,7 +45,7 @@ class Cookie:
         '''Encode p_login, p_password and p_ctx into the authentication
            cookie.'''
         r = '%s:%s:%s' % (login, password, ctx or '')
-        r = base64.encodestring(r.encode('utf-8')).rstrip()
+        r = base64.encodebytes(r.encode('utf-8')).rstrip()
         handler.resp.setCookie(Cookie.name, urllib.parse.quote(r))
 
     @classmethod
@@ -68,6 +68,9 @@ class Cookie:
         # Do it only if the cookie exists
         if Cookie.name in handler.req:
             handler.resp.setCookie(Cookie.name, 'deleted')
+            # Forget the corresponding session
+            sessions = handler.server.sessions
+            if sessions: sessions.remove(handler.req[Cookie.name])
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 class Config:
@@ -96,6 +99,11 @@ class Config:
         # authentication for achieving single-sign-on (SSO), place an instance
         # of appy.server.sso.Config in the field below.
         self.sso = None
+        # Users authenticated via the Appy authentication cookie are cached,
+        # in order to avoid authenticating them again and computing their
+        # roles on every request (see appy/server/session.py). This is the
+        # maximum number of cached sessions. 0 disables the cache.
+        self.sessionCacheSize = 1000
 
     def check(self):
         '''Check this config'''
@@ -128,21 +136,37 @@ class Guard:
         # Unwrap some useful objects
         self.model = handler.server.model
         self.config = handler.server.config
-        # Authenticate the currently logged user and get its User instance
-        self.user = User.authenticate(self)
         # Info about the currently selected authentication context
         self.authContext = None
-        # Cache info about this user
-        self.cache()
+        # Get the currently logged user from its cached session if any
+        sessions = None if handler.fake else handler.server.sessions
+        session = sessions.get(self) if sessions else None
+        if session:
+            self.user = session.user
+            self.cache(session)
+        else:
+            # Authenticate the currently logged user and get its User instance
+            self.user = User.authenticate(self)
+            # Cache info about this user
+            self.cache()
+            if sessions: sessions.set(self)
 
-    def cache(self):
+    def cache(self, session=None):
         '''Pre-compute, for performance, heavily requested information about the
-           currently logged user.'''
+           currently logged user. If his p_session is given, this information
+           is retrieved from it.'''
         u = self.user
-        self.userLogin = u.login
-        self.userLogins = u.getLogins(compute=True, guard=self)
-        self.userRoles = u.getRoles(compute=True, guard=self)
-        self.userAllowed = u.getAllowedValue(self.userRoles, self.userLogins)
+        if session:
+            self.userLogin = session.login
+            self.userLogins = session.logins
+            self.userRoles = session.roles
+            self.userAllowed = session.allowed
+        else:
+            self.userLogin = u.login
+            self.userLogins = u.getLogins(compute=True, guard=self)
+            self.userRoles = u.getRoles(compute=True, guard=self)
+            self.userAllowed = u.getAllowedValue(self.userRoles,
+                                                 self.userLogins)
         self.userLanguage = u.getLanguage() if not self.handler.fake else 'en'
 
     # In the remaining of this class, when talking about "the user", we mean
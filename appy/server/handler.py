@@ -64,6 +64,40 @@ class MethodsCache(dict):
         self[key] = r
         return r
 
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class SearchesCache(dict):
+    '''A dict of catalog search results, used to avoid performing more than once
+       the same search while handling a request. Every handler implements such a
+       cache.'''
+
+    # The dict is of the form ~{s_className: {key: result}}~, where "className"
+    # is the name of the class whose catalog is searched, "key" identifies the
+    # search (see appy.database.catalog.Catalog::getSearchKey) and "result" is
+    # the result of the search, as returned by method
+    # appy.database.catalog.Catalog::search. Results being unsorted IITreeSet
+    # objects or sorted lists of iids, they must never be modified in place.
+
+    def getResult(self, className, key):
+        '''Returns a tuple (found, result): "found" is True if the search
+           identified by p_key in the catalog for p_className is in the cache,
+           and "result" is the cached result.'''
+        results = self.get(className)
+        if results is None or key not in results: return False, None
+        return True, results[key]
+
+    def setResult(self, className, key, result):
+        '''Caches this search p_result'''
+        results = self.get(className)
+        if results is None:
+            results = self[className] = {}
+        results[key] = result
+
+    def invalidate(self, className):
+        '''Removes any cached result for searches in the catalog corresponding
+           to p_className, because one of its objects has been
+           (re/un)indexed.'''
+        if className in self: del self[className]
+
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 class Handler:
     '''Abstract handler'''
@@ -74,8 +108,9 @@ class Handler:
     #              | request is managed by a thread. At server startup, a
     #              | configurable number of threads are run and are waiting for
     #              | requests. Every time a request hits the server, it is
-    #              | assigned to a thread, that instantiates a handler and
-    #              | manages the request.
+    #              | queued and assigned to the first available thread, that
+    #              | instantiates a handler and manages the request (see
+    #              | appy/server/pool.py).
     #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
     #  InitHandler | When the Appy HTTP server starts, it is like if he had to
     #              | handle a virtual request. For that special case, an
@@ -118,6 +153,8 @@ class Handler:
         # than once the same method. Only methods without args are cached, like
         # methods defined on field attributes such as "show".
         self.methods = MethodsCache()
+        # Searches performed while handling a request are cached, too
+        self.searches = SearchesCache()
         # Appy and apps may use the following object to cache any other element
         self.cache = O()
         # Create a guard, a transient object for managing security
@@ -130,11 +167,28 @@ class Handler:
         if not hasattr(self.tool, 'initialiseHandler'): return
         self.tool.initialiseHandler(self)
 
-    # This dict allows, on a concrete handler, to find the data to log
+    # This dict allows, on a concrete handler, to find the data to log. Every
+    # entry is a Python expression, in which "self" is the handler and
+    # "message" is the message to log. Expressions are compiled once (see
+    # m_compileLog).
     logAttributes = O(ip='self.client_address[0]',
       port='str(self.client_address[1])', command='self.command',
       path='self.path', protocol='self.request_version', message='message',
-      user='self.guard.userLogin', agent='self.headers.get("User-Agent")')
+      user='self.guard.userLogin', agent='self.headers.get("User-Agent")',
+      wait='self.server.pool.getWait()')
+
+    @classmethod
+    def compileLog(class_, cfg):
+        '''Compiles the expressions producing the message parts, as defined in
+           p_cfg.messageParts, for the site or app log whose config is p_cfg.
+           Functions are stored in p_cfg.getters and returned.'''
+        r = []
+        for part in cfg.messageParts:
+            expression = getattr(class_.logAttributes, part)
+            if expression:
+                r.append(eval('lambda self, message: %s' % expression))
+        cfg.getters = r
+        return r
 
     def log(self, type, level, message=None):
         '''Logs, in the logger determined by p_type, a p_message at some
@@ -147,9 +201,9 @@ class Handler:
         cfg = getattr(server.config.log, type)
         # Get the parts of the message to dump
         r = []
-        for part in cfg.messageParts:
+        for get in cfg.getters or Handler.compileLog(cfg):
             try:
-                value = eval(getattr(Handler.logAttributes, part))
+                value = get(self, message)
                 if value is not None:
                     r.append(value)
             except AttributeError:
@@ -222,6 +276,21 @@ class HttpHandler(Handler, BaseHTTPRequestHandler):
     # Tell clients the server name and version
     server_version = 'Appy/%s' % Version.short
 
+    # By default, the connection is closed after every response (HTTP/1.0).
+    # Indeed, without a front server, an idle persistent connection would keep
+    # a worker thread busy. Connections are persistent (HTTP/1.1) only when
+    # managed by the front server (see appy/server/front.py): every response
+    # includes a Content-Length, allowing it to keep the connection alive.
+    protocol_version = 'HTTP/1.0'
+
+    def setup(self):
+        '''Sets the protocol version and the timeout after which a silent
+           connection is closed.'''
+        cfg = self.server.config.server
+        if cfg.front: self.protocol_version = 'HTTP/1.1'
+        self.timeout = cfg.timeout
+        BaseHTTPRequestHandler.setup(self)
+
     def init(self):
         '''Appy-specific handler initialisation for handling non-static content
            (called by m_do_GET or m_do_POST).'''
@@ -235,8 +304,8 @@ class HttpHandler(Handler, BaseHTTPRequestHandler):
         self.validator = None
         # Search criteria may be cached
         self.criteria = None
-        # Initialise a database connection
-        self.connection = self.server.database.openConnection()
+        # Get the database connection dedicated to the current worker thread
+        self.connection = self.server.database.getConnection()
         # Must we commit data into the database ?
         self.commit = False
         # Set here a link to the tool. The handler object will be heavily
@@ -246,19 +315,21 @@ class HttpHandler(Handler, BaseHTTPRequestHandler):
         # Cal the base handler's method
         Handler.init(self)
 
-    def finish(self):
-        '''Appy-specific handler termination when serving dynamic content
-          (called by the base handler).'''
-        # Not-initialized handlers are run for an unknown reason
-        if not hasattr(self, 'path'):
-            self.log('app', 'error', 'Uninitialized handler run')
-            return
-        # Subsequent code is for non-static handlers only
-        if self.static: return
+    def terminate(self):
+        '''Appy-specific handler termination after having served dynamic
+           content. On a persistent connection, the handler may still handle
+           subsequent requests. If m_init has failed, only what it has
+           initialised is released.'''
         # Remove myself from the registry (for now)
-        Handler.remove()
-        # Close the database connection
-        self.server.database.closeConnection(self.connection)
+        if Handler.registry.get(threading.get_ident()) is self:
+            Handler.remove()
+        # Remove uploaded files not having been stored in the database
+        if self.req: self.req.close()
+        # Release the database connection. It is not closed but kept for the
+        # next request handled by the current worker thread. Until m_init gets
+        # it, attribute "connection" is the client socket, like "request".
+        if self.connection is not self.request:
+            self.server.database.releaseConnection(self.connection)
 
     def do_GET(self):
         '''Called when a HTTP GET request hits the server'''
@@ -272,30 +343,46 @@ class HttpHandler(Handler, BaseHTTPRequestHandler):
             code = Static.get(self)
         else:
             # Initialise the handler
-            self.init()
-            # Run a traversal
-            self.traversal = traversal = Traversal(handler=self)
+            self.req = None
             try:
-                r = traversal.run()
-                code = 200
-            except Traversal.Error as err:
-                code = 404
-                r = Error.get(code, traversal)
-            except Guard.Error as err:
-                code = 403
-                r = Error.get(code, traversal)
-            except Exception as err:
-                code = 500
-                r = Error.get(code, traversal)
-            # Build the HTTP response
-            self.resp.build(code, r)
-            # Perform a database commit when appropriate
-            if self.commit: self.server.database.commit(self)
+                try:
+                    self.init()
+                except Request.Error as err:
+                    # The request body could not be read
+                    code = err.code
+                    self.log('app', 'error', str(err))
+                    self.send_error(code)
+                else:
+                    code = self.serve()
+            finally:
+                self.terminate()
         # Log this hit and the response code on the site log
         self.log('site', 'info', str(code))
 
     do_POST = do_GET
 
+    def serve(self):
+        '''Serves dynamic content and returns the HTTP code'''
+        # Run a traversal
+        self.traversal = traversal = Traversal(handler=self)
+        try:
+            r = traversal.run()
+            code = 200
+        except Traversal.Error as err:
+            code = 404
+            r = Error.get(code, traversal)
+        except Guard.Error as err:
+            code = 403
+            r = Error.get(code, traversal)
+        except Exception as err:
+            code = 500
+            r = Error.get(code, traversal)
+        # Build the HTTP response
+        self.resp.build(code, r)
+        # Perform a database commit when appropriate
+        if self.commit: self.server.database.commit(self)
+        return code
+
     def getLayout(self):
         '''Try to deduce the current layout from the traversal, if present'''
         traversal = getattr(self, 'traversal', None)
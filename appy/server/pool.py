@@ -0,0 +1,120 @@
+'''Pool of worker threads handling the requests hitting the Appy HTTP server'''
+
+# ~license~
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+import time, queue, threading
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+QUEUE_FULL = 'Request queue full (%d): 503 returned to %s.'
+UNAVAILABLE = 'The server is currently overloaded. Please retry later.'
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class Pool:
+    '''A fixed number of worker threads, waiting for requests to handle in a
+       bounded queue.'''
+
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # Every time a connection is accepted by the server, the corresponding
+    # request is put in the queue. As soon as a worker thread is available, it
+    # gets the oldest request from the queue and handles it. If all workers are
+    # busy and the queue is full, the request is refused: a response with code
+    # 503 (Service Unavailable) is immediately returned.
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    # At shutdown, the maximum time, in seconds, to wait for the workers to
+    # handle the queued requests (see m_stop).
+    STOP_TIMEOUT = 30
+
+    def __init__(self, server, size, queueSize):
+        # The Appy HTTP server
+        self.server = server
+        # The number of worker threads
+        self.size = size
+        # The queue of requests waiting to be handled, as tuples
+        #            (request, client_address, f_queuedAt)
+        self.queue = queue.Queue(maxsize=queueSize)
+        # Thread-specific data: for every worker, attribute "wait" stores the
+        # time, in seconds, the currently handled request has spent in the
+        # queue.
+        self.local = threading.local()
+        # Becomes True when the workers must stop (see m_stop)
+        self.stopped = False
+        # Start the workers
+        self.workers = []
+        for i in range(size):
+            worker = threading.Thread(target=self.work, daemon=True,
+                                      name='Appy-worker-%d' % (i+1))
+            worker.start()
+            self.workers.append(worker)
+
+    def add(self, request, clientAddress):
+        '''Adds this p_request in the queue, or refuses it if the queue is
+           full.'''
+        try:
+            self.queue.put_nowait((request, clientAddress, time.time()))
+        except queue.Full:
+            self.refuse(request, clientAddress)
+
+    def refuse(self, request, clientAddress):
+        '''Returns a 503 response for this p_request'''
+        server = self.server
+        server.loggers.app.warning(QUEUE_FULL % (self.queue.maxsize,
+                                                 clientAddress[0]))
+        body = UNAVAILABLE.encode()
+        head = 'HTTP/1.1 503 Service Unavailable\r\n' \
+               'Content-Type: text/plain;charset=utf-8\r\n' \
+               'Content-Length: %d\r\nRetry-After: 5\r\n' \
+               'Connection: close\r\n\r\n' % len(body)
+        try:
+            request.sendall(head.encode() + body)
+        except OSError:
+            pass
+        server.shutdown_request(request)
+
+    def work(self):
+        '''Main loop of a worker thread'''
+        server = self.server
+        local = self.local
+        while True:
+            item = self.queue.get()
+            # A None item means: stop the worker
+            if item is None: break
+            request, clientAddress, queuedAt = item
+            local.wait = time.time() - queuedAt
+            try:
+                server.finish_request(request, clientAddress)
+            except Exception:
+                server.handle_error(request, clientAddress)
+            finally:
+                server.shutdown_request(request)
+            if self.stopped and self.queue.empty(): break
+        # Wake up the next worker waiting for a request, in order to stop it
+        self.wakeUp()
+
+    def wakeUp(self):
+        '''Puts a None item in the queue, without blocking, in order to stop a
+           worker.'''
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            # Workers are busy: they will check flag p_self.stopped
+            pass
+
+    def getWait(self):
+        '''Returns the time spent in the queue by the request being handled by
+           the current worker, as a string, in milliseconds.'''
+        return '%dms' % round(self.local.wait * 1000)
+
+    def stop(self, wait=True):
+        '''Stops the workers, once they have handled the queued requests. If
+           p_wait is True, it waits for them, at most Pool.STOP_TIMEOUT
+           seconds. Signalling the workers never blocks, even if the queue is
+           full.'''
+        self.stopped = True
+        # Every stopping worker wakes up the next one
+        self.wakeUp()
+        if not wait: return
+        end = time.time() + Pool.STOP_TIMEOUT
+        for worker in self.workers:
+            worker.join(max(0, end - time.time()))
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
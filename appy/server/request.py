@@ -4,13 +4,24 @@
 # ~license~
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 from appy.model.utils import Object
+from appy.server.upload import FileUpload, MultiPartParser
 # Check https://stackoverflow.com/questions/4233218/python-how-do-i-get-key-\
 #          value-pairs-from-the-basehttprequesthandler-http-post-h
 
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+BODY_TOO_LARGE = 'Request body too large (%d bytes, max %d).'
+
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 class Request(Object):
     '''Represents data coming from a HTTP request'''
 
+    class Error(Exception):
+        '''Raised when the request body can't be read'''
+        def __init__(self, message, code=400):
+            Exception.__init__(self, message)
+            # The HTTP code of the error response
+            self.code = code
+
     @classmethod
     def create(class_, handler):
         '''Analyses various elements from an incoming HTTP request (GET
@@ -26,21 +37,16 @@ class Request(Object):
             req.parse(params)
             # As a side-effect, remove parameters from the last part
             parts[-1] = lastPart
-        # Get POST form data if any
-        contentType = handler.headers['Content-Type']
-        if contentType:
-            # Get the request length and content
-            length = int(handler.headers['Content-Length'])
-            content = handler.rfile.read(length).decode('utf-8')
-            # Several content encodings are possible
-            if contentType == 'application/x-www-form-urlencoded':
-                # Form elements are encoded in a way similar to GET parameters
-                req.parse(content)
-            elif contentType.startswith('multipart/form-data'):
-                # Form elements are encoded in a "multi-part" message, whose
-                # elements are separated by some boundary text.
-                boundary = contentType[contentType.index('boundary=')+9:]
-                req.parseMultiPart(content, boundary)
+        # Get the request body, if any. It must be read, even if it is not
+        # used: on a persistent connection, the next request follows it.
+        length = int(handler.headers['Content-Length'] or 0)
+        if length:
+            try:
+                req.readBody(handler, length)
+            except Exception:
+                # Remove the files uploaded so far
+                req.close()
+                raise
         # Get Cookies
         cookieString = handler.headers['Cookie']
         if cookieString is not None:
@@ -48,6 +54,45 @@ class Request(Object):
             req.parse(cookieString, sep=';')
         return req
 
+    def readBody(self, handler, length):
+        '''Reads the request body, made of p_length bytes, and adds to p_self
+           one attribute per form element found in it.'''
+        cfg = handler.server.config.server
+        maxSize = cfg.maxBodySize
+        if maxSize and (length > maxSize):
+            # Do not read the body: the connection can't be reused
+            handler.close_connection = True
+            raise Request.Error(BODY_TOO_LARGE % (length, maxSize), 413)
+        rfile = handler.rfile
+        contentType = handler.headers['Content-Type'] or ''
+        if contentType.startswith('multipart/form-data'):
+            # Form elements are encoded in a "multi-part" message, whose
+            # elements are separated by some boundary text. The body is parsed
+            # while being read: file contents are not kept in memory.
+            boundary = contentType[contentType.index('boundary=')+9:]
+            boundary = boundary.split(';', 1)[0].strip('"')
+            folder = handler.server.config.database.binariesFolder
+            parser = MultiPartParser(rfile, length, boundary, cfg.spoolSize,
+                                     folder)
+            try:
+                for name, value in parser.run():
+                    setattr(self, name.strip(), value)
+            except MultiPartParser.Error as err:
+                handler.close_connection = True
+                raise Request.Error(str(err))
+            return
+        content = rfile.read(length)
+        # Get POST form data if any
+        if contentType.startswith('application/x-www-form-urlencoded'):
+            # Form elements are encoded in a way similar to GET parameters
+            self.parse(content.decode('utf-8', 'replace'))
+
+    def close(self):
+        '''Releases the files uploaded with the request. Those not having been
+           moved into the database are removed.'''
+        for value in self.__dict__.values():
+            if isinstance(value, FileUpload): value.close()
+
     def parse(self, params, sep='&'):
         '''Parse GET/POST p_param(eters) and add one attribute per parameter'''
         for param in params.split(sep):
@@ -61,23 +106,6 @@ class Request(Object):
                 value = None
             setattr(self, name.strip(), value)
 
-    def parseMultiPart(self, content, boundary):
-        '''Parses multi-part form content and add to p_self one attribute per
-           form element.'''
-        for element in content.split(boundary):
-            if not element: continue
-            # Find the element name
-            i = element.find('name="')
-            if i == -1: continue
-            nameStart = i + 6
-            nameEnd = element.find('"', nameStart)
-            name = element[nameStart:nameEnd]
-            # Find the element value
-            value = element[nameEnd+1:]
-            if value.endswith('--'):
-                value = value[:-2]
-            setattr(self, name.strip(), value.strip())
-
     def patchFromTemplate(self, o):
         '''p_o is a temp object that is going to be edited via px "edit". If a
            template object must be used to pre-fill the web form, patch the
@@ -3,7 +3,7 @@
 
 # ~license~
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-import urllib.parse
+import gzip, urllib.parse
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 class Response:
@@ -27,6 +27,44 @@ class Response:
                        'Cache-Control': 'no-cache, no-store, must-revalidate',
                        'Expires': '0'}
         self.headers = headers
+        # Has the response already been sent by some other means (ie, a file
+        # directly written on the socket, see appy.model.fields.file.FileInfo)?
+        self.sent = False
+
+    @classmethod
+    def acceptsGzip(class_, handler):
+        '''Does the client, according to the request handled by p_handler,
+           accept responses compressed with gzip ?'''
+        accept = handler.headers.get('Accept-Encoding')
+        if not accept: return
+        for part in accept.split(','):
+            name, sep, params = part.partition(';')
+            if name.strip().lower() not in ('gzip', '*'): continue
+            # "gzip;q=0" means: gzip is not acceptable
+            params = params.replace(' ', '')
+            if params.startswith('q='):
+                try:
+                    return float(params[2:]) > 0
+                except ValueError:
+                    return
+            return True
+
+    def compress(self, content):
+        '''Compresses p_content if the client accepts it and if p_content is
+           large enough. The content is left untouched if its length or
+           encoding has already been set by the code having produced it: the
+           headers would not match the compressed content anymore.'''
+        handler = self.handler
+        if handler.fake: return content
+        cfg = handler.server.config.server
+        headers = self.headers
+        if not cfg.compress or (len(content) < cfg.compressThreshold) or \
+           ('Content-Encoding' in headers) or ('Content-Length' in headers) or\
+           not Response.acceptsGzip(handler):
+            return content
+        self.headers['Content-Encoding'] = 'gzip'
+        self.headers['Vary'] = 'Accept-Encoding'
+        return gzip.compress(content, cfg.compressLevel, mtime=0)
 
     def setHeader(self, name, value):
         '''Adds (or replace) a HTTP header among response headers'''
@@ -63,7 +101,10 @@ class Response:
 
     def build(self, code, content=None):
         '''Builds and sent the response back to the client'''
+        if self.sent: return
         handler = self.handler
+        # The content, as bytes, compressed when appropriate
+        content = self.compress(content.encode('utf-8')) if content else b''
         # 1. The status line, including the responde code
         handler.send_response_only(self.code)
         # 2. Add HTTP headers
@@ -80,8 +121,11 @@ class Response:
             else:
                 # Manage any other key
                 handler.send_header(name, value)
+        # 2.3. The content length, allowing the connection to be persistent
+        if 'Content-Length' not in self.headers:
+            handler.send_header('Content-Length', len(content))
         handler.end_headers()
-        # 3. Content, as bytes
+        # 3. Content
         if content:
-            handler.wfile.write(content.encode('utf-8'))
+            handler.wfile.write(content)
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
@@ -0,0 +1,118 @@
+'''Process-wide cache of authenticated sessions'''
+
+# ~license~
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+import hmac, hashlib, secrets, threading
+from collections import OrderedDict
+
+from appy.model.utils import Object as O
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class Sessions:
+    '''Size-bounded LRU cache of the users authenticated via the Appy
+       authentication cookie.'''
+
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # Authenticating a user from its cookie implies finding him in the catalog
+    # and checking its password. Then, the guard computes its logins, roles and
+    # the value allowing to search index "allowed". Once done, this info is
+    # cached here, keyed by a token signing the cookie with a secret key that
+    # is regenerated every time the server starts. The token is an HMAC: the
+    # credentials carried by the cookie are not kept in memory.
+    #
+    # A session is valid as long as the User object and the Group objects it
+    # belongs to have not changed since the session has been cached: every
+    # session stores the serials (ZODB attribute "_p_serial") of these objects.
+    # Any change to the user, like a new password, roles or state, thus
+    # invalidates it. On logout, or when the cookie is disabled, the session
+    # is removed.
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def __init__(self, config):
+        # The maximum number of cached sessions. 0 disables the cache.
+        self.size = config.sessionCacheSize
+        # The key used to sign cookies
+        self.secret = secrets.token_bytes(32)
+        # The cached sessions, as a dict ~{b_token: O}~. The most recently used
+        # sessions are at the end of the dict.
+        self.entries = OrderedDict()
+        # Several threads may use the cache at the same time
+        self.lock = threading.Lock()
+
+    def getToken(self, cookie):
+        '''Returns the token identifying the session corresponding to this
+           authentication p_cookie, or None if there is no p_cookie.'''
+        if not self.size or not cookie: return
+        return hmac.new(self.secret, cookie.encode(), hashlib.sha256).digest()
+
+    def get(self, guard):
+        '''Returns the session corresponding to the request being handled by
+           p_guard.handler, or None if no valid session is found. The returned
+           session has an additional attribute "user", being the User
+           object.'''
+        handler = guard.handler
+        cookie = handler.req[guard.Cookie.name]
+        token = self.getToken(cookie)
+        if token is None: return
+        with self.lock:
+            session = self.entries.get(token)
+            if session is None: return
+            self.entries.move_to_end(token)
+        # Check that the user and its groups have not changed
+        database = handler.server.database
+        objects = []
+        for iid, serial in session.serials:
+            o = database.getObject(handler, iid)
+            if o is None: break
+            o._p_activate()
+            if o._p_serial != serial: break
+            objects.append(o)
+        else:
+            r = session.clone()
+            r.user = objects[0]
+            return r
+        # The session is not valid anymore
+        self.remove(cookie)
+
+    def set(self, guard):
+        '''Caches the session of the user authenticated by p_guard'''
+        user = guard.user
+        if user.isAnon(): return
+        handler = guard.handler
+        token = self.getToken(handler.req[guard.Cookie.name])
+        if token is None: return
+        # Ensure the user has been authenticated from the cookie
+        try:
+            login, password, ctx = guard.Cookie.read(handler)
+        except Exception:
+            return
+        if login != user.login: return
+        objects = [user] + list(user.groups or ())
+        serials = [(o.iid, o._p_serial) for o in objects]
+        session = O(serials=serials, login=guard.userLogin,
+                    logins=guard.userLogins, roles=guard.userRoles,
+                    allowed=guard.userAllowed)
+        with self.lock:
+            entries = self.entries
+            entries[token] = session
+            entries.move_to_end(token)
+            while len(entries) > self.size:
+                entries.popitem(last=False)
+
+    def remove(self, cookie):
+        '''Removes the session corresponding to this authentication
+           p_cookie.'''
+        token = self.getToken(cookie)
+        if token is None: return
+        with self.lock:
+            self.entries.pop(token, None)
+
+    def clear(self):
+        '''Removes all sessions'''
+        with self.lock:
+            self.entries.clear()
+
+    def __repr__(self):
+        '''p_self's short string representation'''
+        return '<Sessions size=%d>' % len(self.entries)
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
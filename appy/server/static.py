@@ -1,8 +1,10 @@
 # ~license~
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
-import inspect, pathlib, mimetypes, os.path, email.utils, collections
+import gzip, socket, hashlib, secrets, inspect, pathlib, mimetypes, os.path
+import email.utils, collections, urllib.parse
 from DateTime import DateTime
 import appy
+from appy.server.response import Response
 
 #- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
 MAP_VALUE_NOT_PATH = 'Values from the map must be pathlib.Path objects.'
@@ -91,6 +93,152 @@ class Static:
     # The dict of RAM resources (see doc in class Config hereabove)
     ram = collections.OrderedDict()
 
+    # Compressed versions of static resources are cached in the following dict,
+    # of the form ~{key: (stamp, b_compressed)}~. For a RAM resource, "key" is
+    # its key in Static.ram and "stamp" is its uncompressed content; for a
+    # file, "key" is its path and "stamp" its last modification date. The
+    # stamp allows to determine whether the cached version is still valid.
+    gzipped = {}
+
+    # Content hashes of static resources are cached in the following dict, of
+    # the form ~{key: (stamp, s_hash)}~, where "key" and "stamp" have the same
+    # meaning as for dict "gzipped" hereabove. A hash is used as ETag and for
+    # "fingerprinting" URLs to static resources (see m_getUrlHash).
+    hashes = {}
+
+    # The maximum number of byte ranges that may be requested at once
+    MAX_RANGES = 20
+
+    # A static resource whose URL includes the current hash of its content,
+    # as value for this parameter, can be cached "forever" by the browser.
+    HASH_PARAM = 'v'
+    CACHE_FOREVER = 'public, max-age=31536000, immutable'
+
+    # Files larger than this number of bytes are not compressed
+    GZIP_MAX = 2000000
+
+    # The MIME types of compressible content, excepted those starting with
+    # "text/".
+    compressible = ('application/javascript', 'application/json',
+                    'application/xml', 'image/svg+xml')
+
+    # When a filename extension denotes an encoding (ie, "archive.tar.gz"), the
+    # file is served as is, with the following MIME types. Indeed, setting the
+    # "Content-Encoding" header would lead the browser to decode it.
+    encodedTypes = {'gzip': 'application/gzip', 'bzip2': 'application/x-bzip2',
+                    'xz': 'application/x-xz', 'br': 'application/x-brotli',
+                    'compress': 'application/x-compress'}
+
+    @classmethod
+    def getHash(class_, path, modified, content=None):
+        '''Returns the hash of the content of the file @p_path, or of this RAM
+           p_content if not None.'''
+        ram = content is not None
+        stamp = content if ram else modified
+        cached = class_.hashes.get(path)
+        if cached:
+            valid = (cached[0] is stamp) if ram else (cached[0] == stamp)
+            if valid: return cached[1]
+        hasher = hashlib.blake2b(digest_size=8)
+        if ram:
+            hasher.update(content)
+        else:
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(Static.BYTES)
+                    if not chunk: break
+                    hasher.update(chunk)
+        r = hasher.hexdigest()
+        class_.hashes[path] = stamp, r
+        return r
+
+    @classmethod
+    def getUrlHash(class_, config, base, name, ram=False):
+        '''Returns the hash of the static resource named p_name, being in RAM
+           or in the folder corresponding to p_base in p_config.map. Returns
+           None if the resource is not found.'''
+        if ram:
+            content = class_.ram.get(name)
+            if content is None: return
+            return class_.getHash(name, None, content)
+        folder = config.map.get(base)
+        if folder is None: return
+        path = str(folder / name)
+        try:
+            modified = os.path.getmtime(path)
+        except OSError:
+            return
+        return class_.getHash(path, modified)
+
+    @classmethod
+    def isFresh(class_, handler, hash, modified):
+        '''Is the version of a static resource, whose content has this p_hash
+           and was p_modified at this date, as cached by the browser, still
+           fresh ?'''
+        # Check the ETag(s) as sent by the browser. A ETag may be suffixed with
+        # "-gzip" if it denotes the compressed version of the resource.
+        tags = handler.headers.get('If-None-Match')
+        if tags:
+            for tag in tags.split(','):
+                tag = tag.strip()
+                if tag == '*': return True
+                if tag.startswith('W/'): tag = tag[2:]
+                if tag.strip('"').split('-', 1)[0] == hash: return True
+            return False
+        # Check the last modification date
+        since = handler.headers.get('If-Modified-Since')
+        if not since: return False
+        try:
+            since = email.utils.parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates are precise to the second
+        return int(modified) <= since
+
+    @classmethod
+    def isCompressible(class_, mimeType):
+        '''Is content of this p_mimeType worth being compressed ?'''
+        return mimeType.startswith('text/') or \
+               mimeType in class_.compressible
+
+    @classmethod
+    def compressRam(class_, config):
+        '''Compresses the RAM resources, at server startup, according to
+           p_config, the server configuration.'''
+        if not config.compress: return
+        for key, content in class_.ram.items():
+            mimeType = mimetypes.guess_type(key)[0]
+            if mimeType and class_.isCompressible(mimeType):
+                compressed = gzip.compress(content, config.compressLevel,
+                                           mtime=0)
+                class_.gzipped[key] = content, compressed
+
+    @classmethod
+    def getCompressed(class_, handler, path, modified, content, mimeType):
+        '''Returns the compressed version of the resource @p_path or of this
+           RAM p_content if the client accepts it and if it is worth being
+           compressed. Returns None else.'''
+        config = handler.server.config.server
+        if not config.compress or not class_.isCompressible(mimeType) or \
+           not Response.acceptsGzip(handler):
+            return
+        ram = content is not None
+        size = len(content) if ram else os.path.getsize(path)
+        if size < config.compressThreshold or size > class_.GZIP_MAX: return
+        # Get the compressed version from the cache
+        stamp = content if ram else modified
+        cached = class_.gzipped.get(path)
+        if cached:
+            valid = (cached[0] is stamp) if ram else (cached[0] == stamp)
+            if valid: return cached[1]
+        # Compress it and cache it
+        if not ram:
+            with open(path, 'rb') as f:
+                content = f.read()
+        r = gzip.compress(content, config.compressLevel, mtime=0)
+        class_.gzipped[path] = stamp, r
+        return r
+
     @classmethod
     def notFound(class_, handler, config):
         '''Raise a HTTP 404 error if the resource defined by p_handler.parts was
@@ -99,61 +247,205 @@ class Static:
         path = '/%s/%s' % (config.root, '/'.join(handler.parts))
         handler.log('app', 'error', '%d@%s' % (code, path))
         handler.send_response(code)
+        handler.send_header('Content-Length', 0)
         handler.end_headers()
         return code
 
     @classmethod
-    def write(class_, handler, path, modified, content=None):
-        '''Returns the content of file @p_path, or file p_content if not None'''
-        # If the file @ p_path has not changed since the last time the browser
-        # asked it, return an empty response with code 304 "Not Modified". Else,
-        # return file content with a code 200 "OK".
-        browserDate = handler.headers.get('If-Modified-Since')
-        smodified = email.utils.formatdate(modified) # RFC 822 string
-        if not browserDate or (smodified > browserDate):
-            code = 200
-            handler.send_response(code)
-            hasContent = content is not None
-            # Initialise response headers. Guess p_path's MIME type.
-            mimeType, encoding = mimetypes.guess_type(path)
-            mimeType = mimeType or 'application/octet-stream'
-            set = handler.send_header
-            set('Content-Type', mimeType)
-            size = len(content) if hasContent else os.path.getsize(path)
-            set('Content-Length', size)
-            if encoding: set('Content-Encoding', encoding)
-            # For now, disable byte serving (value "bytes" instead of "none")
-            set('Accept-Ranges', 'none')
-            set('Last-Modified', smodified)
-            handler.end_headers()
-            # Write the file content to the socket
-            if hasContent:
-                handler.wfile.write(content)
+    def getRanges(class_, handler, size, etag, modified):
+        '''Returns the list of byte ranges, as tuples (i_first, i_last), as
+           requested by the client via the "Range" header, for a resource of
+           this p_size, whose ETag is p_etag and that was p_modified at this
+           date. Returns None if the complete resource must be returned, or
+           False if no requested range can be satisfied.'''
+        header = handler.headers.get('Range')
+        if not header or not header.startswith('bytes='): return
+        # Ranges apply only if the resource, as known by the client, is still
+        # the current one.
+        ifRange = handler.headers.get('If-Range')
+        if ifRange:
+            ifRange = ifRange.strip()
+            if ifRange.startswith('"'):
+                if ifRange.strip('"') != etag: return
+            elif ifRange.startswith('W/'):
+                # Weak ETags can't be used for comparing byte ranges
+                return
             else:
-                f = open(path, 'rb')
-                while True:
-                    chunk = f.read(Static.BYTES)
+                try:
+                    since = email.utils.parsedate_to_datetime(ifRange)
+                except (TypeError, ValueError):
+                    return
+                if int(modified) > since.timestamp(): return
+        r = []
+        specs = header[6:].split(',')
+        # Refuse to split a resource into too many parts
+        if len(specs) > Static.MAX_RANGES: return
+        for spec in specs:
+            first, sep, last = spec.strip().partition('-')
+            try:
+                if not first:
+                    # A suffix range: the "last" bytes of the resource
+                    count = int(last)
+                    if not count: continue
+                    first = max(0, size - count)
+                    last = size - 1
+                else:
+                    first = int(first)
+                    last = min(int(last), size - 1) if last else size - 1
+            except ValueError:
+                # An invalid header must be ignored
+                return
+            if first <= last:
+                r.append((first, last))
+        return r or False
+
+    @classmethod
+    def writeUnsatisfiable(class_, handler, size):
+        '''Returns a 416 response: the requested ranges can't be satisfied for
+           a resource of this p_size.'''
+        code = 416
+        handler.send_response(code)
+        handler.send_header('Content-Range', 'bytes */%d' % size)
+        handler.send_header('Content-Length', 0)
+        handler.end_headers()
+        return code
+
+    @classmethod
+    def writeFile(class_, handler, path, offset, count):
+        '''Writes, on the p_handler's socket, p_count bytes from the file
+           @p_path, starting at p_offset.'''
+        if hasattr(handler, 'sendFile'):
+            # The handler sends the file by itself (see appy/server/front.py)
+            handler.sendFile(path, offset, count)
+            return
+        # The client socket. While serving dynamic content, attribute
+        # "connection" is the database connection: it can't be used.
+        sock = handler.request
+        try:
+            with open(path, 'rb') as f:
+                if isinstance(sock, socket.socket):
+                    # Zero-copy transfer, via os.sendfile when available
+                    sock.sendfile(f, offset, count)
+                    return
+                # Copy the file through Python
+                f.seek(offset)
+                while count > 0:
+                    chunk = f.read(min(count, Static.BYTES))
                     if not chunk: break
-                    try:
-                        handler.wfile.write(chunk)
-                    except BrokenPipeError:
-                        handler.log('app', 'error', BROKEN_PIPE % path)
-                f.close()
+                    handler.wfile.write(chunk)
+                    count -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            handler.log('app', 'error', BROKEN_PIPE % path)
+
+    @classmethod
+    def writePart(class_, handler, path, content, offset, count):
+        '''Writes p_count bytes, starting at p_offset, from p_content or, if
+           None, from the file @p_path.'''
+        if content is None:
+            class_.writeFile(handler, path, offset, count)
         else:
+            handler.wfile.write(content[offset:offset+count])
+
+    @classmethod
+    def writeBody(class_, handler, path, content, size, mimeType, ranges=None):
+        '''Writes the last response headers, followed by the response body,
+           being p_content or, if None, the content of the file @p_path, whose
+           p_size and p_mimeType are given. If p_ranges are given (see
+           m_getRanges), only these parts of the content are written.'''
+        set = handler.send_header
+        if not ranges or len(ranges) == 1:
+            # A single part
+            if ranges:
+                first, last = ranges[0]
+                set('Content-Range', 'bytes %d-%d/%d' % (first, last, size))
+            else:
+                first, last = 0, size - 1
+            set('Content-Type', mimeType)
+            set('Content-Length', last - first + 1)
+            handler.end_headers()
+            class_.writePart(handler, path, content, first, last - first + 1)
+            return
+        # Several parts: produce a "multipart/byteranges" body
+        boundary = secrets.token_hex(16)
+        heads = []
+        length = 0
+        for first, last in ranges:
+            head = '--%s\r\nContent-Type: %s\r\nContent-Range: ' \
+                   'bytes %d-%d/%d\r\n\r\n' % (boundary, mimeType, first,
+                                                 last, size)
+            head = head.encode()
+            heads.append(head)
+            # Every part ends with a CRLF
+            length += len(head) + last - first + 3
+        tail = ('--%s--\r\n' % boundary).encode()
+        set('Content-Type', 'multipart/byteranges; boundary=%s' % boundary)
+        set('Content-Length', length + len(tail))
+        handler.end_headers()
+        write = handler.wfile.write
+        for head, (first, last) in zip(heads, ranges):
+            write(head)
+            class_.writePart(handler, path, content, first, last - first + 1)
+            write(b'\r\n')
+        write(tail)
+
+    @classmethod
+    def write(class_, handler, path, modified, content=None, version=None):
+        '''Returns the content of file @p_path, or file p_content if not None.
+           p_version is the hash of the resource as found in its URL, if
+           any.'''
+        # If the resource has not changed since the last time the browser
+        # asked it, return an empty response with code 304 "Not Modified". Else,
+        # return file content with a code 200 "OK", or parts of it with a code
+        # 206 "Partial Content" if byte ranges are requested.
+        hash = class_.getHash(path, modified, content)
+        set = handler.send_header
+        if class_.isFresh(handler, hash, modified):
             code = 304
             handler.send_response(code)
+            set('ETag', '"%s"' % hash)
+            if version == hash: set('Cache-Control', Static.CACHE_FOREVER)
             handler.end_headers()
+            return code
+        size = len(content) if content is not None else os.path.getsize(path)
+        ranges = class_.getRanges(handler, size, hash, modified)
+        if ranges is False:
+            return class_.writeUnsatisfiable(handler, size)
+        code = 206 if ranges else 200
+        handler.send_response(code)
+        # Guess p_path's MIME type
+        mimeType, encoding = mimetypes.guess_type(path)
+        if encoding:
+            mimeType = Static.encodedTypes.get(encoding)
+        mimeType = mimeType or 'application/octet-stream'
+        # Send the compressed version of the complete content when possible
+        compressed = None if ranges else \
+          class_.getCompressed(handler, path, modified, content, mimeType)
+        etag = hash
+        if compressed is not None:
+            content = compressed
+            size = len(content)
+            set('Content-Encoding', 'gzip')
+            etag = '%s-gzip' % hash
+        if class_.isCompressible(mimeType):
+            set('Vary', 'Accept-Encoding')
+        set('Accept-Ranges', 'bytes')
+        set('Last-Modified', email.utils.formatdate(modified, usegmt=True))
+        set('ETag', '"%s"' % etag)
+        if version == hash: set('Cache-Control', Static.CACHE_FOREVER)
+        # Write the content, or the requested parts of it, to the socket
+        class_.writeBody(handler, path, content, size, mimeType, ranges)
         return code
 
     @classmethod
-    def writeFromDisk(class_, handler, path):
+    def writeFromDisk(class_, handler, path, version=None):
         '''Serve a static file from disk, whose URL path is p_path'''
         # The string version of p_path
         spath = str(path)
-        return class_.write(handler, spath, os.path.getmtime(spath))
+        return class_.write(handler, spath, os.path.getmtime(spath),
+                            version=version)
 
     @classmethod
-    def writeFromRam(class_, handler, config):
+    def writeFromRam(class_, handler, config, version=None):
         '''Serve a static file loaded in RAM, from dict Static.ram'''
         # p_handler.parts contains something starting with ['ram', ...]
         if len(handler.parts) == 1:
@@ -173,16 +465,20 @@ class Static:
         content = class_.ram.get(key)
         if content is None:
             return class_.notFound(handler, config)
-        return class_.write(handler, key, config.created, content=content)
+        return class_.write(handler, key, config.created.timeTime(),
+                            content=content, version=version)
 
     @classmethod
     def removeParams(class_, handler):
         '''Remove potential GET parameters in the last part within
-           p_handler.parts.'''
+           p_handler.parts. Returns the hash of the resource as found among
+           these parameters, if any.'''
         if not handler.parts: return
         last = handler.parts[-1]
         if '?' in last:
-            handler.parts[-1] = last[:last.index('?')]
+            handler.parts[-1], params = last.split('?', 1)
+            values = urllib.parse.parse_qs(params).get(Static.HASH_PARAM)
+            if values: return values[0]
 
     @classmethod
     def get(class_, handler):
@@ -193,14 +489,14 @@ class Static:
         # The currently walked path
         path = None
         # Remove the potential GET params
-        class_.removeParams(handler)
+        version = class_.removeParams(handler)
         # Walk parts
         for part in handler.parts:
             if path is None:
                 # We are at the root of the search: "part" must correspond to
                 # the RAM root or to a key from config.map.
                 if part == config.ramRoot:
-                    return class_.writeFromRam(handler, config)
+                    return class_.writeFromRam(handler, config, version)
                 elif part in config.map:
                     path = config.map[part]
                 else:
@@ -213,7 +509,7 @@ class Static:
         if not path or not path.is_file():
             return class_.notFound(handler, config)
         # Read the file content and return it
-        return class_.writeFromDisk(handler, path)
+        return class_.writeFromDisk(handler, path, version)
 
     @classmethod
     def isFilename(class_, name):
@@ -0,0 +1,217 @@
+'''Streaming parser for "multipart/form-data" request bodies'''
+
+# ~license~
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+import io, os, shutil, tempfile
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+BAD_MULTIPART = 'Malformed multipart body (%s).'
+HEAD_TOO_LONG = 'part headers are too long'
+NO_DELIMITER = 'boundary not found'
+TRUNCATED = 'body is truncated'
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class FileUpload:
+    '''A file uploaded via a multipart form. Its content is kept in memory
+       while it is small, and spooled to a temp file on disk when it exceeds
+       some size.'''
+
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # A FileUpload is file-like: it can be read like any file. But, when its
+    # content has been spooled to disk, it can also be moved, via m_moveTo,
+    # into the database-controlled binaries folder, without copying it (see
+    # appy.model.fields.file.FileInfo::writeFile). Temp files are created in
+    # this folder, in order to be on the same file system. A standard
+    # tempfile.SpooledTemporaryFile could not be used: once rolled over to
+    # disk, it is an anonymous file that can't be moved.
+    #  - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def __init__(self, filename, headers, maxMemory, folder=None):
+        # The name of the file on the client's file system
+        self.filename = filename
+        # The part headers, as a dict whose keys are lower-cased header names
+        self.headers = headers
+        # Beyond this size, in bytes, content is spooled to disk, in p_folder
+        self.maxMemory = maxMemory
+        self.folder = folder
+        # The content, in memory or in a temp file whose path is stored in
+        # attribute "path".
+        self.file = io.BytesIO()
+        self.path = None
+        # The content size, in bytes
+        self.size = 0
+
+    def write(self, data):
+        '''Adds p_data to the content'''
+        self.size += len(data)
+        if not self.path and (self.size > self.maxMemory):
+            self.rollover()
+        self.file.write(data)
+
+    def rollover(self):
+        '''Spools the content to a temp file on disk'''
+        fd, self.path = tempfile.mkstemp(prefix='upload', dir=self.folder)
+        f = os.fdopen(fd, 'w+b')
+        f.write(self.file.getvalue())
+        self.file = f
+
+    def read(self, size=-1): return self.file.read(size)
+    def seek(self, offset, whence=0): return self.file.seek(offset, whence)
+    def tell(self): return self.file.tell()
+
+    def moveTo(self, path):
+        '''Moves the content to a file @p_path and returns its size'''
+        if self.path:
+            # Move the temp file: within the same file system, it is a simple
+            # rename.
+            self.file.close()
+            shutil.move(self.path, path)
+            self.path = None
+        else:
+            with open(path, 'wb') as f:
+                f.write(self.file.getvalue())
+        return self.size
+
+    def close(self):
+        '''Closes the content and removes the temp file if it still exists'''
+        self.file.close()
+        if self.path:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+
+    def __repr__(self):
+        '''p_self's short string representation'''
+        where = self.path or 'memory'
+        return '<FileUpload %s (%d bytes, %s)>' % (self.filename, self.size,
+                                                  where)
+
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
+class MultiPartParser:
+    '''Parses, incrementally, a multipart body from a file-like object'''
+
+    # Size of the chunks read from the body
+    CHUNK = 65536
+
+    # The maximum size of the headers of a single part
+    MAX_HEAD = 16384
+
+    class Error(Exception): pass
+
+    def __init__(self, rfile, length, boundary, maxMemory, folder=None):
+        # The file-like object from which the body is read
+        self.rfile = rfile
+        # The number of body bytes still to read
+        self.remaining = length
+        # The delimiter preceding every part, the first one excepted
+        self.delimiter = b'\r\n--' + boundary.encode()
+        # Parameters for FileUpload instances
+        self.maxMemory = maxMemory
+        self.folder = folder
+        # The bytes read but not consumed yet
+        self.buffer = b''
+
+    def fill(self):
+        '''Reads the next chunk from the body. Returns False if the end of the
+           body has been reached.'''
+        if self.remaining <= 0: return
+        chunk = self.rfile.read(min(self.remaining, MultiPartParser.CHUNK))
+        if not chunk:
+            raise self.Error(BAD_MULTIPART % TRUNCATED)
+        self.remaining -= len(chunk)
+        self.buffer += chunk
+        return True
+
+    def readUntil(self, marker, max):
+        '''Consumes the buffer until p_marker, that is consumed too, and returns
+           the consumed bytes, without the p_marker. Raises an error if
+           p_marker is not found within p_max bytes.'''
+        while True:
+            i = self.buffer.find(marker)
+            if i != -1:
+                r = self.buffer[:i]
+                self.buffer = self.buffer[i+len(marker):]
+                return r
+            if len(self.buffer) > max:
+                raise self.Error(BAD_MULTIPART % HEAD_TOO_LONG)
+            if not self.fill():
+                raise self.Error(BAD_MULTIPART % NO_DELIMITER)
+
+    def readContent(self, write):
+        '''Reads the content of the current part, calling p_write for every
+           chunk of it, until the next delimiter, that is consumed.'''
+        delimiter = self.delimiter
+        # Bytes at the end of the buffer may be the start of the delimiter:
+        # they can't be written yet.
+        keep = len(delimiter) - 1
+        while True:
+            buffer = self.buffer
+            i = buffer.find(delimiter)
+            if i != -1:
+                if i: write(buffer[:i])
+                self.buffer = buffer[i+len(delimiter):]
+                return
+            if len(buffer) > keep:
+                write(buffer[:-keep])
+                self.buffer = buffer[-keep:]
+            if not self.fill():
+                raise self.Error(BAD_MULTIPART % TRUNCATED)
+
+    def parseHeaders(self, head):
+        '''Returns a dict of headers from this part p_head'''
+        r = {}
+        for line in head.decode('utf-8', 'replace').split('\r\n'):
+            name, sep, value = line.partition(':')
+            if sep: r[name.strip().lower()] = value.strip()
+        return r
+
+    def parseDisposition(self, value):
+        '''Returns the parameters from this "Content-Disposition" header
+           p_value, as a dict.'''
+        r = {}
+        for param in value.split(';')[1:]:
+            name, sep, value = param.strip().partition('=')
+            if value.startswith('"') and value.endswith('"'):
+                value = value[1:-1].replace('\\"', '"')
+            r[name.lower()] = value
+        return r
+
+    def run(self):
+        '''Parses the body and yields tuples (s_name, value): "value" is a
+           FileUpload instance for a file part and a string for any other
+           part.'''
+        # Skip the preamble. The first delimiter has no leading CRLF.
+        self.buffer = b'\r\n'
+        self.readUntil(self.delimiter, len(self.delimiter) + 1024)
+        while True:
+            # After a delimiter: either "--" (the end) or a CRLF
+            while len(self.buffer) < 2:
+                if not self.fill():
+                    raise self.Error(BAD_MULTIPART % TRUNCATED)
+            if self.buffer.startswith(b'--'): break
+            # Read the part headers
+            head = self.readUntil(b'\r\n\r\n', MultiPartParser.MAX_HEAD)
+            headers = self.parseHeaders(head[2:])
+            params = self.parseDisposition(
+              headers.get('content-disposition', ''))
+            name = params.get('name')
+            filename = params.get('filename')
+            if filename:
+                value = FileUpload(filename, headers, self.maxMemory,
+                                   self.folder)
+                try:
+                    self.readContent(value.write)
+                except self.Error:
+                    value.close()
+                    raise
+                value.seek(0)
+            else:
+                content = []
+                self.readContent(content.append)
+                value = b''.join(content).decode('utf-8', 'replace')
+            if name: yield name, value
+        # Consume the epilogue, if any
+        while self.fill(): self.buffer = b''
+#- - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - - -
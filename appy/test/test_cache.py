@@ -0,0 +1,51 @@
+# ------------------------------------------------------------------------------
+import unittest
+from BTrees.Length import Length
+from BTrees.IIBTree import IITreeSet
+
+from appy.model.utils import Object as O
+from appy.database.cache import SearchCache
+
+# ------------------------------------------------------------------------------
+class SearchCacheTest(unittest.TestCase):
+    '''Tests the cache of search results shared by all requests'''
+
+    def setUp(self):
+        self.cache = SearchCache(O(cachedSearches=('Item',),
+                                   searchCacheSize=2))
+        self.catalog = O(name='Item', updates=Length())
+
+    def testCopy(self):
+        # Callers modifying a result do not modify the cached one
+        for result in ([3, 1, 2], IITreeSet([1, 2, 3])):
+            self.cache.set(self.catalog, 'key', result)
+            result.remove(2)
+            found, r = self.cache.get(self.catalog, 'key')
+            self.assertTrue(found)
+            self.assertEqual(r.__class__, result.__class__)
+            r.remove(1)
+            found, r = self.cache.get(self.catalog, 'key')
+            self.assertEqual(sorted(r), [1, 2, 3])
+
+    def testMissing(self):
+        self.assertEqual(self.cache.get(self.catalog, 'key'), (False, None))
+        self.cache.set(self.catalog, 'key', None)
+        self.assertEqual(self.cache.get(self.catalog, 'key'), (True, None))
+        # Searches on other classes are not cached
+        other = O(name='Other', updates=Length())
+        self.cache.set(other, 'key', [1])
+        self.assertEqual(self.cache.get(other, 'key'), (False, None))
+
+    def testLru(self):
+        cache = self.cache
+        for key in 'abc':
+            cache.set(self.catalog, key, [1])
+            if key == 'b': cache.get(self.catalog, 'a')
+        self.assertTrue(cache.get(self.catalog, 'a')[0])
+        self.assertFalse(cache.get(self.catalog, 'b')[0])
+        self.assertTrue(cache.get(self.catalog, 'c')[0])
+        self.assertEqual(cache.getStats().size, 2)
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__': unittest.main()
+# ------------------------------------------------------------------------------
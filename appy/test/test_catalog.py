@@ -0,0 +1,129 @@
+# ------------------------------------------------------------------------------
+import unittest
+
+from appy.model.utils import Object as O
+from appy.database.indexes import Index
+from appy.database.catalog import Catalog
+from appy.server.handler import SearchesCache
+from appy.test.test_indexes import Item as BaseItem
+
+# ------------------------------------------------------------------------------
+class Item(BaseItem):
+    '''Fake object, giving access to the handler of the current request'''
+    handler = O(searches=SearchesCache())
+    def H(self): return Item.handler
+
+    def reindex(self, indexes):
+        '''Submits p_self to these p_indexes'''
+        r = False
+        for index in indexes:
+            if index.indexObject(self): r = True
+        return r
+
+# ------------------------------------------------------------------------------
+class Connection:
+    '''Fake ZODB connection, counting the calls to m_cacheGC'''
+    def __init__(self): self.collected = 0
+    def cacheGC(self): self.collected += 1
+
+class Handler:
+    '''Fake handler, giving access to fake objects and logging messages'''
+    def __init__(self, objects, batchSize):
+        database = O(getObject=lambda handler, iid: objects[iid])
+        config = O(database=O(populateBatchSize=batchSize))
+        self.server = O(database=database, config=config)
+        self.connection = Connection()
+        self.messages = []
+    def log(self, type, level, message): self.messages.append(message)
+
+# ------------------------------------------------------------------------------
+class InvalidateTest(unittest.TestCase):
+    '''Tests the invalidation of the search results cached by the current
+       handler when a catalog is modified.'''
+
+    def setUp(self):
+        self.catalog = catalog = Catalog(None, O(name='Item'))
+        catalog['attr'] = Index('attr', catalog)
+        self.searches = Item.handler.searches = SearchesCache()
+        catalog.reindexObject(Item(1, attr='a'))
+        self.cache()
+
+    def cache(self):
+        '''Caches a search result for the catalog'''
+        self.searches.setResult('Item', 'key', [1])
+        self.searches.setResult('Other', 'key', [2])
+
+    def isCached(self, className='Item'):
+        return self.searches.getResult(className, 'key')[0]
+
+    def testReindex(self):
+        updates = self.catalog.updates()
+        self.catalog.reindexObject(Item(2, attr='b'))
+        self.assertFalse(self.isCached())
+        self.assertTrue(self.isCached('Other'))
+        self.assertEqual(self.catalog.updates(), updates + 1)
+        # Reindexing an object whose indexed values are unchanged changes
+        # nothing.
+        self.cache()
+        self.catalog.reindexObject(Item(2, attr='b'))
+        self.assertTrue(self.isCached())
+        self.catalog.reindexObject(Item(2, attr='c'), fields=['attr'])
+        self.assertFalse(self.isCached())
+
+    def testUnindex(self):
+        self.catalog.reindexObject(Item(1), unindex=True)
+        self.assertFalse(self.isCached())
+        self.assertEqual(list(self.catalog.all), [])
+
+    def testNoHandler(self):
+        # Objects may be reindexed while no request is handled
+        self.assertTrue(self.catalog.reindexObject(BaseItem(3, attr='x')))
+        self.assertTrue(self.isCached())
+
+# ------------------------------------------------------------------------------
+class PopulateTest(unittest.TestCase):
+    '''Tests the population of indexes by batches'''
+
+    def populate(self, count, batchSize):
+        '''Populates a new index for a catalog of p_count objects, by batches
+           of p_batchSize objects. Returns the handler and the index.'''
+        catalog = Catalog(None, O(name='Item'))
+        objects = {}
+        for iid in range(1, count+1):
+            objects[iid] = Item(iid, attr=iid % 3 or None)
+            catalog.all.insert(iid)
+        index = catalog['attr'] = Index('attr', catalog)
+        catalog.toPopulate = ('attr',)
+        root = O(catalogs={'Item': catalog})
+        populate = Catalog.getToPopulate(root)
+        self.assertEqual(populate, {'Item': [index]})
+        handler = Handler(objects, batchSize)
+        Catalog.populate(root, handler, populate)
+        # The index is populated
+        self.assertEqual(catalog.toPopulate, ())
+        self.assertEqual(Catalog.getToPopulate(root), {})
+        expected = [iid for iid in objects if iid % 3]
+        self.assertEqual(sorted(index.byObject.keys()), expected)
+        return handler, index
+
+    def testBatches(self):
+        for count, size, batches in ((10, 3, 4), (10, 5, 2), (10, 10, 1),
+                                     (10, 100, 1), (1, 1, 1)):
+            handler, index = self.populate(count, size)
+            self.assertEqual(handler.connection.collected, batches)
+            # Progress is logged after every batch, if there are several ones
+            progress = [m for m in handler.messages if 'processed' in m]
+            self.assertEqual(len(progress), batches if count > size else 0)
+
+    def testEmpty(self):
+        handler, index = self.populate(0, 10)
+        self.assertEqual(handler.connection.collected, 0)
+        self.assertEqual(handler.messages, [])
+
+    def testSummary(self):
+        handler, index = self.populate(7, 2)
+        self.assertTrue('Item::attr' in handler.messages[-1])
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__': unittest.main()
+# ------------------------------------------------------------------------------
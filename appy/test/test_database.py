@@ -0,0 +1,40 @@
+# ------------------------------------------------------------------------------
+import threading, unittest
+
+from appy.database import Database
+from appy.model.utils import Object as O
+
+# ------------------------------------------------------------------------------
+class ConnectionsTest(unittest.TestCase):
+    '''Tests the connections kept by worker threads'''
+
+    def setUp(self):
+        database = O(cacheSize=100, cachedSearches=(), searchCacheSize=10)
+        config = O(database=database, server=O(threads=2))
+        # A None path creates an in-memory database
+        self.database = Database(None, O(config=config))
+
+    def work(self, requests=2):
+        '''Simulates a worker thread handling p_requests requests'''
+        for i in range(requests):
+            connection = self.database.getConnection()
+            connection.root()['count'] = i
+            self.database.releaseConnection(connection)
+
+    def testClose(self):
+        workers = [threading.Thread(target=self.work) for i in range(2)]
+        for worker in workers: worker.start()
+        for worker in workers: worker.join()
+        # Every worker has kept a single connection
+        connections = self.database.connections
+        self.assertEqual(len(connections), 2)
+        for connection in connections:
+            self.assertFalse(connection.opened is None)
+        self.database.close()
+        for connection in connections:
+            self.assertTrue(connection.opened is None)
+        self.assertEqual(self.database.connections, [])
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__': unittest.main()
+# ------------------------------------------------------------------------------
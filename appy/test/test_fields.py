@@ -0,0 +1,46 @@
+# ------------------------------------------------------------------------------
+import unittest
+from BTrees.IIBTree import IITreeSet
+
+from appy.model.utils import Object as O
+from appy.database.results import Results
+from appy.model.fields.string import String
+
+# ------------------------------------------------------------------------------
+class Database:
+    '''Fake database, producing fake objects from their iids'''
+    def getObject(self, handler, iid): return O(iid=iid, id=str(iid))
+
+# ------------------------------------------------------------------------------
+class KeepCheckedResultsTest(unittest.TestCase):
+    '''Tests Field::keepCheckedResults applied on search results'''
+
+    def getResults(self, ids):
+        return Results(Database(), None, ids)
+
+    def getIds(self, objects):
+        return [o.iid for o in objects]
+
+    def testChecked(self):
+        objects = self.getResults(IITreeSet([1, 2, 3, 4]))
+        req = O(checkedIds='2,4', checkedSem='checked')
+        String().keepCheckedResults(req, objects)
+        self.assertEqual(self.getIds(objects), [2, 4])
+
+    def testUnchecked(self):
+        objects = self.getResults([4, 3, 2, 1])
+        req = O(checkedIds='3', checkedSem='unchecked')
+        String().keepCheckedResults(req, objects)
+        self.assertEqual(self.getIds(objects), [4, 2, 1])
+
+    def testSharedIds(self):
+        # The iids may come from a search cache: they must not be modified
+        ids = [1, 2, 3]
+        objects = self.getResults(ids)
+        String().keepCheckedResults(O(checkedIds='1'), objects)
+        self.assertEqual(self.getIds(objects), [1])
+        self.assertEqual(ids, [1, 2, 3])
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__': unittest.main()
+# ------------------------------------------------------------------------------
@@ -0,0 +1,93 @@
+# ------------------------------------------------------------------------------
+import time, socket, asyncio, threading, unittest
+
+from appy.server.front import Channel
+
+# ------------------------------------------------------------------------------
+class ChannelTest(unittest.TestCase):
+    '''Tests the transmission of a request and its response between the front
+       server and a worker thread.'''
+
+    def setUp(self):
+        # Run the front server's loop in its own thread
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+        # p_self.client is the client socket; the front server gets streams on
+        # the other end.
+        self.client, other = socket.socketpair()
+        self.reader, self.writer = self.run_(
+          asyncio.open_connection(sock=other))
+
+    def tearDown(self):
+        # Let the loop process the cancelled reads, if any
+        self.run_(asyncio.sleep(0.01))
+        self.loop.call_soon_threadsafe(self.writer.close)
+        self.client.close()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def run_(self, coroutine):
+        '''Runs p_coroutine in the loop and returns its result'''
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def getChannel(self, head, length, timeout=2):
+        async def create():
+            return Channel(self.loop, self.reader, self.writer, head, length,
+                           timeout)
+        return self.run_(create())
+
+    def testBody(self):
+        # The body is read by the worker while the client sends it
+        channel = self.getChannel(b'POST / HTTP/1.1\r\n\r\n', 8)
+        self.client.sendall(b'abcd')
+        rfile = channel.makefile('rb', -1)
+        self.assertEqual(rfile.readline(), b'POST / HTTP/1.1\r\n')
+        self.assertEqual(rfile.readline(), b'\r\n')
+        self.assertEqual(rfile.read(4), b'abcd')
+        self.assertEqual(channel.body.remaining, 4)
+        # Bytes beyond the body are not consumed
+        self.client.sendall(b'efghGET')
+        self.assertEqual(rfile.read(), b'efgh')
+        self.assertEqual(channel.body.remaining, 0)
+        self.assertEqual(self.run_(self.reader.read(3)), b'GET')
+
+    def testTimeout(self):
+        channel = self.getChannel(b'', 10, timeout=0.2)
+        with self.assertRaises(socket.timeout):
+            channel.makefile('rb').read()
+
+    def testEof(self):
+        # The client closes the connection before having sent the whole body
+        channel = self.getChannel(b'', 10)
+        self.client.sendall(b'abc')
+        self.client.shutdown(socket.SHUT_WR)
+        self.assertEqual(channel.makefile('rb').read(), b'abc')
+        self.assertEqual(channel.body.remaining, 0)
+
+    def testBackpressure(self):
+        # A worker sending a large response waits for the client to read it
+        channel = self.getChannel(b'', 0)
+        data = b'x' * (16 * 1024 * 1024)
+        sender = threading.Thread(target=channel.sendall, args=(data,))
+        sender.start()
+        time.sleep(0.3)
+        self.assertTrue(sender.is_alive())
+        # Once the client reads the response, the worker is released
+        received = 0
+        while received < len(data):
+            received += len(self.client.recv(1024 * 1024))
+        sender.join(5)
+        self.assertFalse(sender.is_alive())
+
+    def testSmallResponse(self):
+        # Small responses are not waited for
+        channel = self.getChannel(b'', 0)
+        channel.sendall(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+        self.assertEqual(channel.head[-2:], b'ok')
+        self.assertEqual(self.client.recv(100)[-2:], b'ok')
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__': unittest.main()
+# ------------------------------------------------------------------------------
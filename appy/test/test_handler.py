@@ -0,0 +1,57 @@
+# ------------------------------------------------------------------------------
+import io, unittest, threading, http.client
+
+from appy.server.handler import Handler, HttpHandler
+from appy.model.utils import Object as O
+
+# ------------------------------------------------------------------------------
+class Database:
+    '''Fake database, whose connections can't give access to the root object'''
+    def __init__(self): self.released = []
+    def getConnection(self): return O()
+    def releaseConnection(self, connection): self.released.append(connection)
+
+# ------------------------------------------------------------------------------
+class TerminateTest(unittest.TestCase):
+    '''Tests that resources acquired by a handler are released, even if its
+       initialisation fails.'''
+
+    def getHandler(self, length=0):
+        '''Returns a handler for a POST request whose body is p_length bytes
+           long, without reading it from a socket.'''
+        handler = HttpHandler.__new__(HttpHandler)
+        config = O(server=O(maxBodySize=10, static=O(root='static')))
+        handler.server = O(config=config, database=Database())
+        handler.request = handler.connection = O()
+        handler.path = '/tool/view'
+        handler.command = 'POST'
+        handler.request_version = 'HTTP/1.0'
+        handler.requestline = 'POST /tool/view HTTP/1.0'
+        handler.headers = http.client.HTTPMessage()
+        handler.headers['Content-Length'] = str(length)
+        handler.rfile = io.BytesIO(b'x' * length)
+        handler.wfile = io.BytesIO()
+        handler.messages = []
+        handler.log = lambda type, level, message=None: \
+                      handler.messages.append(message)
+        return handler
+
+    def testInitError(self):
+        # m_init fails once it has got a database connection
+        handler = self.getHandler()
+        with self.assertRaises(AttributeError):
+            handler.do_GET()
+        self.assertEqual(len(handler.server.database.released), 1)
+        self.assertFalse(threading.get_ident() in Handler.registry)
+
+    def testBodyTooLarge(self):
+        # m_init fails before having got a database connection
+        handler = self.getHandler(length=20)
+        handler.do_GET()
+        self.assertTrue(handler.wfile.getvalue().startswith(b'HTTP/1.0 413'))
+        self.assertEqual(handler.server.database.released, [])
+        self.assertEqual(handler.messages[-1], '413')
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__': unittest.main()
+# ------------------------------------------------------------------------------
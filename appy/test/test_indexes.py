@@ -0,0 +1,370 @@
+# ------------------------------------------------------------------------------
+import unittest
+from DateTime import DateTime
+from BTrees.IIBTree import IITreeSet
+
+from appy.model.utils import Object as O
+from appy.database.indexes import Index
+from appy.database.operators import in_, gt_, not_
+from appy.database.indexes.date import DateIndex
+from appy.database.indexes.text import TextIndex
+from appy.database.indexes.keyword import KeywordIndex
+from appy.database.indexes.boolean import BooleanIndex
+
+# ------------------------------------------------------------------------------
+class Field:
+    '''Fake field, whose index value is stored as is on fake objects'''
+    def __init__(self, name): self.name = name
+    def getIndexValue(self, o): return getattr(o, self.name, None)
+
+class Item:
+    '''Fake object, having an iid and attribute values'''
+    def __init__(self, iid, **values):
+        self.iid = iid
+        self.__dict__.update(values)
+    def getField(self, name): return Field(name)
+
+# ------------------------------------------------------------------------------
+class IndexTest(unittest.TestCase):
+    '''Base class for index tests'''
+
+    # The index class to test
+    indexClass = Index
+
+    def getIndex(self, values, class_=None):
+        '''Returns an index storing p_values, a dict ~{i_iid: value}~, for
+           attribute "attr".'''
+        r = (class_ or self.indexClass)('attr', O(name='Test'))
+        for iid, value in values.items():
+            r.indexObject(Item(iid, attr=value))
+        return r
+
+# ------------------------------------------------------------------------------
+class SortTest(IndexTest):
+    '''Tests Index::sort'''
+
+    values = {1: 'c', 2: 'a', 3: 'b', 4: 'a', 5: None, 6: ['d', 'a']}
+
+    def sort(self, rs, reverse=False, values=None):
+        '''Sorts p_rs with both strategies and checks they agree'''
+        index = self.getIndex(values or self.values)
+        byValue = index.sortByValue(IITreeSet(rs), reverse)
+        byObject = index.sortByObject(IITreeSet(rs), reverse)
+        self.assertEqual(byValue, byObject)
+        return byValue
+
+    def testAscending(self):
+        self.assertEqual(self.sort([1, 2, 3, 4, 5]), [2, 4, 3, 1, 5])
+
+    def testDescending(self):
+        self.assertEqual(self.sort([1, 2, 3, 4, 5], True), [1, 3, 2, 4, 5])
+
+    def testMultiple(self):
+        self.assertEqual(self.sort([1, 3, 6]), [6, 3, 1])
+        self.assertEqual(self.sort([1, 3, 6], True), [6, 1, 3])
+
+    def testEmpty(self):
+        self.assertEqual(self.sort([]), [])
+        self.assertEqual(self.sort([5], True), [5])
+        index = self.getIndex({})
+        self.assertEqual(index.sort(IITreeSet([3, 1]), True), [1, 3])
+
+    def testStrategy(self):
+        # Both strategies are used, depending on the size of the result set
+        values = {i: i % 50 for i in range(1, 1001)}
+        index = self.getIndex(values)
+        small = IITreeSet([7, 8, 57])
+        self.assertEqual(index.sort(small, True), [8, 7, 57])
+        r = index.sort(IITreeSet(values), True)
+        self.assertEqual(r[:3], [49, 99, 149])
+        self.assertEqual(r[-1], 1000)
+
+    def testGetItems(self):
+        # Walking a large forward index backwards, made of several levels of
+        # BTree nodes, produces the items in descending order.
+        index = self.getIndex({i: '%05d' % i for i in range(1, 20001)})
+        items = list(index.getItems(reverse=True))
+        self.assertEqual(items, list(reversed(list(index.getItems()))))
+        self.assertEqual([k for k, v in items[:2]], ['20000', '19999'])
+        for values in ({}, {1: 'a'}):
+            index = self.getIndex(values)
+            self.assertEqual(list(index.getItems(reverse=True)),
+                             list(index.getItems()))
+
+# ------------------------------------------------------------------------------
+class ComputeTest(IndexTest):
+    '''Tests Index::compute'''
+
+    values = {1: 3, 2: 5, 3: 3, 4: None, 5: [1, 8], 6: 10}
+
+    def compute(self, function, rs, values=None):
+        return self.getIndex(values or self.values).compute(function,
+                                                             IITreeSet(rs))
+
+    def testSum(self):
+        self.assertEqual(self.compute('sum', [1, 2, 3, 4]), 11)
+        # Every value of a multi-valued object is taken into account
+        self.assertEqual(self.compute('sum', [1, 5]), 12)
+
+    def testBounds(self):
+        self.assertEqual(self.compute('min', [1, 2, 6]), 3)
+        self.assertEqual(self.compute('max', [1, 2, 3]), 5)
+        self.assertEqual(self.compute('min', [2, 5]), 1)
+        self.assertEqual(self.compute('max', [2, 5]), 8)
+        # Objects without value are ignored
+        self.assertEqual(self.compute('max', [4]), None)
+        self.assertEqual(self.compute('min', [4, 2]), 5)
+
+    def testGroup(self):
+        self.assertEqual(self.compute('group', [1, 2, 3, 4, 5]),
+                         {3: 2, 5: 1, 1: 1, 8: 1})
+
+    def testEmpty(self):
+        self.assertEqual(self.compute('sum', []), 0)
+        self.assertEqual(self.compute('min', []), None)
+        self.assertEqual(self.compute('max', []), None)
+        self.assertEqual(self.compute('group', []), {})
+        index = self.getIndex({})
+        self.assertEqual(index.compute('sum', IITreeSet([1])), 0)
+        self.assertEqual(index.compute('max', IITreeSet([1])), None)
+
+    def testCounts(self):
+        # Counts computed via the forward or the reverse index are the same
+        values = {i: i % 7 for i in range(1, 501)}
+        index = self.getIndex(values)
+        for rs in ([1, 8, 9], list(range(1, 501, 2))):
+            expected = {}
+            for i in rs:
+                expected[i % 7] = expected.get(i % 7, 0) + 1
+            self.assertEqual(index.getCounts(IITreeSet(rs)), expected)
+
+    def testUnknownFunction(self):
+        self.assertRaises(Index.Error, self.compute, 'avg', [1])
+
+# ------------------------------------------------------------------------------
+class DateIndexTest(IndexTest):
+    '''Tests DateIndex, storing dates as numbers of minutes'''
+
+    indexClass = DateIndex
+
+    def getDate(self, s): return DateTime('%s UTC' % s)
+
+    def getDates(self):
+        date = self.getDate
+        return self.getIndex({1: date('2024/01/02 10:30:45'),
+                              2: date('2024/01/02 10:31'),
+                              3: date('2023/12/31 23:59'), 4: None})
+
+    def testStorage(self):
+        index = self.getDates()
+        stored = index.byObject[1]
+        self.assertTrue(isinstance(stored, int))
+        # Seconds are ignored
+        self.assertEqual(stored, index.toIndexValue('2024/01/02 10:30 UTC'))
+        self.assertEqual(index.fromIndexValue(stored),
+                         self.getDate('2024/01/02 10:30'))
+        self.assertEqual(list(index.byValue), sorted(index.byValue))
+
+    def testSearch(self):
+        index = self.getDates()
+        date = self.getDate
+        self.assertEqual(list(index.search(date('2024/01/02 10:30'), None)),
+                         [1])
+        r = index.search(in_(date('2024/01/01'), None), None)
+        self.assertEqual(list(r), [1, 2])
+        r = index.search(gt_('2024/01/02 10:30 UTC'), IITreeSet([1, 2, 3]))
+        self.assertEqual(list(r), [2])
+        self.assertEqual(index.search(date('2020/01/01'), None), None)
+
+    def testSort(self):
+        index = self.getDates()
+        self.assertEqual(index.sort(IITreeSet([1, 2, 3, 4])), [3, 1, 2, 4])
+        self.assertEqual(index.sort(IITreeSet([1, 2, 3, 4]), True),
+                         [2, 1, 3, 4])
+
+    def testCompute(self):
+        index = self.getDates()
+        self.assertEqual(index.compute('max', IITreeSet([1, 3, 4])),
+                         self.getDate('2024/01/02 10:30'))
+        self.assertEqual(index.compute('min', IITreeSet([4])), None)
+
+# ------------------------------------------------------------------------------
+class KeywordIndexTest(IndexTest):
+    '''Tests KeywordIndex'''
+
+    indexClass = KeywordIndex
+
+    def testStorage(self):
+        index = self.getIndex({1: ['a', 'b', 'a'], 2: 'b', 3: []})
+        self.assertEqual(index.byObject[1], ('a', 'b'))
+        self.assertEqual(index.byObject[2], ('b',))
+        self.assertFalse(3 in index.byObject)
+        self.assertEqual(list(index.search('b', None)), [1, 2])
+        # Reindexing the same values, with duplicates, changes nothing
+        self.assertFalse(index.indexObject(Item(1, attr=['a', 'b', 'b'])))
+
+# ------------------------------------------------------------------------------
+class BooleanIndexTest(IndexTest):
+    '''Tests BooleanIndex, storing only the objects having the minority
+       value in the forward index.'''
+
+    indexClass = BooleanIndex
+
+    def getBooleans(self, trues=(2, 5), falses=(1, 3, 4, 6, 7, 8),
+                    empty=(9,)):
+        values = {id: True for id in trues}
+        values.update({id: False for id in falses})
+        values.update({id: None for id in empty})
+        return self.getIndex(values)
+
+    def search(self, index, value, rs=None):
+        r = index.search(value, None if rs is None else IITreeSet(rs))
+        return list(r) if r else []
+
+    def testStorage(self):
+        index = self.getBooleans()
+        self.assertEqual(index.minority, 1)
+        self.assertEqual(list(index.byValue), [1])
+        self.assertEqual(list(index.byValue[1]), [2, 5])
+        self.assertEqual(index.estimate(True)[0], 2)
+        self.assertEqual(index.estimate(False)[0], 6)
+
+    def testSearch(self):
+        index = self.getBooleans()
+        self.assertEqual(self.search(index, True), [2, 5])
+        self.assertEqual(self.search(index, False), [1, 3, 4, 6, 7, 8])
+        # Objects having no value match none of both values
+        self.assertEqual(self.search(index, False, [1, 2, 9]), [1])
+        self.assertEqual(self.search(index, True, [1, 2, 9]), [2])
+        self.assertEqual(self.search(index, True, [1, 9]), [])
+        self.assertEqual(self.search(index, not_(True)), [2, 5])
+        self.assertTrue(index.check(1, False))
+        self.assertFalse(index.check(9, False))
+
+    def testBalance(self):
+        # When True becomes the majority value, the forward index stores the
+        # objects having value False.
+        index = self.getBooleans()
+        for id in (1, 3, 4, 6, 7):
+            index.indexObject(Item(id, attr=True))
+        self.assertEqual(index.minority, 0)
+        self.assertEqual(list(index.byValue), [0])
+        self.assertEqual(list(index.byValue[0]), [8])
+        self.assertEqual(self.search(index, True), [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(self.search(index, False), [8])
+        self.assertEqual(self.search(index, True, [8, 9, 2]), [2])
+        # Unindexing objects may rebalance it again
+        for id in range(1, 8):
+            index.unindexObject(Item(id))
+        self.assertEqual(index.minority, 1)
+        self.assertEqual(self.search(index, True), [])
+        self.assertEqual(self.search(index, False), [8])
+
+    def testEmpty(self):
+        index = self.getIndex({})
+        self.assertEqual(self.search(index, True), [])
+        self.assertEqual(self.search(index, False), [])
+        self.assertEqual(self.search(index, False, [1]), [])
+        self.assertEqual(index.sort(IITreeSet([2, 1])), [1, 2])
+        self.assertEqual(index.compute('max', IITreeSet([1])), None)
+
+    def testSort(self):
+        index = self.getBooleans()
+        rs = IITreeSet([1, 2, 3, 5, 9])
+        self.assertEqual(index.sort(rs), [1, 3, 2, 5, 9])
+        self.assertEqual(index.sort(rs, True), [2, 5, 1, 3, 9])
+
+    def testCompute(self):
+        index = self.getBooleans()
+        rs = IITreeSet([1, 2, 3, 9])
+        self.assertEqual(index.compute('group', rs), {False: 2, True: 1})
+        self.assertEqual(index.compute('sum', rs), 1)
+        self.assertEqual(index.compute('min', rs), False)
+        self.assertEqual(index.compute('max', rs), True)
+        self.assertEqual(index.compute('max', IITreeSet([1, 3])), False)
+        self.assertEqual(index.compute('min', IITreeSet([9])), None)
+
+# ------------------------------------------------------------------------------
+class TextIndexTest(IndexTest):
+    '''Tests TextIndex, ranking objects with BM25'''
+
+    indexClass = TextIndex
+
+    texts = {1: 'The quick brown fox jumps over the lazy dog',
+             2: 'A fox, a fox, another fox',
+             3: 'Brown bears and brown foxes',
+             4: 'Nothing to see here', 5: None, 6: 'on it', 7: 'Fox 42'}
+
+    def search(self, index, value, rs=None):
+        r = index.search(value, rs)
+        return list(r) if r else []
+
+    def testStorage(self):
+        index = self.getIndex(self.texts)
+        # Words having at most 2 chars are ignored, excepted numbers
+        self.assertFalse(6 in index.byObject)
+        self.assertFalse('the' not in index.lexicon)
+        self.assertFalse('on' in index.lexicon)
+        self.assertTrue('42' in index.lexicon)
+        self.assertEqual(index.count(), 5)
+        self.assertEqual(index.lengths[2], 4)
+        self.assertEqual(index.byValue[index.lexicon['fox']][2], 3)
+
+    def testSearch(self):
+        index = self.getIndex(self.texts)
+        self.assertEqual(self.search(index, 'fox'), [1, 2, 7])
+        self.assertEqual(self.search(index, 'Brown FOX'), [1])
+        self.assertEqual(self.search(index, 'fox cat'), [])
+        self.assertEqual(self.search(index, 'fox', IITreeSet([2, 3])), [2])
+        # Too short words are ignored
+        self.assertEqual(self.search(index, 'a fox'), [1, 2, 7])
+
+    def testPrefix(self):
+        index = self.getIndex(self.texts)
+        self.assertEqual(self.search(index, 'fox*'), [1, 2, 3, 7])
+        self.assertEqual(self.search(index, 'br* fox*'), [1, 3])
+        self.assertEqual(self.search(index, 'zz*'), [])
+
+    def testRank(self):
+        index = self.getIndex(self.texts)
+        rs = index.search('fox', None)
+        # Text 2, containing the word 3 times, comes first. Text 7 is shorter
+        # than text 1.
+        self.assertEqual(index.rank('fox', rs), [2, 7, 1])
+        self.assertEqual(index.rank('fox', [1, 2, 7]), [2, 7, 1])
+        # Objects from the result set not containing the words come last
+        self.assertEqual(index.rank('fox', IITreeSet([1, 3, 4, 7])),
+                         [7, 1, 3, 4])
+
+    def testRankLimit(self):
+        texts = {i: 'word ' * (i % 7 + 1) + 'filler ' * (i % 5) \
+                 for i in range(1, 101)}
+        index = self.getIndex(texts)
+        rs = IITreeSet(texts)
+        ranked = index.rank('word', rs)
+        for limit in (0, 1, 10, 100, 200):
+            r = index.rank('word', rs, limit)
+            self.assertEqual(sorted(r), list(rs))
+            self.assertEqual(r[:limit], ranked[:limit])
+
+    def testReindex(self):
+        index = self.getIndex(self.texts)
+        same = Item(2, attr='a fox a fox another fox')
+        self.assertFalse(index.indexObject(same))
+        self.assertTrue(index.indexObject(Item(2, attr='A cat')))
+        self.assertEqual(self.search(index, 'fox'), [1, 7])
+        index.unindexObject(Item(1))
+        index.unindexObject(Item(7))
+        self.assertEqual(self.search(index, 'fox'), [])
+        self.assertEqual(self.search(index, 'fox*'), [3])
+        self.assertEqual(index.count(), 3)
+
+    def testEmpty(self):
+        index = self.getIndex({})
+        self.assertEqual(self.search(index, 'fox'), [])
+        self.assertEqual(index.rank('fox', [2, 1]), [2, 1])
+        self.assertRaises(Index.Error, index.sort, IITreeSet([1]))
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__': unittest.main()
+# ------------------------------------------------------------------------------
@@ -0,0 +1,47 @@
+# ------------------------------------------------------------------------------
+import logging, pathlib, tempfile, unittest
+
+from appy.database.log import Config
+
+# ------------------------------------------------------------------------------
+class AsynchronousTest(unittest.TestCase):
+    '''Tests asynchronous logging'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.folder.name) / 'app.log'
+        self.config = Config(asynchronous=True)
+        self.config.set(self.path.with_name('site.log'), self.path)
+        self.logger = self.config.getLogger('app')
+
+    def tearDown(self):
+        self.config.shutdown()
+        for handler in self.logger.handlers[:]:
+            self.logger.removeHandler(handler)
+            handler.close()
+        self.folder.cleanup()
+
+    def getLines(self):
+        return self.path.read_text().splitlines()
+
+    def testFlush(self):
+        # Entries queued before the shutdown are all written
+        for i in range(2000):
+            self.logger.info('Entry %d' % i)
+        self.config.shutdown()
+        lines = self.getLines()
+        self.assertEqual(len(lines), 2001)
+        self.assertTrue(lines[-1].endswith('Entry 1999'))
+
+    def testAfterShutdown(self):
+        # Entries logged after the shutdown are written synchronously
+        self.config.shutdown()
+        self.logger.info('Late entry')
+        self.assertTrue(self.getLines()[-1].endswith('Late entry'))
+        handlers = self.logger.handlers
+        self.assertEqual([h.__class__ for h in handlers],
+                         [logging.FileHandler])
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__': unittest.main()
+# ------------------------------------------------------------------------------
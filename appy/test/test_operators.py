@@ -0,0 +1,73 @@
+# ------------------------------------------------------------------------------
+import unittest
+from BTrees.IIBTree import IITreeSet
+
+from appy.test.test_indexes import IndexTest
+from appy.database.operators import or_, in_, lt_, le_, gt_, ge_
+
+# ------------------------------------------------------------------------------
+class RangeTest(IndexTest):
+    '''Tests range operators in_, lt_, le_, gt_ and ge_'''
+
+    values = {1: 0, 2: 5, 3: 10, 4: 15, 5: None, 6: [-5, 20], 7: 10}
+
+    def search(self, operator, values=None):
+        '''Returns the sorted IDs of the objects matching p_operator, checking
+           that walking the forward index, checking objects one by one via the
+           reverse index and checking stored values give the same result.'''
+        values = values or self.values
+        index = self.getIndex(values)
+        # Walk the range in the forward index
+        r = index.search(operator, None)
+        r = list(r) if r else []
+        # Check every object from a small result set
+        rs = IITreeSet(values)
+        self.assertTrue(len(rs) < or_.RS_LIMIT)
+        small = index.search(operator, rs)
+        self.assertEqual(list(small) if small else [], r)
+        # Check stored values
+        checked = [id for id in values if index.check(id, operator)]
+        self.assertEqual(checked, r)
+        return r
+
+    def testIn(self):
+        self.assertEqual(self.search(in_(5, 10)), [2, 3, 7])
+        self.assertEqual(self.search(in_(6, 9)), [])
+        self.assertEqual(self.search(in_(16, 30)), [6])
+
+    def testOpenBounds(self):
+        self.assertEqual(self.search(in_(None, 5)), [1, 2, 6])
+        self.assertEqual(self.search(in_(11, None)), [4, 6])
+        self.assertEqual(self.search(in_(None, None)), [1, 2, 3, 4, 6, 7])
+
+    def testZeroBound(self):
+        # A 0 upper bound is a bound
+        self.assertEqual(self.search(in_(None, 0)), [1, 6])
+        self.assertEqual(self.search(in_(0, 0)), [1])
+
+    def testSingleBound(self):
+        self.assertEqual(self.search(lt_(10)), [1, 2, 6])
+        self.assertEqual(self.search(le_(10)), [1, 2, 3, 6, 7])
+        self.assertEqual(self.search(gt_(10)), [4, 6])
+        self.assertEqual(self.search(ge_(10)), [3, 4, 6, 7])
+        self.assertEqual(self.search(gt_(20)), [])
+        self.assertEqual(self.search(lt_(-5)), [])
+
+    def testEmptyIndex(self):
+        index = self.getIndex({})
+        self.assertFalse(index.search(in_(1, 2), None))
+        self.assertFalse(index.search(ge_(1), IITreeSet([1, 2])))
+
+    def testEstimate(self):
+        values = {i: i % 100 for i in range(1, 1001)}
+        index = self.getIndex(values)
+        self.assertEqual(in_(0, 4).estimate(index), 50)
+        self.assertEqual(lt_(50).estimate(index), 500)
+        self.assertEqual(gt_(99).estimate(index), 0)
+
+    def testWrongRange(self):
+        self.assertRaises(Exception, in_, 1)
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__': unittest.main()
+# ------------------------------------------------------------------------------
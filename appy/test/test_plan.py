@@ -0,0 +1,112 @@
+# ------------------------------------------------------------------------------
+import unittest
+from BTrees.IIBTree import IITreeSet
+
+from appy.database.plan import Plan
+from appy.database.indexes import Index
+from appy.test.test_indexes import Item
+from appy.database.indexes.text import TextIndex
+from appy.database.operators import or_, in_, not_
+
+# ------------------------------------------------------------------------------
+class Catalog(dict):
+    '''Fake catalog, storing indexes for attributes "kind", "size" and
+       "text"'''
+
+    name = 'Test'
+
+    def __init__(self, count):
+        dict.__init__(self)
+        self.all = IITreeSet(range(1, count+1))
+        for name, class_ in (('kind', Index), ('size', Index),
+                             ('text', TextIndex)):
+            self[name] = class_(name, self)
+        for iid in self.all:
+            o = Item(iid, kind='k%d' % (iid % 4), size=iid,
+                     text='even' if iid % 2 == 0 else 'odd')
+            for index in self.values():
+                index.indexObject(o)
+
+    def getIndex(self, name): return self[name]
+
+# ------------------------------------------------------------------------------
+class PlanTest(unittest.TestCase):
+    '''Tests the query plan of catalog searches'''
+
+    def run_(self, count=1000, **fields):
+        '''Runs a plan with these search p_fields. Returns the plan and the
+           sorted list of matching iids.'''
+        plan = Plan(Catalog(count), fields)
+        r = plan.run()
+        return plan, (list(r) if r else [])
+
+    def getSteps(self, plan, attribute='name'):
+        return [getattr(step, attribute) for step in plan.explain()]
+
+    def testOrder(self):
+        # The most selective criterion is applied first
+        plan, r = self.run_(kind='k1', size=in_(1, 20))
+        self.assertEqual(r, [1, 5, 9, 13, 17])
+        self.assertEqual(self.getSteps(plan), ['size', 'kind'])
+        self.assertEqual(self.getSteps(plan, 'estimate'), [20, 250])
+        plan, r = self.run_(kind=or_('k1', 'k2'), size=999)
+        self.assertEqual(r, [])
+        plan, r = self.run_(kind=or_('k1', 'k2'), size=998)
+        self.assertEqual(r, [998])
+        self.assertEqual(self.getSteps(plan), ['size', 'kind'])
+
+    def testNegative(self):
+        # Negative criteria are applied last, even if they are more selective
+        plan, r = self.run_(count=20, size=not_(3), kind=or_('k0', 'k3'))
+        self.assertEqual(self.getSteps(plan), ['kind', 'size'])
+        self.assertEqual(r, [4, 7, 8, 11, 12, 15, 16, 19, 20])
+        # Without positive criterion, all objects are the basis
+        plan, r = self.run_(count=10, kind=not_('k0', 'k1'))
+        self.assertEqual(r, [2, 3, 6, 7, 10])
+
+    def testMethods(self):
+        # Once the result set is small, objects are checked one by one
+        plan, r = self.run_(size=in_(1, 100), kind=or_('k2', 'k3'))
+        self.assertEqual(self.getSteps(plan, 'method'), ['search', 'filter'])
+        self.assertEqual(self.getSteps(plan, 'size'), [100, 50])
+        plan, r = self.run_(size=in_(1, 600), kind=or_('k2', 'k3'))
+        self.assertEqual(self.getSteps(plan), ['kind', 'size'])
+        self.assertEqual(self.getSteps(plan, 'method'), ['search', 'search'])
+        self.assertEqual(len(r), 300)
+        # The set of objects having a single value is computed while
+        # estimating it.
+        plan, r = self.run_(size=in_(1, 600), kind='k2')
+        self.assertEqual(self.getSteps(plan, 'method'), ['intersect',
+                                                         'search'])
+        self.assertEqual(len(r), 150)
+        # Text indexes can't be checked one by one
+        plan, r = self.run_(size=in_(1, 10), text=or_('even', 'none'))
+        self.assertEqual(self.getSteps(plan), ['size', 'text'])
+        self.assertEqual(self.getSteps(plan, 'method')[1], 'search')
+        self.assertEqual(r, [2, 4, 6, 8, 10])
+
+    def testNoMatch(self):
+        # A criterion having no match at all stops the search
+        plan, r = self.run_(kind='k9', size=in_(1, 600))
+        self.assertEqual(r, [])
+        self.assertEqual(self.getSteps(plan, 'estimate')[0], 0)
+        self.assertEqual(self.getSteps(plan, 'method'), [None, None])
+
+    def testRanked(self):
+        plan, r = self.run_(count=10, text='odd', kind='k1')
+        self.assertEqual(plan.ranked.index.name, 'text')
+        self.assertEqual(r, [1, 5, 9])
+        # A text index searched via an operator does not rank the result
+        plan, r = self.run_(count=10, text=or_('odd', 'even'))
+        self.assertEqual(plan.ranked, None)
+
+    def testEmpty(self):
+        plan, r = self.run_(count=5)
+        self.assertEqual(r, [1, 2, 3, 4, 5])
+        self.assertEqual(plan.explain(), [])
+        plan, r = self.run_(count=0, kind='k1')
+        self.assertEqual(r, [])
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__': unittest.main()
+# ------------------------------------------------------------------------------
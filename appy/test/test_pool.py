@@ -0,0 +1,97 @@
+# ------------------------------------------------------------------------------
+import time, threading, unittest
+
+from appy.server.pool import Pool
+from appy.model.utils import Object as O
+
+# ------------------------------------------------------------------------------
+class Request:
+    '''Fake client socket'''
+    def __init__(self): self.sent = b''
+    def sendall(self, data): self.sent += data
+
+class Server:
+    '''Fake server, whose requests wait until event "go" is set'''
+    def __init__(self):
+        self.go = threading.Event()
+        self.handled = []
+        self.closed = []
+        self.loggers = O(app=O(warning=lambda message: None))
+    def finish_request(self, request, address):
+        self.go.wait()
+        self.handled.append(request)
+    def shutdown_request(self, request): self.closed.append(request)
+    def handle_error(self, request, address): pass
+
+# ------------------------------------------------------------------------------
+class PoolTest(unittest.TestCase):
+    '''Tests the pool of worker threads'''
+
+    def setUp(self):
+        self.server = Server()
+        self.pool = Pool(self.server, 2, 3)
+
+    def tearDown(self):
+        self.server.go.set()
+        self.pool.stop()
+
+    def fill(self, count):
+        '''Adds p_count requests to the pool and returns them'''
+        r = [Request() for i in range(count)]
+        for request in r:
+            self.pool.add(request, ('127.0.0.1', 1234))
+        return r
+
+    def occupy(self):
+        '''Keeps both workers busy and fills the queue. Returns the 5 requests
+           being handled or queued.'''
+        r = self.fill(2)
+        time.sleep(0.1)
+        r += self.fill(3)
+        self.assertTrue(self.pool.queue.full())
+        return r
+
+    def testRefuse(self):
+        # 2 requests are being handled, 3 are queued: others are refused
+        requests = self.occupy()
+        refused = self.fill(2)
+        for request in refused:
+            self.assertTrue(request.sent.startswith(b'HTTP/1.1 503'))
+            self.assertTrue(request in self.server.closed)
+        self.server.go.set()
+        self.pool.stop()
+        self.assertEqual(sorted(map(id, self.server.handled)),
+                         sorted(map(id, requests)))
+
+    def testStopFull(self):
+        # Stopping the pool while its queue is full does not block: the queued
+        # requests are handled before the workers stop.
+        self.occupy()
+        self.pool.stop(wait=False)
+        self.server.go.set()
+        self.pool.stop()
+        self.assertEqual(len(self.server.handled), 5)
+        for worker in self.pool.workers:
+            self.assertFalse(worker.is_alive())
+
+    def testStopIdle(self):
+        self.pool.stop()
+        for worker in self.pool.workers:
+            self.assertFalse(worker.is_alive())
+
+    def testTimeout(self):
+        # Workers busy for too long are not waited for
+        self.fill(1)
+        time.sleep(0.1)
+        timeout = Pool.STOP_TIMEOUT
+        Pool.STOP_TIMEOUT = 0.2
+        try:
+            start = time.time()
+            self.pool.stop()
+            self.assertTrue(time.time() - start < 1)
+        finally:
+            Pool.STOP_TIMEOUT = timeout
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__': unittest.main()
+# ------------------------------------------------------------------------------
@@ -0,0 +1,124 @@
+# ------------------------------------------------------------------------------
+import unittest
+
+from appy.px import Px
+from appy.model.utils import Object as O
+
+# ------------------------------------------------------------------------------
+class CompilerTest(unittest.TestCase):
+    '''Checks that a compiled PX produces exactly the same result as the
+       interpreter (see appy/px/compiler.py).'''
+
+    def tearDown(self): Px.compiled = False
+
+    def render(self, content, context, compiled):
+        '''Renders PX p_content with a copy of p_context'''
+        Px.compiled = compiled
+        context = dict(context)
+        return Px(content)(context), context
+
+    def check(self, content, **context):
+        '''Renders PX p_content with the interpreter and compiled, and checks
+           that results and resulting contexts are the same.'''
+        interpreted, ctx1 = self.render(content, context, False)
+        compiled, ctx2 = self.render(content, context, True)
+        self.assertEqual(compiled, interpreted)
+        self.assertEqual(ctx2.keys(), ctx1.keys())
+        return compiled
+
+    def getError(self, content, compiled, **context):
+        '''Renders PX p_content and returns the raised error message'''
+        with self.assertRaises(Exception) as cm:
+            self.render(content, context, compiled)
+        return str(cm.exception).split('\n')[0]
+
+    def checkError(self, content, **context):
+        '''Checks that the interpreter and the compiled PX raise the same
+           error.'''
+        interpreted = self.getError(content, False, **context)
+        compiled = self.getError(content, True, **context)
+        self.assertEqual(compiled, interpreted)
+
+    def testStatic(self):
+        r = self.check('<div class="a"><p>Static &amp; text</p><br/></div>')
+        self.assertEqual(r, '<div class="a"><p>Static &amp; text</p><br/>'
+                            '</div>')
+
+    def testFor(self):
+        r = self.check('<ul><li for="i in items" class=":i">:i</li></ul>',
+                       items=[1, 2, 3])
+        self.assertEqual(r, '<ul><li class="1">1</li><li class="2">2</li>'
+                            '<li class="3">3</li></ul>')
+        self.check('<x for="i in items">:i</x>', items=[])
+
+    def testNestedFor(self):
+        self.check('<p for="a, b in pairs"><x for="a in b">:a</x><x>:a</x></p>'
+                   '<x>:a</x>', pairs=[(1, 'xy'), (2, 'z')], a='outer')
+
+    def testLoopVariables(self):
+        self.check('<x for="i in items"><x>:loop.i.nb</x><x>:loop.i.first</x>'
+                   '<x>:loop.i.last</x><x>:loop.i.odd</x><x>:loop.i.even</x>'
+                   '<x>:loop.i.length</x><x>:loop.i.previous</x></x>',
+                   items='abc')
+
+    def testIf(self):
+        px = '<b if="cond">yes</b><b if="not cond">no</b>'
+        self.assertEqual(self.check(px, cond=True), '<b>yes</b>')
+        self.assertEqual(self.check(px, cond=False), '<b>no</b>')
+
+    def testElse(self):
+        # PX have no "else" statement: pod "else" attributes are dumped as is
+        self.check('<b if="False">a</b><b else="">b</b>')
+
+    def testVar(self):
+        self.check('<x var="a=1; b, c=(2, 3)">:a+b+c</x><x>:a</x>', a=0)
+        self.check('<x var="@g=5"></x><x>:g</x>', g=1)
+        self.check('<div var="a=1" for="i in range(2)" if="i">:a+i</div>')
+
+    def testEscaping(self):
+        r = self.check('<p><x>:s</x><x>::s</x><x>:None</x><x>:3</x></p>',
+                       s='<a & "b">')
+        self.assertEqual(r, '<p>&lt;a &amp; &quot;b&quot;&gt;<a & "b">3</p>')
+
+    def testErrorExpression(self):
+        self.check('<x>:missing|"default"</x><x>:1/0|0</x>')
+
+    def testSpecialAttributes(self):
+        self.check('<input type="checkbox" checked=":a"/><option '
+                   'selected=":not a">o</option>', a=True)
+
+    def testSubPx(self):
+        sub = Px('<i>:x</i>')
+        self.check('<b for="x in \'&lt;&gt;\'">:sub</b>', sub=sub)
+
+    def testObjectContext(self):
+        for compiled in (False, True):
+            Px.compiled = compiled
+            ctx = O(items=[1, 2])
+            r = Px('<x for="i in items">:i</x>')(ctx)
+            self.assertEqual(r.split(), ['1', '2'])
+            self.assertFalse('i' in ctx.__dict__)
+
+    def testErrors(self):
+        self.checkError('<x>:1/0</x>')
+        self.checkError('<x for="i in 3">:i</x>')
+        self.checkError('<x var="a=b">:a</x>')
+        self.checkError('<x if="missing">a</x>')
+
+    def testFallbackAction(self):
+        # This "for" statement can't be compiled: it is interpreted
+        self.checkError('<x for="_all_ in items">a</x>', items=[1])
+
+    def testFallbackPx(self):
+        # A PX too deeply nested can't be compiled: it is interpreted
+        depth = 30
+        content = '<x for="i%d in [%d]">' * depth % \
+                  tuple(j for i in range(depth) for j in (i, i))
+        content += ':i0+i29' + '</x>' * depth
+        self.assertEqual(self.check(content).strip(), '29')
+        px = Px(content)
+        self.assertIsNone(px.getRenderer())
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__': unittest.main()
+# ------------------------------------------------------------------------------
@@ -0,0 +1,106 @@
+# ------------------------------------------------------------------------------
+import os, pickle, tempfile, threading, unittest
+
+from appy.px import Px
+from appy.px.cache import Cache, Locator
+
+# ------------------------------------------------------------------------------
+CONTENT = '<ul><li for="i in items" class=":i">:i</li></ul>'
+RESULT = '<ul><li class="1">1</li><li class="2">2</li></ul>'
+
+# ------------------------------------------------------------------------------
+class CacheTest(unittest.TestCase):
+    '''Tests the disk cache of parsed PX'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = '%s/%s' % (self.folder.name, Cache.fileName)
+
+    def tearDown(self):
+        Px.cache = None
+        self.folder.cleanup()
+
+    def enable(self):
+        '''Enables a cache and returns it'''
+        Cache.enable(self.folder.name)
+        return Px.cache
+
+    def isCached(self, px):
+        '''Was p_px loaded from the cache ?'''
+        return isinstance(px.parser.locator, Locator)
+
+    def testRoundTrip(self):
+        cache = self.enable()
+        px = Px(CONTENT)
+        self.assertFalse(self.isCached(px))
+        self.assertEqual(len(cache.used), 1)
+        cache.save()
+        # Another process loads the PX from the cache
+        cache = self.enable()
+        self.assertEqual(len(cache.entries), 1)
+        px = Px(CONTENT)
+        self.assertTrue(self.isCached(px))
+        self.assertEqual(px({'items': [1, 2]}), RESULT)
+        # A cached PX can be compiled, too
+        Px.compiled = True
+        try:
+            self.assertEqual(Px(CONTENT)({'items': [1, 2]}), RESULT)
+        finally:
+            Px.compiled = False
+
+    def testUnused(self):
+        # Entries not used by the last process are removed
+        cache = self.enable()
+        Px(CONTENT)
+        cache.save()
+        cache = self.enable()
+        Px('<p>:i</p>')
+        cache.save()
+        self.assertEqual(len(self.enable().entries), 1)
+        # Nothing is written if entries are unchanged
+        cache = self.enable()
+        Px('<p>:i</p>')
+        cache.save()
+        self.assertEqual(cache.entries, cache.used)
+
+    def testVersion(self):
+        # A cache produced by another version of the code is discarded
+        cache = self.enable()
+        Px(CONTENT)
+        cache.save()
+        with open(self.path, 'rb') as f:
+            version, entries = pickle.load(f)
+        self.assertEqual(version, cache.version)
+        with open(self.path, 'wb') as f:
+            pickle.dump(('other', entries), f)
+        cache = self.enable()
+        self.assertEqual(cache.entries, {})
+        self.assertFalse(self.isCached(Px(CONTENT)))
+        # A corrupted file is ignored, too
+        with open(self.path, 'wb') as f:
+            f.write(b'corrupted')
+        self.assertEqual(self.enable().entries, {})
+
+    def testConcurrentSave(self):
+        # Several processes may save the cache at the same time
+        caches = []
+        for i in range(8):
+            cache = Cache(self.folder.name)
+            cache.used = {'px%d' % i: b'x' * 100000}
+            caches.append(cache)
+        def save(cache):
+            for j in range(10):
+                cache.save()
+                cache.entries = {}
+        threads = [threading.Thread(target=save, args=(cache,)) \
+                   for cache in caches]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        # The file is complete, and was written by one of them
+        entries = Cache(self.folder.name).entries
+        self.assertTrue(entries in [cache.used for cache in caches])
+        self.assertEqual(os.listdir(self.folder.name), [Cache.fileName])
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__': unittest.main()
+# ------------------------------------------------------------------------------
@@ -0,0 +1,65 @@
+# ------------------------------------------------------------------------------
+import io, gzip, unittest, http.client
+
+from appy.server.response import Response
+from appy.server.handler import HttpHandler
+from appy.model.utils import Object as O
+
+# ------------------------------------------------------------------------------
+class CompressTest(unittest.TestCase):
+    '''Tests the compression of responses'''
+
+    content = 'Some content. ' * 100
+
+    def getResponse(self, accept='gzip, deflate'):
+        '''Returns a response to a request whose "Accept-Encoding" header is
+           p_accept.'''
+        handler = HttpHandler.__new__(HttpHandler)
+        cfg = O(compress=True, compressThreshold=1024, compressLevel=6)
+        handler.server = O(config=O(server=cfg))
+        handler.request_version = 'HTTP/1.1'
+        handler.headers = http.client.HTTPMessage()
+        if accept: handler.headers['Accept-Encoding'] = accept
+        handler.wfile = io.BytesIO()
+        return Response(handler)
+
+    def build(self, response, content=None):
+        '''Builds the p_response and returns its headers and body'''
+        response.build(200, content or self.content)
+        r = response.handler.wfile.getvalue()
+        head, body = r.split(b'\r\n\r\n', 1)
+        message = head.decode().split('\r\n')[1:]
+        headers = dict(line.split(': ', 1) for line in message)
+        self.assertEqual(int(headers['Content-Length']), len(body))
+        return headers, body
+
+    def testCompress(self):
+        headers, body = self.build(self.getResponse())
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(body).decode(), self.content)
+
+    def testNoCompress(self):
+        # The client does not accept gzip, or the content is too small
+        for accept in (None, 'gzip;q=0', 'deflate'):
+            headers, body = self.build(self.getResponse(accept))
+            self.assertFalse('Content-Encoding' in headers)
+            self.assertEqual(body.decode(), self.content)
+        headers, body = self.build(self.getResponse(), 'small')
+        self.assertEqual(body, b'small')
+
+    def testHeadersSet(self):
+        # A content whose length or encoding is already set is sent as is
+        response = self.getResponse()
+        response.setHeader('Content-Length', len(self.content))
+        headers, body = self.build(response)
+        self.assertFalse('Content-Encoding' in headers)
+        self.assertEqual(body.decode(), self.content)
+        response = self.getResponse()
+        response.setHeader('Content-Encoding', 'identity')
+        headers, body = self.build(response)
+        self.assertEqual(headers['Content-Encoding'], 'identity')
+        self.assertEqual(body.decode(), self.content)
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__': unittest.main()
+# ------------------------------------------------------------------------------
@@ -0,0 +1,123 @@
+# ------------------------------------------------------------------------------
+import base64, unittest, urllib.parse
+
+from appy.server.guard import Cookie
+from appy.server.session import Sessions
+from appy.model.utils import Object as O
+
+# ------------------------------------------------------------------------------
+class Persistent:
+    '''Fake User or Group object'''
+    def __init__(self, iid, login=None, groups=None):
+        self.iid = iid
+        self.login = login
+        self.groups = groups
+        self._p_serial = b'1'
+    def isAnon(self): return self.login == 'anon'
+    def _p_activate(self): pass
+    def change(self):
+        '''Simulates a commit modifying p_self'''
+        self._p_serial = str(int(self._p_serial) + 1).encode()
+
+def getCookie(login, password='pwd'):
+    '''Returns the value of the authentication cookie for this p_login'''
+    value = base64.encodebytes(('%s:%s:' % (login, password)).encode())
+    return urllib.parse.quote(value.rstrip())
+
+# ------------------------------------------------------------------------------
+class SessionsTest(unittest.TestCase):
+    '''Tests the cache of authenticated sessions'''
+
+    def setUp(self):
+        self.sessions = Sessions(O(sessionCacheSize=2))
+        self.group = Persistent(3)
+        self.users = {}
+        for iid, login in ((1, 'alice'), (2, 'bob')):
+            self.users[login] = Persistent(iid, login, [self.group])
+        # The objects stored in the database
+        self.objects = {3: self.group}
+        for user in self.users.values(): self.objects[user.iid] = user
+
+    def getGuard(self, login, user=None):
+        '''Returns a guard for a request whose cookie is the one of p_login.
+           p_user is the user it has authenticated.'''
+        database = O(getObject=lambda handler, iid: self.objects.get(iid))
+        handler = O(req=O(AppyAuth=getCookie(login)) if login else O(),
+                    server=O(database=database, sessions=self.sessions),
+                    resp=O(setCookie=lambda name, value: None))
+        user = user or self.users.get(login) or Persistent(4, 'anon')
+        return O(handler=handler, Cookie=Cookie, user=user,
+                 userLogin=user.login, userLogins=[user.login],
+                 userRoles=['Authenticated'], userAllowed=['user:1'])
+
+    def cache(self, login='alice'):
+        '''Authenticates p_login and caches its session'''
+        self.sessions.set(self.getGuard(login))
+
+    def testGet(self):
+        self.assertEqual(self.sessions.get(self.getGuard('alice')), None)
+        self.cache()
+        session = self.sessions.get(self.getGuard('alice'))
+        self.assertEqual(session.user, self.users['alice'])
+        self.assertEqual(session.roles, ['Authenticated'])
+        # The returned session is a copy
+        session.login = 'eve'
+        self.assertEqual(self.sessions.get(self.getGuard('alice')).login,
+                         'alice')
+        # The cookie is not kept in memory
+        self.assertFalse(getCookie('alice') in self.sessions.entries)
+        self.assertEqual(self.sessions.get(self.getGuard(None)), None)
+
+    def testInvalidate(self):
+        # Modifying the user or one of its groups invalidates the session
+        for o in (self.users['alice'], self.group):
+            self.cache()
+            o.change()
+            self.assertEqual(self.sessions.get(self.getGuard('alice')), None)
+            self.assertEqual(len(self.sessions.entries), 0)
+        # Deleting the user invalidates it, too
+        self.cache()
+        del self.objects[1]
+        self.assertEqual(self.sessions.get(self.getGuard('alice')), None)
+
+    def testDisable(self):
+        # Logging out removes the session
+        self.cache()
+        self.cache('bob')
+        Cookie.disable(self.getGuard('alice').handler)
+        self.assertEqual(self.sessions.get(self.getGuard('alice')), None)
+        self.assertTrue(self.sessions.get(self.getGuard('bob')))
+
+    def testNotCached(self):
+        # Anonymous users are not cached
+        self.sessions.set(self.getGuard(None))
+        # The user must be the one authenticated by the cookie
+        self.sessions.set(self.getGuard('alice', self.users['bob']))
+        self.assertEqual(len(self.sessions.entries), 0)
+        # A size of 0 disables the cache
+        self.sessions = Sessions(O(sessionCacheSize=0))
+        self.cache()
+        self.assertEqual(self.sessions.get(self.getGuard('alice')), None)
+
+    def testLru(self):
+        self.users['carol'] = self.objects[5] = Persistent(5, 'carol', [])
+        self.cache()
+        self.cache('bob')
+        self.sessions.get(self.getGuard('alice'))
+        self.cache('carol')
+        self.assertTrue(self.sessions.get(self.getGuard('alice')))
+        self.assertEqual(self.sessions.get(self.getGuard('bob')), None)
+        self.assertEqual(len(self.sessions.entries), 2)
+
+    def testSecret(self):
+        # Tokens depend on a secret key specific to every process
+        other = Sessions(O(sessionCacheSize=2))
+        cookie = getCookie('alice')
+        self.assertNotEqual(self.sessions.getToken(cookie),
+                            other.getToken(cookie))
+        self.assertEqual(self.sessions.getToken(cookie),
+                         self.sessions.getToken(cookie))
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__': unittest.main()
+# ------------------------------------------------------------------------------
@@ -0,0 +1,97 @@
+# ------------------------------------------------------------------------------
+import socket, pathlib, tempfile, unittest, http.client, socketserver
+
+from appy.server.static import Static
+from appy.server.response import Response
+from appy.server.handler import HttpHandler
+from appy.model.utils import Object as O
+from appy.model.fields.file import FileInfo
+
+# ------------------------------------------------------------------------------
+class Socket(socket.socket):
+    '''Client socket, counting the calls to m_sendfile'''
+    sent = 0
+    def sendfile(self, file, offset=0, count=None):
+        Socket.sent += 1
+        return socket.socket.sendfile(self, file, offset, count)
+
+# ------------------------------------------------------------------------------
+class SendFileTest(unittest.TestCase):
+    '''Tests the transfer of files via sendfile'''
+
+    content = b'0123456789' * 1000
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        folder = pathlib.Path(self.folder.name)
+        (folder / 'o1').mkdir()
+        (folder / 'o1' / 'file.bin').write_bytes(self.content)
+        # A file stored in the database
+        self.info = FileInfo('o1')
+        self.info.fsName = 'file.bin'
+        self.info.uploadName = 'file.bin'
+        self.info.mimeType = 'application/octet-stream'
+        server, client = socket.socketpair()
+        self.server = Socket(fileno=server.detach())
+        self.client = client
+        Socket.sent = 0
+
+    def tearDown(self):
+        self.server.close()
+        self.client.close()
+        self.folder.cleanup()
+
+    def getHandler(self, range=None):
+        '''Returns a handler serving dynamic content, as after m_init'''
+        handler = HttpHandler.__new__(HttpHandler)
+        handler.server = O(config=O(server=O(compress=False)))
+        handler.request = self.server
+        handler.wfile = socketserver._SocketWriter(self.server)
+        # The database connection
+        handler.connection = O()
+        handler.command = 'GET'
+        handler.request_version = 'HTTP/1.1'
+        handler.requestline = 'GET /o1/file/download HTTP/1.1'
+        handler.headers = http.client.HTTPMessage()
+        if range: handler.headers['Range'] = range
+        return handler
+
+    def receive(self):
+        '''Returns the bytes received by the client'''
+        self.server.shutdown(socket.SHUT_WR)
+        r = b''
+        while True:
+            data = self.client.recv(65536)
+            if not data: break
+            r += data
+        return r
+
+    def testDownload(self):
+        handler = self.getHandler()
+        self.info.writeResponse(Response(handler), self.folder.name)
+        head, body = self.receive().split(b'\r\n\r\n', 1)
+        self.assertTrue(head.startswith(b'HTTP/1.0 200'))
+        self.assertEqual(body, self.content)
+        self.assertEqual(Socket.sent, 1)
+
+    def testRange(self):
+        handler = self.getHandler(range='bytes=10-19')
+        self.info.writeResponse(Response(handler), self.folder.name)
+        head, body = self.receive().split(b'\r\n\r\n', 1)
+        self.assertTrue(head.startswith(b'HTTP/1.0 206'))
+        self.assertEqual(body, self.content[10:20])
+        self.assertEqual(Socket.sent, 1)
+
+    def testNoSocket(self):
+        # Without a real socket, the file is copied through the handler's
+        # output stream.
+        handler = self.getHandler()
+        handler.request = O()
+        path = pathlib.Path(self.folder.name) / 'o1' / 'file.bin'
+        Static.writeFile(handler, path, 5, 10)
+        self.assertEqual(self.receive(), self.content[5:15])
+        self.assertEqual(Socket.sent, 0)
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__': unittest.main()
+# ------------------------------------------------------------------------------
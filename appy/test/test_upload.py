@@ -0,0 +1,175 @@
+# ------------------------------------------------------------------------------
+import io, os, tempfile, unittest, http.client
+
+from appy.server.request import Request
+from appy.model.utils import Object as O
+from appy.server.upload import FileUpload, MultiPartParser
+
+# ------------------------------------------------------------------------------
+BOUNDARY = '----AppyBoundary'
+
+def getBody(parts, boundary=BOUNDARY):
+    '''Returns a multipart body made of these p_parts, being tuples
+       (s_name, b_content, s_filename).'''
+    r = [b'preamble']
+    for name, content, filename in parts:
+        disposition = 'form-data; name="%s"' % name
+        if filename:
+            disposition += '; filename="%s"' % filename
+        head = 'Content-Disposition: %s' % disposition
+        if filename:
+            head += '\r\nContent-Type: application/octet-stream'
+        r.append(('--%s\r\n%s\r\n\r\n' % (boundary, head)).encode() + \
+                 content)
+    r.append(('--%s--\r\nepilogue' % boundary).encode())
+    return b'\r\n'.join(r)
+
+class Body(io.BytesIO):
+    '''Request body, recording the size of every read'''
+    def __init__(self, content):
+        io.BytesIO.__init__(self, content)
+        self.reads = []
+    def read(self, size=-1):
+        self.reads.append(size)
+        return io.BytesIO.read(self, size)
+
+# ------------------------------------------------------------------------------
+class MultiPartTest(unittest.TestCase):
+    '''Tests the streaming parser of multipart bodies'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def parse(self, content, maxMemory=100, length=None):
+        '''Parses this body p_content and returns the dict of parsed values'''
+        body = self.body = Body(content)
+        length = len(content) if length is None else length
+        parser = MultiPartParser(body, length, BOUNDARY, maxMemory,
+                                 self.folder.name)
+        return dict(parser.run())
+
+    def getTempFiles(self):
+        return os.listdir(self.folder.name)
+
+    def testParse(self):
+        big = os.urandom(300000)
+        r = self.parse(getBody([('title', 'Été'.encode(), None),
+                                ('small', b'small\r\ncontent', 'a.txt'),
+                                ('big', big, 'b.bin')]))
+        self.assertEqual(r['title'], 'Été')
+        small = r['small']
+        self.assertEqual(small.filename, 'a.txt')
+        self.assertEqual(small.read(), b'small\r\ncontent')
+        self.assertEqual(small.path, None)
+        self.assertEqual(small.headers['content-type'],
+                         'application/octet-stream')
+        # The big file is spooled to disk
+        upload = r['big']
+        self.assertEqual(upload.size, len(big))
+        self.assertEqual(os.path.dirname(upload.path), self.folder.name)
+        self.assertEqual(upload.read(), big)
+        # The body is read by chunks
+        self.assertTrue(max(self.body.reads) <= MultiPartParser.CHUNK)
+        self.assertTrue(len(self.body.reads) > 4)
+        for value in r.values():
+            if isinstance(value, FileUpload): value.close()
+        self.assertEqual(self.getTempFiles(), [])
+
+    def testSmallChunks(self):
+        # Delimiters may be split over several chunks
+        chunk = MultiPartParser.CHUNK
+        MultiPartParser.CHUNK = 7
+        try:
+            content = b'\r\n--' + b'x' * 50 + b'\r\n-'
+            r = self.parse(getBody([('f', content, 'f.txt'),
+                                    ('v', b'value', None)]))
+        finally:
+            MultiPartParser.CHUNK = chunk
+        self.assertEqual(r['f'].read(), content)
+        self.assertEqual(r['v'], 'value')
+
+    def testMoveTo(self):
+        r = self.parse(getBody([('a', b'a' * 50, 'a'), ('b', b'b' * 150, 'b')]))
+        for name, size in (('a', 50), ('b', 150)):
+            path = os.path.join(self.folder.name, '%s.moved' % name)
+            self.assertEqual(r[name].moveTo(path), size)
+            r[name].close()
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), name.encode() * size)
+        self.assertEqual(sorted(self.getTempFiles()), ['a.moved', 'b.moved'])
+
+    def testErrors(self):
+        body = getBody([('big', b'x' * 1000, 'big.bin')])
+        # The body ends before the end of the last part
+        with self.assertRaises(MultiPartParser.Error):
+            self.parse(body[:800])
+        # The partially uploaded file is removed
+        self.assertEqual(self.getTempFiles(), [])
+        # The client sends less bytes than announced
+        with self.assertRaises(MultiPartParser.Error):
+            self.parse(body, length=len(body) + 10)
+        # The boundary is not found
+        with self.assertRaises(MultiPartParser.Error):
+            self.parse(b'x' * 5000)
+        # Part headers are too long
+        head = '--%s\r\nX: %s' % (BOUNDARY, 'x' * MultiPartParser.MAX_HEAD)
+        with self.assertRaises(MultiPartParser.Error):
+            self.parse(head.encode())
+
+# ------------------------------------------------------------------------------
+class RequestBodyTest(unittest.TestCase):
+    '''Tests the reading of request bodies'''
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def getHandler(self, body, contentType=None):
+        '''Returns a fake handler for a request having this p_body'''
+        headers = http.client.HTTPMessage()
+        headers['Content-Length'] = str(len(body))
+        if contentType: headers['Content-Type'] = contentType
+        cfg = O(server=O(maxBodySize=1000, spoolSize=100),
+                database=O(binariesFolder=self.folder.name))
+        return O(server=O(config=cfg), headers=headers, parts=['tool'],
+                 rfile=Body(body), close_connection=False)
+
+    def testTooLarge(self):
+        # The body is not read at all
+        handler = self.getHandler(b'x' * 1001)
+        with self.assertRaises(Request.Error) as cm:
+            Request.create(handler)
+        self.assertEqual(cm.exception.code, 413)
+        self.assertTrue(handler.close_connection)
+        self.assertEqual(handler.rfile.reads, [])
+
+    def testForm(self):
+        handler = self.getHandler(b'a=1&b=2',
+                                  'application/x-www-form-urlencoded')
+        req = Request.create(handler)
+        self.assertEqual((req.a, req.b), ('1', '2'))
+
+    def testMultiPart(self):
+        body = getBody([('a', b'1', None), ('f', b'x' * 200, 'f.bin')])
+        contentType = 'multipart/form-data; boundary="%s"' % BOUNDARY
+        req = Request.create(self.getHandler(body, contentType))
+        self.assertEqual(req.a, '1')
+        self.assertEqual(req.f.size, 200)
+        req.close()
+        self.assertEqual(os.listdir(self.folder.name), [])
+        # A malformed body is refused, and uploaded files are removed
+        handler = self.getHandler(body[:-30], contentType)
+        with self.assertRaises(Request.Error) as cm:
+            Request.create(handler)
+        self.assertEqual(cm.exception.code, 400)
+        self.assertTrue(handler.close_connection)
+        self.assertEqual(os.listdir(self.folder.name), [])
+
+# ------------------------------------------------------------------------------
+if __name__ == '__main__': unittest.main()
+# ------------------------------------------------------------------------------
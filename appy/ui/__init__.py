@@ -127,6 +127,10 @@ class Config:
         # discreet. This is for sites where authentication is not foreseen for
         # the majority of visitors (just for some administrators).
         self.discreetLogin = False
+        # If "compilePx" is True, every PX is compiled into a Python function,
+        # at its first call, instead of being interpreted. This speeds up
+        # rendering.
+        self.compilePx = False
 
     def formatDate(self, tool, date, format=None, withHour=True, language=None):
         '''Returns p_date formatted as specified by p_format, or self.dateFormat